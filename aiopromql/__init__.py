@@ -1,4 +1,13 @@
 from .client import PrometheusAsync, PrometheusSync
-from .utils import make_label_string
+from .utils import Matcher, QueryTemplate, Selector, escape_label_value, make_label_string, parse_duration
 
-__all__ = ["PrometheusAsync", "PrometheusSync", "make_label_string"]
+__all__ = [
+    "Matcher",
+    "PrometheusAsync",
+    "PrometheusSync",
+    "QueryTemplate",
+    "Selector",
+    "escape_label_value",
+    "make_label_string",
+    "parse_duration",
+]
@@ -0,0 +1,103 @@
+"""
+Result containers for batched queries.
+"""
+
+import math
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Union
+
+
+class QueryOutcome(NamedTuple):
+    """
+    Outcome of one query in a batch.
+
+    Exactly one of `result` and `error` is set. A query that did not finish
+    before the batch deadline carries an `asyncio.TimeoutError`.
+    """
+
+    key: Union[int, str]
+    promql: str
+    result: Any
+    error: Optional[BaseException]
+    latency: float
+
+    @property
+    def ok(self) -> bool:
+        """True if the query returned a result."""
+        return self.error is None
+
+
+class BatchStats(NamedTuple):
+    """Latency statistics, in seconds, of the queries that completed in a batch."""
+
+    count: int
+    failed: int
+    elapsed: float
+    min: Optional[float]
+    mean: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+    max: Optional[float]
+
+
+class BatchResult:
+    """
+    Outcomes of a `query_many` / `query_range_many` batch, in input order.
+
+    Outcomes can be indexed by position, or by name when the batch was given a
+    mapping of names to expressions.
+    """
+
+    def __init__(self, outcomes: List[QueryOutcome], elapsed: float):
+        """
+        Args:
+            outcomes: One QueryOutcome per input query, in input order.
+            elapsed: Wall-clock duration of the whole batch in seconds.
+        """
+        self.outcomes = outcomes
+        self.elapsed = elapsed
+        self._by_key: Dict[Union[int, str], QueryOutcome] = {o.key: o for o in outcomes}
+
+    def __iter__(self) -> Iterator[QueryOutcome]:
+        return iter(self.outcomes)
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __getitem__(self, key: Union[int, str]) -> QueryOutcome:
+        if isinstance(key, int):
+            return self.outcomes[key]
+        return self._by_key[key]
+
+    def __repr__(self):
+        return f"BatchResult(ok={sum(o.ok for o in self.outcomes)}, failed={len(self.errors())})"
+
+    def results(self) -> List[Any]:
+        """Returns the result of every query in input order, None for failed ones."""
+        return [o.result for o in self.outcomes]
+
+    def errors(self) -> Dict[Union[int, str], BaseException]:
+        """Returns the errors of failed queries keyed by position or name."""
+        return {o.key: o.error for o in self.outcomes if o.error is not None}
+
+    def stats(self) -> BatchStats:
+        """Computes latency statistics over the successful queries."""
+        latencies = sorted(o.latency for o in self.outcomes if o.ok)
+        failed = len(self.outcomes) - len(latencies)
+
+        def pct(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, math.ceil(q * len(latencies)) - 1)]
+
+        return BatchStats(
+            count=len(self.outcomes),
+            failed=failed,
+            elapsed=self.elapsed,
+            min=latencies[0] if latencies else None,
+            mean=sum(latencies) / len(latencies) if latencies else None,
+            p50=pct(0.5),
+            p95=pct(0.95),
+            p99=pct(0.99),
+            max=latencies[-1] if latencies else None,
+        )
@@ -0,0 +1,232 @@
+"""
+Caching of query_range results with step-aligned reuse of overlapping windows.
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from .models.core import MetricLabelSet
+
+_timestamp = itemgetter(0)
+
+
+class CacheStats(NamedTuple):
+    """Counters of a result cache."""
+
+    hits: int
+    partial_hits: int
+    misses: int
+    evictions: int
+
+
+class RangeCacheEntry:
+    """
+    Raw matrix samples of one (promql, step) pair over a step-aligned window.
+
+    Samples are kept as the `[ts, "value"]` pairs Prometheus returned, so a cached
+    window can be turned back into a response and parsed by any client decoder.
+    """
+
+    __slots__ = ("start", "end", "series", "stored_at")
+
+    def __init__(self, start: float, end: float, response: dict, stored_at: float):
+        """
+        Args:
+            start: Epoch timestamp of the first evaluation step in the window.
+            end: Epoch timestamp of the last evaluation step in the window.
+            response: Raw matrix response covering [start, end].
+            stored_at: Cache clock reading at the time of storing.
+        """
+        self.start = start
+        self.end = end
+        self.stored_at = stored_at
+        self.series: Dict[MetricLabelSet, Tuple[dict, List[list]]] = {}
+        self.merge(response, start, end)
+
+    def merge(self, response: dict, from_ts: float, end: float):
+        """
+        Replaces all samples at or after `from_ts` with those of `response` and extends the window to `end`.
+
+        Args:
+            response: Raw matrix response covering [from_ts, end].
+            from_ts: Epoch timestamp of the first evaluation step in `response`.
+            end: Epoch timestamp of the last evaluation step in `response`.
+        """
+        for _, values in self.series.values():
+            del values[bisect.bisect_left(values, from_ts, key=_timestamp) :]
+        for result in response["data"]["result"]:
+            key = MetricLabelSet(result["metric"])
+            if key in self.series:
+                self.series[key][1].extend(result["values"])
+            else:
+                self.series[key] = (result["metric"], list(result["values"]))
+        self.end = end
+
+    def trim(self, start: float):
+        """Drops samples before `start`, so sliding windows do not grow the entry without bound."""
+        if start <= self.start:
+            return
+        for key, (_, values) in list(self.series.items()):
+            del values[: bisect.bisect_left(values, start, key=_timestamp)]
+            if not values:
+                del self.series[key]
+        self.start = start
+
+    def copy(self) -> "RangeCacheEntry":
+        """Returns a copy whose sample lists can be merged and trimmed without affecting this entry."""
+        clone = RangeCacheEntry.__new__(RangeCacheEntry)
+        clone.start, clone.end, clone.stored_at = self.start, self.end, self.stored_at
+        clone.series = {key: (metric, list(values)) for key, (metric, values) in self.series.items()}
+        return clone
+
+    def to_response(self, start: float, end: float) -> dict:
+        """Builds a raw matrix response holding the cached samples in [start, end]."""
+        result = []
+        for metric, values in self.series.values():
+            lo = bisect.bisect_left(values, start, key=_timestamp)
+            hi = bisect.bisect_right(values, end, key=_timestamp)
+            if lo < hi:
+                result.append({"metric": metric, "values": values[lo:hi]})
+        return {"status": "success", "data": {"resultType": "matrix", "result": result}}
+
+
+class ResultCache(ABC):
+    """
+    Base class for query_range result caches.
+
+    Subclasses implement `get` and `put` to choose where and for how long entries
+    are kept; the clients only use those two methods and the counters below.
+    Entries returned by `get` are never modified by the clients: they store an
+    updated copy with `put` instead, so a cache may hand the same entry to
+    several threads.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[RangeCacheEntry]:
+        """Returns the live entry for `key`, or None."""
+
+    @abstractmethod
+    def put(self, key: Hashable, entry: RangeCacheEntry):
+        """Stores `entry` under `key`."""
+
+    def now(self) -> float:
+        """Returns the clock reading used to timestamp entries."""
+        return time.monotonic()
+
+    def stats(self) -> CacheStats:
+        """Returns the current hit, partial hit, miss and eviction counters."""
+        return CacheStats(self.hits, self.partial_hits, self.misses, self.evictions)
+
+
+class LRUResultCache(ResultCache):
+    """
+    In-memory result cache with a maximum size and a time-to-live.
+
+    The least recently used entry is evicted once `maxsize` entries are stored, and
+    entries not updated within `ttl` seconds are treated as missing.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = 300.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize: Maximum number of (promql, step) entries kept.
+            ttl: Seconds an entry stays valid after its last update; None keeps entries until evicted.
+            clock: Monotonic clock, replaceable for testing.
+        """
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, RangeCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def now(self) -> float:
+        return self._clock()
+
+    def get(self, key: Hashable) -> Optional[RangeCacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and self._clock() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: RangeCacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries expire `ttl` seconds after being stored.
+
+    Used for metadata such as label values, which change slowly but are requested often.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            maxsize: Maximum number of entries kept.
+            ttl: Seconds an entry stays valid.
+            clock: Monotonic clock, replaceable for testing.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the live value stored under `key`, or `default`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if self._clock() - entry[0] > self.ttl:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """Stores `value` under `key`, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
@@ -1,29 +1,423 @@
+import asyncio
+import functools
+import math
+import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from urllib.parse import quote, quote_plus, urlencode
 
 import httpx
 
-from .models.prometheus import PrometheusResponseModel
+from .batch import BatchResult, QueryOutcome
+from .cache import RangeCacheEntry, ResultCache, TTLCache
+from .instrument import QueryHooks, QueryStats
+from .limits import AdaptiveConcurrencyLimiter, RateLimiter, is_overload
+from .models.core import ColumnarTimeSeries, MetricLabelSet, MetricMetadata, TimeSeries
+from .models.prometheus import (
+    PrometheusResponseModel,
+    merge_metric_maps,
+    parse_metadata,
+    parse_metric_map,
+    parse_names,
+    parse_series,
+)
+from .models.stream import ResultStreamDecoder
+from .remote_read import (
+    READ_HEADERS,
+    SAMPLES,
+    STREAMED_XOR_CHUNKS,
+    RemoteReadDecoder,
+    encode_read_request,
+    selector_matchers,
+)
+from .replicas import HedgePolicy, Replica, ReplicaSet, is_replica_failure
+from .retry import RetryPolicy
+from .utils import Matcher, Selector, expand_interval_placeholders, format_duration, parse_duration, step_for_points
+
+# Prometheus rejects query_range requests resolving to more points per series than this.
+MAX_POINTS_PER_SERIES = 11000
+
+Decoder = Literal["model", "metric_map", "columnar"]
+Method = Literal["GET", "POST", "auto"]
+# series selectors for the match[] parameter of the metadata endpoints
+Match = Union[str, Selector, Sequence[Union[str, Selector]]]
+Params = Union[Dict[str, Any], List[Tuple[str, Any]]]
+
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+class _SharedResponse:
+    """A raw response shared by coalesced callers; the parsed form is built once, on first use."""
+
+    __slots__ = ("data", "_parsed")
+
+    def __init__(self, data: dict):
+        self.data = data
+        self._parsed: Any = None
+
+    def result(self, raw: bool, parse: Callable[[dict], Any]) -> Any:
+        if raw:
+            return self.data
+        if self._parsed is None:
+            self._parsed = parse(self.data)
+        return self._parsed
+
+
+def _pool_options(limits: Optional[httpx.Limits], http2: bool, transport) -> Dict[str, Any]:
+    """Build the connection pool keyword arguments shared by httpx.Client and httpx.AsyncClient."""
+    options: Dict[str, Any] = {"http2": http2}
+    if limits is not None:
+        options["limits"] = limits
+    if transport is not None:
+        options["transport"] = transport
+    return options
 
 
 class PrometheusClientBase:
-    """Base Prometheus client with common utilities."""
+    """
+    Base Prometheus client with common utilities.
+
+    The ``decoder`` selects what parsed (non-raw) queries return:
+
+    - ``"model"``: a validated PrometheusResponseModel (default).
+    - ``"metric_map"``: a ``Dict[MetricLabelSet, TimeSeries]`` built directly from the JSON,
+      skipping Pydantic validation of every sample.
+    - ``"columnar"``: a ``Dict[MetricLabelSet, ColumnarTimeSeries]`` built the same way.
+
+    If a ``cache`` is given, ``query_range`` aligns its window to the step grid and
+    reuses cached samples of the same (promql, step), fetching only the missing tail.
+
+    The ``method`` selects how queries are sent: ``"GET"`` with URL parameters,
+    ``"POST"`` with a form-encoded body, or ``"auto"`` (default) which switches to
+    POST for queries longer than ``post_threshold`` characters.
+
+    Each ``hooks`` entry receives a QueryStats record per query, query_range and
+    sharded window fetch, with phase timings, response size and series counts.
+
+    With a ``retry`` policy, API calls failing with a retryable status or
+    exception are retried with backoff, within a retry budget kept per client.
+
+    ``label_values`` results are cached for ``label_values_ttl`` seconds.
+    """
 
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        decoder: Decoder = "model",
+        cache: Optional[ResultCache] = None,
+        method: Method = "auto",
+        post_threshold: int = 4096,
+        hooks: Sequence[QueryHooks] = (),
+        retry: Optional[RetryPolicy] = None,
+        label_values_ttl: Optional[float] = 60.0,
+    ):
+        if decoder not in ("model", "metric_map", "columnar"):
+            raise ValueError(f"Unknown decoder {decoder!r}")
+        if method not in ("GET", "POST", "auto"):
+            raise ValueError(f"Unknown method {method!r}")
         self.base_url = url
+        self.decoder = decoder
+        self.cache = cache
+        self.method = method
+        self.post_threshold = post_threshold
+        self.hooks = list(hooks)
+        self.retry = retry
+        self.retry_budget = retry.new_budget() if retry is not None else None
+        self.label_cache = TTLCache(ttl=label_values_ttl) if label_values_ttl else None
+
+    def _request_method(self, params: Params) -> str:
+        """Return the HTTP method an API call with these params is sent with."""
+        if isinstance(params, list):
+            return "GET"
+        if self.method == "POST" or (self.method == "auto" and len(params["query"]) > self.post_threshold):
+            return "POST"
+        return "GET"
+
+    def _prepare_request(self, params: Params) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Return (method, query string suffix, request kwargs) for an API call.
+
+        Plain queries sent with GET keep httpx's parameter encoding. Otherwise the
+        form is encoded here, reusing the pre-computed encoding of an EncodedQuery.
+        Metadata calls, with params as a list of pairs, are always sent with GET.
+        """
+        if isinstance(params, list):
+            return "GET", "", {"params": params}
+        query = params["query"]
+        encoded = getattr(query, "encoded", None)
+        use_post = self._request_method(params) == "POST"
+        if encoded is None and not use_post:
+            return "GET", "", {"params": params}
+        others = urlencode({k: v for k, v in params.items() if k != "query"})
+        form = f"query={encoded if encoded is not None else quote_plus(query)}"
+        if others:
+            form = f"{form}&{others}"
+        if use_post:
+            return "POST", "", {"content": form, "headers": _FORM_HEADERS}
+        return "GET", f"?{form}", {}
+
+    def _parse_response(self, response: dict) -> Union[PrometheusResponseModel, dict]:
+        """Parse Prometheus JSON response into model or metric map, depending on the decoder."""
+        if self.decoder == "model":
+            return PrometheusResponseModel(**response)
+        return parse_metric_map(response, columnar=self.decoder == "columnar")
+
+    def _result(self, data: dict, raw: bool, stats: Optional[QueryStats]) -> Any:
+        """Return the raw or parsed response, recording counts and parse time if instrumented."""
+        if stats is None:
+            return data if raw else self._parse_response(data)
+        stats.count_result(data)
+        if raw:
+            return data
+        t0 = time.perf_counter()
+        result = self._parse_response(data)
+        stats.add_phase("parse", time.perf_counter() - t0)
+        return result
+
+    @contextmanager
+    def _instrument(self, endpoint: str, promql: str) -> Iterator[Optional[QueryStats]]:
+        """Yield a QueryStats for the hooks to receive once the block exits, or None without hooks."""
+        if not self.hooks:
+            yield None
+            return
+        stats = QueryStats(endpoint, promql)
+        for hook in self.hooks:
+            hook.on_query_start(stats)
+        try:
+            yield stats
+        except BaseException as exc:
+            self._finish_stats(stats, exc)
+            raise
+        self._finish_stats(stats)
+
+    def _retry_delay(self, exc: BaseException, attempt: int, started: float) -> Optional[float]:
+        """Return the seconds to wait before retrying a failed API call, or None to raise `exc`."""
+        if self.retry is None:
+            return None
+        delay = self.retry.delay(exc, attempt, time.monotonic() - started)
+        if delay is None or not self.retry_budget.withdraw():
+            return None
+        return delay
+
+    def _finish_stats(self, stats: QueryStats, error: Optional[BaseException] = None):
+        stats.finish(error)
+        for hook in self.hooks:
+            hook.on_query_end(stats)
+
+    @staticmethod
+    def _read_json(
+        response: httpx.Response, stats: QueryStats, sent: float, headers_at: float, read_at: float, connect: float
+    ) -> dict:
+        """Record the timings of a fully read response, then check its status and decode it."""
+        stats.add_phase("wait", headers_at - sent - connect)
+        stats.add_phase("download", read_at - headers_at)
+        stats.status_code = response.status_code
+        stats.response_bytes += len(response.content)
+        response.raise_for_status()
+        t0 = time.perf_counter()
+        data = response.json()
+        stats.add_phase("decode", time.perf_counter() - t0)
+        return data
+
+    @staticmethod
+    def _metadata_params(
+        match: Match, start: Optional[datetime], end: Optional[datetime], limit: Optional[int]
+    ) -> List[Tuple[str, Any]]:
+        """Build the repeated match[] and optional start, end and limit parameters of a metadata call."""
+        if isinstance(match, (str, Selector)):
+            match = [match]
+        params: List[Tuple[str, Any]] = [("match[]", str(m)) for m in match]
+        if start is not None:
+            params.append(("start", start.timestamp()))
+        if end is not None:
+            params.append(("end", end.timestamp()))
+        if limit is not None:
+            params.append(("limit", limit))
+        return params
+
+    @staticmethod
+    def _match_text(params: List[Tuple[str, Any]]) -> str:
+        """Join the match[] selectors of a metadata call, for instrumentation."""
+        return " or ".join(value for name, value in params if name == "match[]")
 
-    def _parse_response(self, response: dict) -> PrometheusResponseModel:
-        """Parse Prometheus JSON response into model."""
-        return PrometheusResponseModel(**response)
+    @staticmethod
+    def _label_values_path(label: str) -> str:
+        return f"/api/v1/label/{quote(label, safe='')}/values"
+
+    @staticmethod
+    def _metadata_endpoint_params(
+        metric: Optional[str], limit: Optional[int], limit_per_metric: Optional[int]
+    ) -> List[Tuple[str, Any]]:
+        names = ("metric", "limit", "limit_per_metric")
+        return [(name, value) for name, value in zip(names, (metric, limit, limit_per_metric)) if value is not None]
+
+    @staticmethod
+    def _remote_read_body(
+        match: Union[Selector, Sequence[Matcher]], start: datetime, end: datetime, streamed: bool
+    ) -> bytes:
+        """Encode the ReadRequest of a remote_read call."""
+        query = (selector_matchers(match), int(start.timestamp() * 1000), int(end.timestamp() * 1000))
+        return encode_read_request([query], (STREAMED_XOR_CHUNKS, SAMPLES) if streamed else (SAMPLES,))
+
+    @staticmethod
+    def _remote_read_decoder(response: httpx.Response, start: datetime, end: datetime) -> RemoteReadDecoder:
+        """Create the decoder of a remote_read response, clipping to the requested range."""
+        return RemoteReadDecoder(
+            response.headers.get("Content-Type", ""),
+            start_ms=int(start.timestamp() * 1000),
+            end_ms=int(end.timestamp() * 1000),
+        )
+
+    def _remote_read_result(
+        self, series: Dict[MetricLabelSet, ColumnarTimeSeries]
+    ) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+        """Return remote-read series as ColumnarTimeSeries for the columnar decoder, TimeSeries otherwise."""
+        if self.decoder == "columnar":
+            return series
+        return {key: s.to_timeseries() for key, s in series.items()}
+
+    @staticmethod
+    def _adapt_step(
+        promql: str, start: datetime, end: datetime, step: str, max_points: Optional[int]
+    ) -> Tuple[str, str]:
+        """Coarsen the step to fit a max_points budget and expand $__interval / $__rate_interval."""
+        if max_points is not None:
+            step_s = max(parse_duration(step), step_for_points(start.timestamp(), end.timestamp(), max_points))
+            step = format_duration(step_s)
+        return expand_interval_placeholders(promql, parse_duration(step)), step
+
+    @staticmethod
+    def _align_range(start: datetime, end: datetime, step: str) -> Tuple[float, float, float]:
+        """Return (start, end, step) in seconds with start and end floored to the step grid."""
+        step_s = parse_duration(step)
+        if step_s <= 0:
+            raise ValueError("step must be positive")
+        return math.floor(start.timestamp() / step_s) * step_s, math.floor(end.timestamp() / step_s) * step_s, step_s
+
+    def _cache_lookup(
+        self, promql: str, step_s: float, start_ts: float, end_ts: float
+    ) -> Tuple[Optional[RangeCacheEntry], Optional[float]]:
+        """Return the reusable cache entry, if any, and the timestamp to fetch from (None if fully cached)."""
+        entry = self.cache.get((promql, step_s))
+        if entry is None or not entry.start <= start_ts <= entry.end:
+            self.cache.misses += 1
+            return None, start_ts
+        if end_ts <= entry.end:
+            self.cache.hits += 1
+            return entry, None
+        self.cache.partial_hits += 1
+        # refetch the last cached step too, as its sample may still have been incomplete
+        return entry, entry.end
+
+    def _cache_store(
+        self,
+        promql: str,
+        step_s: float,
+        start_ts: float,
+        end_ts: float,
+        entry: Optional[RangeCacheEntry],
+        fetch_from: Optional[float],
+        data: Optional[dict],
+    ) -> dict:
+        """Merge freshly fetched data into the cache and return the response for [start_ts, end_ts]."""
+        if data is not None and (data.get("status") != "success" or data["data"].get("resultType") != "matrix"):
+            return data
+        if entry is None:
+            entry = RangeCacheEntry(start_ts, end_ts, data, self.cache.now())
+        elif data is not None or start_ts > entry.start:
+            # other threads may be reading the cached entry: update a copy and store that
+            entry = entry.copy()
+            if data is not None:
+                entry.merge(data, fetch_from, end_ts)
+                entry.stored_at = self.cache.now()
+        entry.trim(start_ts)
+        self.cache.put((promql, step_s), entry)
+        return entry.to_response(start_ts, end_ts)
+
+    @staticmethod
+    def _shard_windows(
+        start: datetime, end: datetime, step: str, points_per_shard: int
+    ) -> List[Tuple[datetime, datetime]]:
+        """Split [start, end] into step-aligned windows of at most points_per_shard evaluation steps."""
+        if points_per_shard < 1:
+            raise ValueError("points_per_shard must be at least 1")
+        step_s = parse_duration(step)
+        if step_s <= 0:
+            raise ValueError("step must be positive")
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        if end_ts < start_ts:
+            raise ValueError("end must not be before start")
+        total_points = math.floor((end_ts - start_ts) / step_s) + 1
+        windows = []
+        for first in range(0, total_points, points_per_shard):
+            last = min(first + points_per_shard, total_points) - 1
+            windows.append(
+                (
+                    datetime.fromtimestamp(start_ts + first * step_s, tz=start.tzinfo),
+                    datetime.fromtimestamp(start_ts + last * step_s, tz=start.tzinfo),
+                )
+            )
+        return windows
 
 
 class PrometheusSync(PrometheusClientBase):
     """Synchronous Prometheus client using httpx."""
 
-    def __init__(self, url: str, timeout: Optional[float] = 2.0):
-        super().__init__(url)
-        self.session = httpx.Client(timeout=httpx.Timeout(timeout))
+    def __init__(
+        self,
+        url: str,
+        timeout: Optional[float] = 2.0,
+        decoder: Decoder = "model",
+        cache: Optional[ResultCache] = None,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+        http_client: Optional[httpx.Client] = None,
+        method: Method = "auto",
+        post_threshold: int = 4096,
+        hooks: Sequence[QueryHooks] = (),
+        retry: Optional[RetryPolicy] = None,
+        label_values_ttl: Optional[float] = 60.0,
+    ):
+        """
+        :param url: Base URL of the Prometheus server.
+        :param timeout: Request timeout in seconds.
+        :param decoder: What parsed queries return, see PrometheusClientBase.
+        :param cache: Optional query_range result cache.
+        :param limits: Connection pool size and keep-alive settings.
+        :param http2: Enable HTTP/2 (requires the ``http2`` extra).
+        :param transport: Custom httpx transport, e.g. one shared between clients.
+        :param http_client: Existing httpx.Client to send requests through. It is not
+            closed by close(); timeout, limits, http2 and transport are then ignored.
+        :param method: ``"GET"``, ``"POST"`` (form-encoded body) or ``"auto"`` to POST long queries.
+        :param post_threshold: Query length above which ``"auto"`` switches to POST.
+        :param hooks: Instrumentation hooks, e.g. InMemoryMetrics, receiving a QueryStats per query.
+        :param retry: Optional policy for retrying transient errors; None raises them right away.
+        :param label_values_ttl: Seconds label_values() results are cached; None disables the cache.
+        """
+        super().__init__(url, decoder, cache, method, post_threshold, hooks, retry, label_values_ttl)
+        self._owns_session = http_client is None
+        self.session = http_client or httpx.Client(
+            timeout=httpx.Timeout(timeout),
+            **_pool_options(limits, http2, transport),
+        )
 
     def query(self, promql: str, raw: bool = False) -> Union[PrometheusResponseModel, dict]:
         """
@@ -31,14 +425,57 @@ class PrometheusSync(PrometheusClientBase):
 
         :param promql: The PromQL query string to execute.
         :param raw: If True, return raw JSON response as dict; otherwise parse into model.
-        :return: Parsed Prometheus response model or raw JSON dict.
+        :return: Parsed response (see the client's decoder) or raw JSON dict.
         :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
         :raises httpx.RequestError: If a network error occurs.
         """
-        response = self.session.get(f"{self.base_url}/api/v1/query", params={"query": promql})
+        with self._instrument("/api/v1/query", promql) as stats:
+            data = self._get_json("/api/v1/query", {"query": promql}, stats)
+            return self._result(data, raw, stats)
+
+    def _get_json(self, path: str, params: Dict[str, Any], stats: Optional[QueryStats] = None) -> dict:
+        """Send an API request with GET or POST, as configured, retry per the policy, and return the decoded JSON."""
+        method, suffix, kwargs = self._prepare_request(params)
+        url = f"{self.base_url}{path}"
+        if self.retry_budget is None:
+            return self._send_json(method, url, suffix, kwargs, stats)
+        self.retry_budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return self._send_json(method, url, suffix, kwargs, stats)
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, started)
+                if delay is None:
+                    raise
+            attempt += 1
+            if stats is not None:
+                stats.retries += 1
+            time.sleep(delay)
+
+    def _send_json(
+        self, method: str, url: str, suffix: str, kwargs: Dict[str, Any], stats: Optional[QueryStats]
+    ) -> dict:
+        """Send one API request and return the decoded JSON."""
+        if stats is not None:
+            request = self.session.build_request(method, url + suffix, extensions={"trace": stats.trace}, **kwargs)
+            connect = stats.phases.get("connect", 0.0)
+            sent = time.perf_counter()
+            response = self.session.send(request, stream=True)
+            try:
+                headers_at = time.perf_counter()
+                response.read()
+            finally:
+                response.close()
+            connect = stats.phases.get("connect", 0.0) - connect
+            return self._read_json(response, stats, sent, headers_at, time.perf_counter(), connect)
+        if method == "POST":
+            response = self.session.post(url, **kwargs)
+        else:
+            response = self.session.get(url + suffix, **kwargs)
         response.raise_for_status()
-        data = response.json()
-        return data if raw else self._parse_response(data)
+        return response.json()
 
     def query_range(
         self,
@@ -47,32 +484,273 @@ class PrometheusSync(PrometheusClientBase):
         end: datetime,
         step: str = "30s",
         raw: bool = False,
+        max_points: Optional[int] = None,
     ) -> Union[PrometheusResponseModel, dict]:
         """
         Run a ranged PromQL query over a time window.
 
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
         :param promql: The PromQL query string to execute.
         :param start: Start datetime of the query range.
         :param end: End datetime of the query range.
         :param step: Query resolution step width (e.g., '30s', '1m').
         :param raw: If True, return raw JSON response as dict; otherwise parse into model.
-        :return: Parsed Prometheus response model or raw JSON dict.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Parsed response (see the client's decoder) or raw JSON dict.
         :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
         :raises httpx.RequestError: If a network error occurs.
         """
-        start_ts = start.timestamp()
-        end_ts = end.timestamp()
-        response = self.session.get(
-            f"{self.base_url}/api/v1/query_range",
-            params={"query": promql, "start": start_ts, "end": end_ts, "step": step},
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        with self._instrument("/api/v1/query_range", promql) as stats:
+            if self.cache is None:
+                data = self._fetch_range(promql, start.timestamp(), end.timestamp(), step, stats)
+            else:
+                start_ts, end_ts, step_s = self._align_range(start, end, step)
+                entry, fetch_from = self._cache_lookup(promql, step_s, start_ts, end_ts)
+                fetched = None if fetch_from is None else self._fetch_range(promql, fetch_from, end_ts, step, stats)
+                data = self._cache_store(promql, step_s, start_ts, end_ts, entry, fetch_from, fetched)
+            return self._result(data, raw, stats)
+
+    def _fetch_range(
+        self, promql: str, start_ts: float, end_ts: float, step: str, stats: Optional[QueryStats] = None
+    ) -> dict:
+        """Fetch a raw query_range response for epoch timestamps."""
+        return self._get_json(
+            "/api/v1/query_range", {"query": promql, "start": start_ts, "end": end_ts, "step": step}, stats
         )
-        response.raise_for_status()
-        data = response.json()
-        return data if raw else self._parse_response(data)
+
+    def query_range_sharded(
+        self,
+        promql: str,
+        start: datetime,
+        end: datetime,
+        step: str = "30s",
+        points_per_shard: int = MAX_POINTS_PER_SERIES,
+        concurrency: int = 4,
+        max_points: Optional[int] = None,
+    ) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+        """
+        Run a ranged PromQL query split into step-aligned shards fetched in parallel threads.
+
+        Use this for windows that exceed Prometheus' per-series point limit or that
+        benefit from spreading the work over several requests.
+
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
+        :param promql: The PromQL query string to execute.
+        :param start: Start datetime of the query range.
+        :param end: End datetime of the query range.
+        :param step: Query resolution step width (e.g., '30s', '1m').
+        :param points_per_shard: Maximum evaluation steps per shard.
+        :param concurrency: Maximum number of shards fetched at once.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Metric map stitched from all shards, ColumnarTimeSeries if the decoder is ``"columnar"``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        windows = self._shard_windows(start, end, step, points_per_shard)
+        columnar = self.decoder == "columnar"
+
+        def fetch(window: Tuple[datetime, datetime]):
+            with self._instrument("/api/v1/query_range", promql) as stats:
+                data = self._fetch_range(promql, window[0].timestamp(), window[1].timestamp(), step, stats)
+                if stats is not None:
+                    stats.count_result(data)
+            return parse_metric_map(data, columnar)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(windows)))) as pool:
+            return merge_metric_maps(list(pool.map(fetch, windows)))
+
+    def query_range_stream(
+        self,
+        promql: str,
+        start: datetime,
+        end: datetime,
+        step: str = "30s",
+        chunk_size: int = 65536,
+        max_points: Optional[int] = None,
+    ) -> Iterator[Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]]:
+        """
+        Run a ranged PromQL query and yield each series as soon as it is decoded.
+
+        The body is read in chunks and decoded incrementally, so memory follows the
+        largest series instead of the whole response. Series are ColumnarTimeSeries
+        if the client's decoder is ``"columnar"``, TimeSeries otherwise.
+
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
+        :param promql: The PromQL query string to execute.
+        :param start: Start datetime of the query range.
+        :param end: End datetime of the query range.
+        :param step: Query resolution step width (e.g., '30s', '1m').
+        :param chunk_size: Number of bytes read from the body at a time.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Iterator of (MetricLabelSet, series) pairs in response order.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        :raises ValueError: If the body is not a complete vector or matrix response.
+        """
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        decoder = ResultStreamDecoder(columnar=self.decoder == "columnar")
+        method, suffix, kwargs = self._prepare_request(
+            {"query": promql, "start": start.timestamp(), "end": end.timestamp(), "step": step}
+        )
+        with self.session.stream(method, f"{self.base_url}/api/v1/query_range{suffix}", **kwargs) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(chunk_size):
+                yield from decoder.feed(chunk)
+        yield from decoder.close()
+
+    def series(
+        self,
+        match: Match,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[MetricLabelSet]:
+        """
+        Find the series matching one or more selectors.
+
+        :param match: Series selector, or several; a series matching any of them is returned.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of series returned.
+        :return: Label sets of the matching series.
+        :raises ValueError: If no selector is given or the response status is not ``success``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        if not params or params[0][0] != "match[]":
+            raise ValueError("series() needs at least one selector")
+        with self._instrument("/api/v1/series", self._match_text(params)) as stats:
+            return parse_series(self._get_json("/api/v1/series", params, stats))
+
+    def labels(
+        self,
+        match: Match = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """
+        List label names, optionally only those of series matching the selectors.
+
+        :param match: Optional series selector(s) restricting the series looked at.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of names returned.
+        :return: Sorted label names.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        with self._instrument("/api/v1/labels", self._match_text(params)) as stats:
+            return parse_names(self._get_json("/api/v1/labels", params, stats))
+
+    def label_values(
+        self,
+        label: str,
+        match: Match = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        use_cache: bool = True,
+    ) -> List[str]:
+        """
+        List the values of a label, served from the client's TTL cache when fresh.
+
+        :param label: Label name, e.g. ``"job"`` or ``"__name__"``.
+        :param match: Optional series selector(s) restricting the series looked at.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of values returned.
+        :param use_cache: If False, always ask Prometheus and refresh the cache entry.
+        :return: Sorted label values.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        key = (label, tuple(params))
+        if use_cache and self.label_cache is not None:
+            cached = self.label_cache.get(key)
+            if cached is not None:
+                return list(cached)
+        path = self._label_values_path(label)
+        with self._instrument(path, self._match_text(params)) as stats:
+            values = parse_names(self._get_json(path, params, stats))
+        if self.label_cache is not None:
+            self.label_cache.put(key, tuple(values))
+        return values
+
+    def metadata(
+        self,
+        metric: Optional[str] = None,
+        limit: Optional[int] = None,
+        limit_per_metric: Optional[int] = None,
+    ) -> Dict[str, List[MetricMetadata]]:
+        """
+        Get the type, help text and unit of metrics.
+
+        :param metric: Optional metric name to return metadata for; all metrics if None.
+        :param limit: Optional maximum number of metrics returned.
+        :param limit_per_metric: Optional maximum number of metadata entries per metric.
+        :return: Metadata entries per metric name.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_endpoint_params(metric, limit, limit_per_metric)
+        with self._instrument("/api/v1/metadata", metric or "") as stats:
+            return parse_metadata(self._get_json("/api/v1/metadata", params, stats))
+
+    def remote_read(
+        self,
+        match: Union[Selector, Sequence[Matcher]],
+        start: datetime,
+        end: datetime,
+        streamed: bool = True,
+        chunk_size: int = 65536,
+    ) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+        """
+        Read raw samples through the remote-read API (``/api/v1/read``).
+
+        Samples come back as raw, unevaluated protobuf, which is much smaller on the
+        wire than JSON; decoding it in pure Python is CPU-bound, so it pays off mainly
+        when the network is the bottleneck.
+
+        :param match: Selector, or list of Matcher objects, choosing the series to read.
+        :param start: Start datetime of the range to read.
+        :param end: End datetime of the range to read.
+        :param streamed: Ask for XOR chunks streamed frame by frame (Prometheus 2.13+),
+            falling back to sampled responses on older servers. False asks for samples.
+        :param chunk_size: Number of bytes read from the body at a time.
+        :return: Metric map of raw samples, ColumnarTimeSeries if the decoder is ``"columnar"``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        :raises ValueError: If the response is truncated or corrupt.
+        """
+        body = self._remote_read_body(match, start, end, streamed)
+        with self.session.stream(
+            "POST", f"{self.base_url}/api/v1/read", content=body, headers=READ_HEADERS
+        ) as response:
+            response.raise_for_status()
+            decoder = self._remote_read_decoder(response, start, end)
+            for chunk in response.iter_bytes(chunk_size):
+                decoder.feed(chunk)
+        return self._remote_read_result(decoder.close())
 
     def close(self):
-        """Close the sync client session."""
-        self.session.close()
+        """Close the sync client session, unless it was passed in by the caller."""
+        if self._owns_session:
+            self.session.close()
 
     def __enter__(self):
         return self
@@ -81,6 +759,8 @@ class PrometheusSync(PrometheusClientBase):
         self.close()
 
     def __del__(self):
+        if not hasattr(self, "session") or not self._owns_session:
+            return
         if not self.session.is_closed:
             warnings.warn("PrometheusSync was not closed. Use 'with' statement or call .close()")
         self.close()
@@ -89,9 +769,107 @@ class PrometheusSync(PrometheusClientBase):
 class PrometheusAsync(PrometheusClientBase):
     """Asynchronous Prometheus client using httpx."""
 
-    def __init__(self, url: str, timeout: Optional[float] = 2.0):
-        super().__init__(url)
-        self.client = httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(timeout))
+    def __init__(
+        self,
+        url: Union[str, Sequence[str]],
+        timeout: Optional[float] = 2.0,
+        decoder: Decoder = "model",
+        cache: Optional[ResultCache] = None,
+        coalesce: bool = False,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        method: Method = "auto",
+        post_threshold: int = 4096,
+        hooks: Sequence[QueryHooks] = (),
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        label_values_ttl: Optional[float] = 60.0,
+    ):
+        """
+        :param url: Base URL of the Prometheus server, or a list of HA replica URLs.
+            Requests then go to the replica with the lowest latency EWMA and fail
+            over to the next one on connection errors, 429 and 5xx responses.
+        :param timeout: Request timeout in seconds.
+        :param decoder: What parsed queries return, see PrometheusClientBase.
+        :param cache: Optional query_range result cache.
+        :param coalesce: If True, concurrent identical query/query_range calls share one
+            in-flight request and all receive its result or exception.
+        :param limits: Connection pool size and keep-alive settings.
+        :param http2: Enable HTTP/2 multiplexing (requires the ``http2`` extra).
+        :param transport: Custom httpx transport, e.g. one shared between clients.
+        :param http_client: Existing httpx.AsyncClient to send requests through. It is not
+            closed by aclose(); timeout, limits, http2 and transport are then ignored.
+        :param method: ``"GET"``, ``"POST"`` (form-encoded body) or ``"auto"`` to POST long queries.
+        :param post_threshold: Query length above which ``"auto"`` switches to POST.
+        :param hooks: Instrumentation hooks, e.g. InMemoryMetrics, receiving a QueryStats per query.
+        :param retry: Optional policy for retrying transient errors; None raises them right away.
+        :param hedge: With several replicas, send a duplicate request to the next replica
+            when the primary is slower than this policy allows, and use the first answer.
+        :param rate_limiter: Optional token bucket capping requests per second.
+        :param concurrency_limiter: Optional limit on requests in flight that adapts to
+            latency and to 429/503 responses. Both limiters apply to every HTTP request
+            (retries and hedges included) except streamed ones, and may be shared between clients.
+        :param label_values_ttl: Seconds label_values() results are cached; None disables the cache.
+        """
+        urls = [url] if isinstance(url, str) else list(url)
+        super().__init__(urls[0], decoder, cache, method, post_threshold, hooks, retry, label_values_ttl)
+        self._owns_client = http_client is None
+        # requests use paths relative to our own client's base_url, absolute URLs on a shared one
+        self._api_root = "" if self._owns_client else urls[0].rstrip("/")
+        self.client = http_client or httpx.AsyncClient(
+            base_url=urls[0],
+            timeout=httpx.Timeout(timeout),
+            **_pool_options(limits, http2, transport),
+        )
+        self.coalesce = coalesce
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.hedge = hedge
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.replicas: Optional[ReplicaSet] = None
+        if len(urls) > 1:
+            self.replicas = ReplicaSet(urls, [self._api_root] + [u.rstrip("/") for u in urls[1:]])
+
+    async def _coalesced(self, key: tuple, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call(), sharing one in-flight task between concurrent callers with the same key."""
+        if not self.coalesce:
+            return await call()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+        # shield so that one cancelled caller does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _coalesced_response(self, key: tuple, fetch: Callable[[bool], Awaitable[Any]], raw: bool) -> Any:
+        """
+        Like _coalesced() for query endpoints: fetch(raw) runs once for all callers
+        with the same key, which then get the raw response or its shared parsed form.
+        """
+        if not self.coalesce:
+            return await fetch(raw)
+
+        async def shared() -> _SharedResponse:
+            return _SharedResponse(await fetch(True))
+
+        response = await self._coalesced(key, shared)
+        return response.result(raw, self._parse_response)
+
+    def _request_key(self, path: str, params: Params) -> tuple:
+        """Identify an API request by method, path and parameters, for coalescing."""
+        items = params if isinstance(params, list) else params.items()
+        return (self._request_method(params), path, tuple(items))
+
+    def _forget_inflight(self, key: tuple, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every caller was cancelled
 
     async def query(self, promql: str, raw: bool = False) -> Union[PrometheusResponseModel, dict]:
         """
@@ -99,14 +877,153 @@ class PrometheusAsync(PrometheusClientBase):
 
         :param promql: The PromQL query string to execute.
         :param raw: If True, return raw JSON response as dict; otherwise parse into model.
-        :return: Parsed Prometheus response model or raw JSON dict.
+        :return: Parsed response (see the client's decoder) or raw JSON dict.
         :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
         :raises httpx.RequestError: If a network error occurs.
         """
-        response = await self.client.get("/api/v1/query", params={"query": promql})
+        key = self._request_key("/api/v1/query", {"query": promql})
+        return await self._coalesced_response(key, lambda raw: self._query(promql, raw), raw)
+
+    async def _query(self, promql: str, raw: bool) -> Union[PrometheusResponseModel, dict]:
+        with self._instrument("/api/v1/query", promql) as stats:
+            data = await self._get_json("/api/v1/query", {"query": promql}, stats)
+            return self._result(data, raw, stats)
+
+    async def _get_json(self, path: str, params: Dict[str, Any], stats: Optional[QueryStats] = None) -> dict:
+        """Send an API request with GET or POST, as configured, retry per the policy, and return the decoded JSON."""
+        method, suffix, kwargs = self._prepare_request(params)
+        if self.replicas is not None:
+            send = functools.partial(self._send_to_replicas, method, path, suffix, kwargs, stats)
+        else:
+            send = functools.partial(self._send_json, method, f"{self._api_root}{path}", suffix, kwargs, stats)
+        if self.retry_budget is None:
+            return await send()
+        self.retry_budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await send()
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, started)
+                if delay is None:
+                    raise
+            attempt += 1
+            if stats is not None:
+                stats.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _send_to_replicas(
+        self, method: str, path: str, suffix: str, kwargs: Dict[str, Any], stats: Optional[QueryStats]
+    ) -> dict:
+        """
+        Send an API request to the fastest replica, hedging or failing over to the others.
+
+        The next replica is tried when all requests in flight failed with a replica
+        failure or, with a hedge policy, when the primary is slower than its hedge
+        delay. The first successful answer wins and the other requests are cancelled;
+        those sent before the winner are recorded as at least as slow as it was.
+        """
+        ranked = self.replicas.ranked()
+        delay = self.hedge.delay(ranked[0]) if self.hedge is not None else None
+        pending: Dict[asyncio.Future, Tuple[Replica, float, Optional[QueryStats]]] = {}
+        error: Optional[BaseException] = None
+        launched = 0
+        launch_next = True
+        try:
+            while True:
+                if launch_next and launched < len(ranked):
+                    replica = ranked[launched]
+                    attempt = None if stats is None else QueryStats(stats.endpoint, stats.promql)
+                    call = self._send_to_replica(replica, method, path, suffix, kwargs, attempt)
+                    pending[asyncio.ensure_future(call)] = (replica, time.perf_counter(), attempt)
+                    launched += 1
+                if not pending:
+                    raise error
+                timeout = delay if launched < len(ranked) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    _, sent_at, attempt = pending.pop(task)
+                    if task.exception() is None:
+                        now = time.perf_counter()
+                        for replica, other_sent_at, _ in pending.values():
+                            if other_sent_at < sent_at:
+                                replica.observe(now - other_sent_at)
+                        if stats is not None:
+                            stats.merge_attempt(attempt)
+                        return task.result()
+                    error = task.exception()
+                    if not is_replica_failure(error):
+                        raise error
+                # move on to the next replica once the hedge delay passed or every request failed
+                launch_next = not done or not pending
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _send_to_replica(
+        self,
+        replica: Replica,
+        method: str,
+        path: str,
+        suffix: str,
+        kwargs: Dict[str, Any],
+        stats: Optional[QueryStats],
+    ) -> dict:
+        """Send one API request to `replica`, recording its latency."""
+        t0 = time.perf_counter()
+        try:
+            data = await self._send_json(method, f"{replica.root}{path}", suffix, kwargs, stats)
+        except Exception as exc:
+            if is_replica_failure(exc):
+                self.replicas.observe_failure(replica, time.perf_counter() - t0)
+            raise
+        replica.observe(time.perf_counter() - t0)
+        return data
+
+    async def _send_json(
+        self, method: str, url: str, suffix: str, kwargs: Dict[str, Any], stats: Optional[QueryStats]
+    ) -> dict:
+        """Send one API request within the rate and concurrency limits and return the decoded JSON."""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return await self._request_json(method, url, suffix, kwargs, stats)
+        await limiter.acquire()
+        t0 = time.perf_counter()
+        try:
+            data = await self._request_json(method, url, suffix, kwargs, stats)
+        except BaseException as exc:
+            limiter.release(overloaded=is_overload(exc))
+            raise
+        limiter.release(latency=time.perf_counter() - t0)
+        return data
+
+    async def _request_json(
+        self, method: str, url: str, suffix: str, kwargs: Dict[str, Any], stats: Optional[QueryStats]
+    ) -> dict:
+        """Send one API request and return the decoded JSON."""
+        if stats is not None:
+            request = self.client.build_request(method, url + suffix, extensions={"trace": stats.atrace}, **kwargs)
+            connect = stats.phases.get("connect", 0.0)
+            sent = time.perf_counter()
+            response = await self.client.send(request, stream=True)
+            try:
+                headers_at = time.perf_counter()
+                await response.aread()
+            finally:
+                await response.aclose()
+            connect = stats.phases.get("connect", 0.0) - connect
+            return self._read_json(response, stats, sent, headers_at, time.perf_counter(), connect)
+        if method == "POST":
+            response = await self.client.post(url, **kwargs)
+        else:
+            response = await self.client.get(url + suffix, **kwargs)
         response.raise_for_status()
-        data = response.json()
-        return data if raw else self._parse_response(data)
+        return response.json()
 
     async def query_range(
         self,
@@ -115,32 +1032,386 @@ class PrometheusAsync(PrometheusClientBase):
         end: datetime,
         step: str = "30s",
         raw: bool = False,
+        max_points: Optional[int] = None,
     ) -> Union[PrometheusResponseModel, dict]:
         """
         Run a ranged PromQL query over a time window asynchronously.
 
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
         :param promql: The PromQL query string to execute.
         :param start: Start datetime of the query range.
         :param end: End datetime of the query range.
         :param step: Query resolution step width (e.g., '30s', '1m').
         :param raw: If True, return raw JSON response as dict; otherwise parse into model.
-        :return: Parsed Prometheus response model or raw JSON dict.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Parsed response (see the client's decoder) or raw JSON dict.
         :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
         :raises httpx.RequestError: If a network error occurs.
         """
-        start_ts = start.timestamp()
-        end_ts = end.timestamp()
-        response = await self.client.get(
-            "/api/v1/query_range",
-            params={"query": promql, "start": start_ts, "end": end_ts, "step": step},
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        key = self._request_key(
+            "/api/v1/query_range", {"query": promql, "start": start.timestamp(), "end": end.timestamp(), "step": step}
         )
-        response.raise_for_status()
-        data = response.json()
-        return data if raw else self._parse_response(data)
+        return await self._coalesced_response(key, lambda raw: self._query_range(promql, start, end, step, raw), raw)
+
+    async def _query_range(
+        self, promql: str, start: datetime, end: datetime, step: str, raw: bool
+    ) -> Union[PrometheusResponseModel, dict]:
+        with self._instrument("/api/v1/query_range", promql) as stats:
+            if self.cache is None:
+                data = await self._fetch_range(promql, start.timestamp(), end.timestamp(), step, stats)
+            else:
+                start_ts, end_ts, step_s = self._align_range(start, end, step)
+                entry, fetch_from = self._cache_lookup(promql, step_s, start_ts, end_ts)
+                if fetch_from is None:
+                    fetched = None
+                else:
+                    fetched = await self._fetch_range(promql, fetch_from, end_ts, step, stats)
+                data = self._cache_store(promql, step_s, start_ts, end_ts, entry, fetch_from, fetched)
+            return self._result(data, raw, stats)
+
+    async def _fetch_range(
+        self, promql: str, start_ts: float, end_ts: float, step: str, stats: Optional[QueryStats] = None
+    ) -> dict:
+        """Fetch a raw query_range response for epoch timestamps."""
+        return await self._get_json(
+            "/api/v1/query_range", {"query": promql, "start": start_ts, "end": end_ts, "step": step}, stats
+        )
+
+    async def query_many(
+        self,
+        queries: Union[Sequence[str], Mapping[str, str]],
+        concurrency: int = 16,
+        deadline: Optional[float] = None,
+        raw: bool = False,
+    ) -> BatchResult:
+        """
+        Run many instant PromQL queries concurrently.
+
+        A failing query does not abort the batch; its exception is captured in its
+        outcome instead.
+
+        :param queries: PromQL expressions, or a mapping of names to expressions.
+        :param concurrency: Maximum number of queries in flight at once.
+        :param deadline: Seconds after which unfinished queries are cancelled and
+            reported with an asyncio.TimeoutError. None waits for all queries.
+        :param raw: If True, results are raw JSON dicts; otherwise parsed as in query().
+        :return: BatchResult with one outcome per query, in input order.
+        """
+        return await self._run_batch(queries, lambda promql: self.query(promql, raw=raw), concurrency, deadline)
+
+    async def query_range_many(
+        self,
+        queries: Union[Sequence[str], Mapping[str, str]],
+        start: datetime,
+        end: datetime,
+        step: str = "30s",
+        concurrency: int = 16,
+        deadline: Optional[float] = None,
+        raw: bool = False,
+    ) -> BatchResult:
+        """
+        Run many ranged PromQL queries over the same window concurrently.
+
+        A failing query does not abort the batch; its exception is captured in its
+        outcome instead.
+
+        :param queries: PromQL expressions, or a mapping of names to expressions.
+        :param start: Start datetime of the query range.
+        :param end: End datetime of the query range.
+        :param step: Query resolution step width (e.g., '30s', '1m').
+        :param concurrency: Maximum number of queries in flight at once.
+        :param deadline: Seconds after which unfinished queries are cancelled and
+            reported with an asyncio.TimeoutError. None waits for all queries.
+        :param raw: If True, results are raw JSON dicts; otherwise parsed as in query_range().
+        :return: BatchResult with one outcome per query, in input order.
+        """
+        return await self._run_batch(
+            queries,
+            lambda promql: self.query_range(promql, start, end, step=step, raw=raw),
+            concurrency,
+            deadline,
+        )
+
+    async def _run_batch(
+        self,
+        queries: Union[Sequence[str], Mapping[str, str]],
+        call: Callable[[str], Awaitable[Any]],
+        concurrency: int,
+        deadline: Optional[float],
+    ) -> BatchResult:
+        """Run call() for every query under a semaphore, capturing errors and latencies."""
+        items = list(queries.items()) if isinstance(queries, Mapping) else list(enumerate(queries))
+        outcomes: List[Optional[QueryOutcome]] = [None] * len(items)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        batch_start = time.perf_counter()
+
+        async def run(index: int, key: Union[int, str], promql: str):
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    result = await call(promql)
+                except Exception as exc:
+                    outcomes[index] = QueryOutcome(key, promql, None, exc, time.perf_counter() - t0)
+                else:
+                    outcomes[index] = QueryOutcome(key, promql, result, None, time.perf_counter() - t0)
+
+        tasks = [asyncio.ensure_future(run(i, key, promql)) for i, (key, promql) in enumerate(items)]
+        try:
+            if tasks:
+                await asyncio.wait(tasks, timeout=deadline)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        elapsed = time.perf_counter() - batch_start
+        for i, (key, promql) in enumerate(items):
+            if outcomes[i] is None:
+                error = asyncio.TimeoutError(f"Query did not finish within the {deadline}s batch deadline")
+                outcomes[i] = QueryOutcome(key, promql, None, error, elapsed)
+        return BatchResult(outcomes, elapsed)
+
+    async def query_range_sharded(
+        self,
+        promql: str,
+        start: datetime,
+        end: datetime,
+        step: str = "30s",
+        points_per_shard: int = MAX_POINTS_PER_SERIES,
+        concurrency: int = 4,
+        max_points: Optional[int] = None,
+    ) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+        """
+        Run a ranged PromQL query split into step-aligned shards fetched concurrently.
+
+        Use this for windows that exceed Prometheus' per-series point limit or that
+        benefit from spreading the work over several requests.
+
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
+        :param promql: The PromQL query string to execute.
+        :param start: Start datetime of the query range.
+        :param end: End datetime of the query range.
+        :param step: Query resolution step width (e.g., '30s', '1m').
+        :param points_per_shard: Maximum evaluation steps per shard.
+        :param concurrency: Maximum number of shards fetched at once.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Metric map stitched from all shards, ColumnarTimeSeries if the decoder is ``"columnar"``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        windows = self._shard_windows(start, end, step, points_per_shard)
+        columnar = self.decoder == "columnar"
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(window: Tuple[datetime, datetime]):
+            async with semaphore:
+                with self._instrument("/api/v1/query_range", promql) as stats:
+                    data = await self._fetch_range(promql, window[0].timestamp(), window[1].timestamp(), step, stats)
+                    if stats is not None:
+                        stats.count_result(data)
+            return parse_metric_map(data, columnar)
+
+        return merge_metric_maps(await asyncio.gather(*(fetch(w) for w in windows)))
+
+    async def query_range_stream(
+        self,
+        promql: str,
+        start: datetime,
+        end: datetime,
+        step: str = "30s",
+        chunk_size: int = 65536,
+        max_points: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]]:
+        """
+        Run a ranged PromQL query asynchronously and yield each series as soon as it is decoded.
+
+        The body is read in chunks and decoded incrementally, so memory follows the
+        largest series instead of the whole response. Series are ColumnarTimeSeries
+        if the client's decoder is ``"columnar"``, TimeSeries otherwise.
+
+        ``$__interval`` and ``$__rate_interval`` in the query are replaced with the
+        step and a matching rate() window.
+
+        :param promql: The PromQL query string to execute.
+        :param start: Start datetime of the query range.
+        :param end: End datetime of the query range.
+        :param step: Query resolution step width (e.g., '30s', '1m').
+        :param chunk_size: Number of bytes read from the body at a time.
+        :param max_points: Optional budget of points per series; the step is coarsened
+            (to a rounded value) when it would return more.
+        :return: Async iterator of (MetricLabelSet, series) pairs in response order.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        :raises ValueError: If the body is not a complete vector or matrix response.
+        """
+        promql, step = self._adapt_step(promql, start, end, step, max_points)
+        decoder = ResultStreamDecoder(columnar=self.decoder == "columnar")
+        method, suffix, kwargs = self._prepare_request(
+            {"query": promql, "start": start.timestamp(), "end": end.timestamp(), "step": step}
+        )
+        root = self.replicas.ranked()[0].root if self.replicas is not None else self._api_root
+        async with self.client.stream(method, f"{root}/api/v1/query_range{suffix}", **kwargs) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size):
+                for item in decoder.feed(chunk):
+                    yield item
+        for item in decoder.close():
+            yield item
+
+    async def series(
+        self,
+        match: Match,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[MetricLabelSet]:
+        """
+        Find the series matching one or more selectors asynchronously.
+
+        :param match: Series selector, or several; a series matching any of them is returned.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of series returned.
+        :return: Label sets of the matching series.
+        :raises ValueError: If no selector is given or the response status is not ``success``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        if not params or params[0][0] != "match[]":
+            raise ValueError("series() needs at least one selector")
+        with self._instrument("/api/v1/series", self._match_text(params)) as stats:
+            return parse_series(await self._get_json("/api/v1/series", params, stats))
+
+    async def labels(
+        self,
+        match: Match = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """
+        List label names asynchronously, optionally only those of series matching the selectors.
+
+        :param match: Optional series selector(s) restricting the series looked at.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of names returned.
+        :return: Sorted label names.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        with self._instrument("/api/v1/labels", self._match_text(params)) as stats:
+            return parse_names(await self._get_json("/api/v1/labels", params, stats))
+
+    async def label_values(
+        self,
+        label: str,
+        match: Match = (),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        use_cache: bool = True,
+    ) -> List[str]:
+        """
+        List the values of a label asynchronously, served from the client's TTL cache when fresh.
+
+        :param label: Label name, e.g. ``"job"`` or ``"__name__"``.
+        :param match: Optional series selector(s) restricting the series looked at.
+        :param start: Optional start of the time range to search.
+        :param end: Optional end of the time range to search.
+        :param limit: Optional maximum number of values returned.
+        :param use_cache: If False, always ask Prometheus and refresh the cache entry.
+        :return: Sorted label values.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_params(match, start, end, limit)
+        key = (label, tuple(params))
+        if use_cache and self.label_cache is not None:
+            cached = self.label_cache.get(key)
+            if cached is not None:
+                return list(cached)
+        values = await self._coalesced(
+            self._request_key(self._label_values_path(label), params), lambda: self._label_values(label, params)
+        )
+        if self.label_cache is not None:
+            self.label_cache.put(key, tuple(values))
+        return list(values)
+
+    async def _label_values(self, label: str, params: List[Tuple[str, Any]]) -> List[str]:
+        path = self._label_values_path(label)
+        with self._instrument(path, self._match_text(params)) as stats:
+            return parse_names(await self._get_json(path, params, stats))
+
+    async def metadata(
+        self,
+        metric: Optional[str] = None,
+        limit: Optional[int] = None,
+        limit_per_metric: Optional[int] = None,
+    ) -> Dict[str, List[MetricMetadata]]:
+        """
+        Get the type, help text and unit of metrics asynchronously.
+
+        :param metric: Optional metric name to return metadata for; all metrics if None.
+        :param limit: Optional maximum number of metrics returned.
+        :param limit_per_metric: Optional maximum number of metadata entries per metric.
+        :return: Metadata entries per metric name.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        """
+        params = self._metadata_endpoint_params(metric, limit, limit_per_metric)
+        with self._instrument("/api/v1/metadata", metric or "") as stats:
+            return parse_metadata(await self._get_json("/api/v1/metadata", params, stats))
+
+    async def remote_read(
+        self,
+        match: Union[Selector, Sequence[Matcher]],
+        start: datetime,
+        end: datetime,
+        streamed: bool = True,
+        chunk_size: int = 65536,
+    ) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+        """
+        Read raw samples through the remote-read API (``/api/v1/read``) asynchronously.
+
+        Samples come back as raw, unevaluated protobuf, which is much smaller on the
+        wire than JSON; decoding it in pure Python is CPU-bound, so it pays off mainly
+        when the network is the bottleneck.
+
+        :param match: Selector, or list of Matcher objects, choosing the series to read.
+        :param start: Start datetime of the range to read.
+        :param end: End datetime of the range to read.
+        :param streamed: Ask for XOR chunks streamed frame by frame (Prometheus 2.13+),
+            falling back to sampled responses on older servers. False asks for samples.
+        :param chunk_size: Number of bytes read from the body at a time.
+        :return: Metric map of raw samples, ColumnarTimeSeries if the decoder is ``"columnar"``.
+        :raises httpx.HTTPStatusError: If HTTP response status is 4xx or 5xx.
+        :raises httpx.RequestError: If a network error occurs.
+        :raises ValueError: If the response is truncated or corrupt.
+        """
+        body = self._remote_read_body(match, start, end, streamed)
+        root = self.replicas.ranked()[0].root if self.replicas is not None else self._api_root
+        async with self.client.stream("POST", f"{root}/api/v1/read", content=body, headers=READ_HEADERS) as response:
+            response.raise_for_status()
+            decoder = self._remote_read_decoder(response, start, end)
+            async for chunk in response.aiter_bytes(chunk_size):
+                decoder.feed(chunk)
+        return self._remote_read_result(decoder.close())
 
     async def aclose(self):
-        """Close the async client session."""
-        await self.client.aclose()
+        """Close the async client session, unless it was passed in by the caller."""
+        if self._owns_client:
+            await self.client.aclose()
 
     async def __aenter__(self):
         return self
@@ -149,5 +1420,5 @@ class PrometheusAsync(PrometheusClientBase):
         await self.aclose()
 
     def __del__(self):
-        if not self.client.is_closed:
+        if hasattr(self, "client") and self._owns_client and not self.client.is_closed:
             warnings.warn("PrometheusAsync was not closed. Use 'async with' or call 'await .aclose()'")
@@ -0,0 +1,313 @@
+"""
+Client-side instrumentation of queries: per-phase timings and payload sizes.
+
+Every instrumented call produces one `QueryStats` record, passed to the
+`QueryHooks` given to a client. `InMemoryMetrics` aggregates them into
+histograms without extra dependencies; `OpenTelemetryHooks` exports them as
+spans and metrics (install ``aiopromql[otel]``).
+"""
+
+import bisect
+import importlib
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Phases of a query, in the order they happen.
+PHASES = ("connect", "wait", "download", "decode", "parse")
+
+
+class QueryStats:
+    """
+    Timings and sizes of one API call.
+
+    Phase durations are in seconds:
+
+    - ``connect``: TCP and TLS setup of a new connection, 0 on a reused one.
+    - ``wait``: sending the request until the response headers arrive (server time).
+    - ``download``: reading the response body.
+    - ``decode``: JSON decoding.
+    - ``parse``: building the model or metric map, absent for raw queries.
+    """
+
+    __slots__ = (
+        "endpoint",
+        "promql",
+        "phases",
+        "response_bytes",
+        "series",
+        "samples",
+        "retries",
+        "status_code",
+        "error",
+        "started_at",
+        "duration",
+        "_t0",
+        "_trace_started",
+    )
+
+    def __init__(self, endpoint: str, promql: str):
+        """
+        Args:
+            endpoint: API path, e.g. ``/api/v1/query_range``.
+            promql: The query sent.
+        """
+        self.endpoint = endpoint
+        self.promql = promql
+        self.phases: Dict[str, float] = {}
+        self.response_bytes = 0
+        self.series = 0
+        self.samples = 0
+        self.retries = 0
+        self.status_code: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._t0 = time.perf_counter()
+        self._trace_started: Dict[str, float] = {}
+
+    def __repr__(self):
+        phases = ", ".join(f"{name}={seconds * 1000:.2f}ms" for name, seconds in self.phases.items())
+        return f"QueryStats({self.endpoint}, {phases}, bytes={self.response_bytes}, series={self.series})"
+
+    def add_phase(self, name: str, seconds: float):
+        """Adds `seconds` to the duration of phase `name`."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def merge_attempt(self, attempt: "QueryStats"):
+        """Adds the phases, size and status of a sub-request, e.g. the winner of a hedged call."""
+        for name, seconds in attempt.phases.items():
+            self.add_phase(name, seconds)
+        self.response_bytes += attempt.response_bytes
+        self.status_code = attempt.status_code
+
+    def count_result(self, data: dict):
+        """Records the number of series and samples in a decoded response."""
+        result = data.get("data", {}).get("result", ())
+        if not isinstance(result, list):
+            return
+        self.series = len(result)
+        self.samples = sum(len(r["values"]) if "values" in r else 1 for r in result)
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Stops the clock; called by the client once the call returns or fails."""
+        self.duration = time.perf_counter() - self._t0
+        self.error = error
+
+    def trace(self, name: str, info: dict):
+        """httpcore trace callback timing connection setup into the ``connect`` phase."""
+        if not name.startswith("connection."):
+            return
+        event, _, state = name.rpartition(".")
+        if state == "started":
+            self._trace_started[event] = time.perf_counter()
+        elif state in ("complete", "failed") and event in self._trace_started:
+            self.add_phase("connect", time.perf_counter() - self._trace_started.pop(event))
+
+    async def atrace(self, name: str, info: dict):
+        """Async variant of `trace` for httpx.AsyncClient."""
+        self.trace(name, info)
+
+
+class QueryHooks:
+    """
+    Base class for instrumentation hooks; override the callbacks you need.
+
+    Callbacks run in the calling thread or task, so they should be cheap.
+    """
+
+    def on_query_start(self, stats: QueryStats):
+        """Called before the request is sent."""
+
+    def on_query_end(self, stats: QueryStats):
+        """Called once the call returned or failed, with all fields of `stats` set."""
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with exponentially growing bounds.
+
+    Quantiles are interpolated within a bucket, so they are accurate to one bucket
+    width (about 19% with the default growth factor).
+    """
+
+    def __init__(self, lowest: float = 1e-4, highest: float = 100.0, factor: float = 2**0.25):
+        """
+        Args:
+            lowest: Upper bound of the first bucket.
+            highest: Bounds stop growing past this value; larger observations share the last bucket.
+            factor: Ratio between consecutive bucket bounds.
+        """
+        self.bounds: List[float] = [lowest]
+        while self.bounds[-1] < highest:
+            self.bounds.append(self.bounds[-1] * factor)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Adds one observation."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the estimated q-quantile (0 <= q <= 1), or None if empty."""
+        if not 0.0 <= q <= 1.0:
+            raise ValueError("q must be between 0 and 1")
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+class InMemoryMetrics(QueryHooks):
+    """
+    Hooks that aggregate query stats into in-memory histograms per endpoint.
+
+    Latencies are kept per phase plus a ``total`` pseudo-phase; response sizes,
+    series and sample counts in separate histograms. Safe to share between clients
+    and threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._sizes: Dict[Tuple[str, str], Histogram] = {}
+        self.queries = 0
+        self.errors = 0
+        self.retries = 0
+
+    def on_query_end(self, stats: QueryStats):
+        with self._lock:
+            self.queries += 1
+            self.errors += stats.error is not None
+            self.retries += stats.retries
+            self._observe(self._latency, stats.endpoint, "total", stats.duration)
+            for phase, seconds in stats.phases.items():
+                self._observe(self._latency, stats.endpoint, phase, seconds)
+            if stats.error is None:
+                self._observe(self._sizes, stats.endpoint, "bytes", stats.response_bytes, 64.0, 1e10, 2.0)
+                self._observe(self._sizes, stats.endpoint, "series", stats.series, 1.0, 1e7, 2.0)
+                self._observe(self._sizes, stats.endpoint, "samples", stats.samples, 1.0, 1e9, 2.0)
+
+    @staticmethod
+    def _observe(histograms: Dict[Tuple[str, str], Histogram], endpoint: str, name: str, value: float, *bounds):
+        histogram = histograms.get((endpoint, name))
+        if histogram is None:
+            histogram = histograms[(endpoint, name)] = Histogram(*bounds)
+        histogram.observe(value)
+
+    def latency(self, phase: str = "total", endpoint: Optional[str] = None) -> Optional[Histogram]:
+        """Returns the latency histogram of `phase`, merged over all endpoints unless one is given."""
+        return self._merged(self._latency, phase, endpoint)
+
+    def size(self, kind: str = "bytes", endpoint: Optional[str] = None) -> Optional[Histogram]:
+        """Returns the ``bytes``, ``series`` or ``samples`` histogram, merged over endpoints unless one is given."""
+        return self._merged(self._sizes, kind, endpoint)
+
+    def _merged(self, histograms, name: str, endpoint: Optional[str]) -> Optional[Histogram]:
+        with self._lock:
+            parts = [h for (ep, n), h in histograms.items() if n == name and endpoint in (None, ep)]
+            if len(parts) <= 1:
+                return parts[0] if parts else None
+            merged = Histogram.__new__(Histogram)
+            merged.bounds = parts[0].bounds
+            merged.counts = [sum(counts) for counts in zip(*(h.counts for h in parts))]
+            merged.count = sum(h.count for h in parts)
+            merged.sum = sum(h.sum for h in parts)
+            merged.max = max(h.max for h in parts)
+            return merged
+
+    def summary(self, quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99)) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns latency quantiles per endpoint and phase.
+
+        Returns:
+            ``{endpoint: {phase: {"count": n, "mean": s, "p50": s, ...}}}`` with times in seconds.
+        """
+        with self._lock:
+            keys = sorted(self._latency)
+        out: Dict[str, Dict[str, Any]] = {}
+        for endpoint, phase in keys:
+            histogram = self._latency[(endpoint, phase)]
+            row: Dict[str, Any] = {"count": histogram.count, "mean": histogram.mean}
+            for q in quantiles:
+                row[f"p{q * 100:g}"] = histogram.quantile(q)
+            out.setdefault(endpoint, {})[phase] = row
+        return out
+
+    def reset(self):
+        """Drops all recorded data."""
+        with self._lock:
+            self._latency.clear()
+            self._sizes.clear()
+            self.queries = self.errors = self.retries = 0
+
+
+class OpenTelemetryHooks(QueryHooks):
+    """
+    Hooks exporting each call as an OpenTelemetry span and histogram records.
+
+    The span covers the whole call and carries the phase durations, sizes and retry
+    count as attributes. Requires ``opentelemetry-api`` (``pip install aiopromql[otel]``).
+    """
+
+    def __init__(self, tracer: Any = None, meter: Any = None):
+        """
+        Args:
+            tracer: Tracer to create spans with; defaults to the global tracer provider's.
+            meter: Meter to record histograms with; defaults to the global meter provider's.
+        """
+        try:
+            trace = importlib.import_module("opentelemetry.trace")
+            metrics = importlib.import_module("opentelemetry.metrics")
+        except ImportError:
+            raise ImportError(
+                "opentelemetry-api is required for OpenTelemetryHooks; install it with 'pip install aiopromql[otel]'"
+            ) from None
+        self._status_error = trace.Status(trace.StatusCode.ERROR)
+        self._tracer = tracer or trace.get_tracer("aiopromql")
+        meter = meter or metrics.get_meter("aiopromql")
+        self._duration = meter.create_histogram("aiopromql.query.duration", unit="s")
+        self._size = meter.create_histogram("aiopromql.query.response_size", unit="By")
+
+    def on_query_end(self, stats: QueryStats):
+        attributes = {
+            "db.system": "prometheus",
+            "db.statement": stats.promql,
+            "aiopromql.endpoint": stats.endpoint,
+            "aiopromql.response_bytes": stats.response_bytes,
+            "aiopromql.series": stats.series,
+            "aiopromql.samples": stats.samples,
+            "aiopromql.retries": stats.retries,
+        }
+        if stats.status_code is not None:
+            attributes["http.response.status_code"] = stats.status_code
+        for phase, seconds in stats.phases.items():
+            attributes[f"aiopromql.phase.{phase}"] = seconds
+        start_ns = int(stats.started_at * 1e9)
+        span = self._tracer.start_span(f"prometheus {stats.endpoint}", start_time=start_ns, attributes=attributes)
+        if stats.error is not None:
+            span.record_exception(stats.error)
+            span.set_status(self._status_error)
+        span.end(end_time=start_ns + int(stats.duration * 1e9))
+
+        self._duration.record(stats.duration, {"endpoint": stats.endpoint, "phase": "total"})
+        for phase, seconds in stats.phases.items():
+            self._duration.record(seconds, {"endpoint": stats.endpoint, "phase": phase})
+        if stats.error is None:
+            self._size.record(stats.response_bytes, {"endpoint": stats.endpoint})
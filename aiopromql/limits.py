@@ -0,0 +1,162 @@
+"""
+Client-side rate limiting and adaptive concurrency control for PrometheusAsync.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+
+import httpx
+
+
+def is_overload(exc: BaseException) -> bool:
+    """True if `exc` signals an overloaded server: a timeout, 429 or 503."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in (429, 503)
+    return isinstance(exc, httpx.TimeoutException)
+
+
+class RateLimiter:
+    """
+    Async token bucket allowing `rate` requests per second with bursts of up to `burst`.
+
+    Waiting callers are served in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate: Tokens added per second.
+            burst: Bucket size, i.e. the number of requests that may be sent at once after an idle period.
+            clock: Monotonic clock, replaceable for testing.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._clock = clock
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1.0
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits requests in flight to a budget that adapts to the server (AIMD).
+
+    Each successful request grows the limit by ``1 / limit``, i.e. by one per
+    round of requests. The limit is multiplied by `backoff` when a request hits a
+    timeout, 429 or 503, or when the short-term latency average exceeds `tolerance`
+    times the long-term one, the gradient-style sign that requests are queueing in
+    Prometheus rather than being evaluated. Comparing two averages of the same
+    traffic, rather than against the fastest request ever seen, keeps a steady mix
+    of cheap and heavy queries from being mistaken for overload. The limit shrinks
+    at most once per round, so one burst of errors does not collapse it.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.9,
+        tolerance: float = 2.0,
+        window: int = 100,
+    ):
+        """
+        Args:
+            initial: Starting number of requests in flight.
+            min_limit: Lowest limit the backoff can reach.
+            max_limit: Highest limit the increase can reach, e.g. Prometheus' ``query.max-concurrency``.
+            backoff: Factor applied to the limit on overload, between 0 and 1.
+            tolerance: Short-term latency, as a multiple of the long-term average, treated as queueing.
+            window: Number of requests the long-term latency average spans; latency is
+                not judged before this many requests (at most 10) have completed.
+        """
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.inflight = 0
+        self.window = window
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self._observed = 0
+        self._since_decrease = int(self.limit)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def __repr__(self):
+        return f"AdaptiveConcurrencyLimiter(limit={self.limit:.1f}, inflight={self.inflight})"
+
+    async def acquire(self):
+        """Waits until the number of requests in flight is below the limit and counts one more."""
+        while self.inflight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    self._wake()  # pass on the slot we were woken for
+                raise
+        self.inflight += 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        """
+        Counts one request less in flight and adapts the limit.
+
+        Args:
+            latency: Seconds the request took if it succeeded, None otherwise.
+            overloaded: True if the request failed with a timeout, 429 or 503.
+        """
+        self.inflight -= 1
+        self._since_decrease += 1
+        if overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._observed += 1
+            if self.latency is None:
+                self.latency = self.baseline = latency
+            else:
+                self.latency += 0.2 * (latency - self.latency)
+                # running mean at first, then an EWMA over about `window` requests
+                self.baseline += max(1.0 / self._observed, 1.0 / self.window) * (latency - self.baseline)
+            if self._observed >= min(10, self.window) and self.latency > self.baseline * self.tolerance:
+                self._decrease()
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _decrease(self):
+        if self._since_decrease < int(self.limit):
+            return
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._since_decrease = 0
+
+    def _wake(self):
+        free = int(self.limit) - self.inflight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
@@ -2,8 +2,21 @@
 Generic data structures for modeling time series and labeled metrics.
 """
 
+import importlib
+import math
+import operator
+import sys
+import weakref
+from array import array
 from datetime import datetime
-from typing import Dict, List, NamedTuple
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from ..utils import parse_duration
+
+try:  # optional, ``pip install aiopromql[numpy]``: vectorizes ColumnarTimeSeries aggregations
+    _np = importlib.import_module("numpy")
+except ImportError:
+    _np = None
 
 
 class MetricLabelSet:
@@ -15,25 +28,63 @@ class MetricLabelSet:
     a label set to be used as a key in Python dictionaries by making it hashable
     and comparable.
 
+    Label sets are stored compactly as a sorted tuple of interned (name, value)
+    pairs with a precomputed hash, and are canonicalized: constructing a label set
+    equal to one that is still alive returns that same object, so label sets that
+    repeat across polls share memory.
+
     Instances of this class are used as keys in the dictionary returned by
     `PrometheusResponseModel.to_metric_map()`, where each MetricLabelSet maps to
     a TimeSeries object.
     """
 
-    def __init__(self, metric: Dict[str, str]):
-        self.dict = metric
-        self._key = frozenset(metric.items())
+    __slots__ = ("pairs", "_hash", "_dict", "__weakref__")
+
+    _canonical: "weakref.WeakValueDictionary[Tuple[Tuple[str, str], ...], MetricLabelSet]" = (
+        weakref.WeakValueDictionary()
+    )
+
+    def __new__(cls, metric: Dict[str, str]):
+        items = metric.items()
+        if not all(type(k) is str and type(v) is str for k, v in items):
+            items = [(_label_text(k, "name"), _label_text(v, f"value of {k!r}")) for k, v in items]
+        pairs = tuple(sorted(items))
+        existing = cls._canonical.get(pairs)
+        if existing is not None:
+            return existing
+        self = super().__new__(cls)
+        self.pairs = tuple((sys.intern(k), sys.intern(v)) for k, v in pairs)
+        self._hash = hash(self.pairs)
+        self._dict = None
+        return cls._canonical.setdefault(self.pairs, self)
+
+    def __reduce__(self):
+        return (MetricLabelSet, (dict(self.pairs),))
+
+    @property
+    def dict(self) -> Dict[str, str]:
+        """
+        The labels as a dictionary, built on first access and cached.
+
+        Equal label sets are one shared object, so this dictionary must not be
+        modified; copy it with ``dict(labels.dict)`` first.
+        """
+        if self._dict is None:
+            self._dict = dict(self.pairs)
+        return self._dict
 
     def __hash__(self) -> int:
-        return hash(self._key)
+        return self._hash
 
     def __eq__(self, other) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, MetricLabelSet):
             return False
-        return self._key == other._key
+        return self._hash == other._hash and self.pairs == other.pairs
 
     def __repr__(self) -> str:
-        return f"MetricLabelSet({self.dict})"
+        return f"MetricLabelSet({dict(self.pairs)})"
 
     def get(self, label: str, default=None):
         """
@@ -48,6 +99,13 @@ class MetricLabelSet:
         return self.dict.get(label, default)
 
 
+def _label_text(text, what: str) -> str:
+    """Return a label name or value as a plain string; numbers and booleans are converted with str()."""
+    if isinstance(text, (str, int, float)):
+        return str(text)
+    raise TypeError(f"Label {what} must be a string, got {type(text).__name__}: {text!r}")
+
+
 class TimeSeriesPoint(NamedTuple):
     """
     A single timestamped data point from a Prometheus time series.
@@ -78,6 +136,79 @@ class TimeSeriesPoint(NamedTuple):
         return f"{self.timestamp.isoformat()} → {self.value:.2f}"
 
 
+class MetricMetadata(NamedTuple):
+    """Type, help text and unit of a metric, as returned by the metadata endpoint."""
+
+    type: str
+    help: str
+    unit: str
+
+
+def _lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Picks `threshold` indices with Largest-Triangle-Three-Buckets, keeping the first and last point."""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # average of the next bucket is the third triangle vertex
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        if nlo >= nhi:
+            nlo, nhi = n - 1, n
+        avg_x = math.fsum(xs[nlo:nhi]) / (nhi - nlo)
+        avg_y = math.fsum(ys[nlo:nhi]) / (nhi - nlo)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
+
+
+def _minmax_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Keeps the minimum and maximum of `threshold // 2` equal-count buckets, in time order."""
+    n = len(xs)
+    buckets = threshold // 2
+    if threshold >= n:
+        return list(range(n))
+    if buckets < 1:
+        return [0]
+    picked: List[int] = []
+    for i in range(buckets):
+        lo, hi = i * n // buckets, (i + 1) * n // buckets
+        window = range(lo, hi)
+        lo_idx = min(window, key=ys.__getitem__)
+        hi_idx = max(window, key=ys.__getitem__)
+        picked.extend(sorted({lo_idx, hi_idx}))
+    return picked
+
+
+_DOWNSAMPLERS: Dict[str, Callable[[Sequence[float], Sequence[float], int], List[int]]] = {
+    "lttb": _lttb_indices,
+    "minmax": _minmax_indices,
+}
+
+
+def _downsample_indices(xs: Sequence[float], ys: Sequence[float], max_points: int, method: str) -> List[int]:
+    try:
+        select = _DOWNSAMPLERS[method]
+    except KeyError:
+        raise ValueError(f"Unknown downsampling method {method!r}") from None
+    if max_points < 1:
+        raise ValueError("max_points must be positive")
+    return select(xs, ys, max_points)
+
+
 class TimeSeries:
     """
     A sequence of timestamped float values (TimeSeriesPoint) with utility methods.
@@ -122,3 +253,557 @@ class TimeSeries:
         """Computes the average of all values."""
         nums = [v.value for v in self.values if isinstance(v.value, (int, float))]
         return sum(nums) / len(nums) if nums else None
+
+    def to_columnar(self) -> "ColumnarTimeSeries":
+        """Returns a ColumnarTimeSeries holding the same points."""
+        return ColumnarTimeSeries.from_points(self.values)
+
+    def downsample(self, max_points: int, method: str = "lttb") -> "TimeSeries":
+        """
+        Reduces the series to at most `max_points` points for plotting.
+
+        Args:
+            max_points: Maximum number of points to keep.
+            method: 'lttb' (Largest-Triangle-Three-Buckets, keeps visual shape) or
+                'minmax' (keeps each bucket's extremes, so spikes survive).
+
+        Returns:
+            A new TimeSeries with a subset of the original points.
+        """
+        points = self.values
+        xs = [p.timestamp.timestamp() for p in points]
+        ys = [p.value for p in points]
+        return TimeSeries([points[i] for i in _downsample_indices(xs, ys, max_points, method)])
+
+
+class LazyTimeSeries(TimeSeries):
+    """
+    A TimeSeries that keeps raw Prometheus `[ts, "value"]` pairs until its points are needed.
+
+    All pairs are converted to TimeSeriesPoint objects in one batch on first access
+    to `values` (iteration, indexing, aggregation). `len()` and `latest()` work on
+    the raw pairs and do not trigger the conversion.
+    """
+
+    def __init__(self, raw: Sequence[Sequence]):
+        """
+        Args:
+            raw: Prometheus (epoch timestamp, string value) pairs.
+        """
+        self._raw: Optional[Sequence[Sequence]] = raw
+        self._values: Optional[List[TimeSeriesPoint]] = None
+
+    @property
+    def values(self) -> List[TimeSeriesPoint]:
+        if self._values is None:
+            self._values = [TimeSeriesPoint.from_prometheus_value(ts, value) for ts, value in self._raw]
+            self._raw = None
+        return self._values
+
+    @values.setter
+    def values(self, values: List[TimeSeriesPoint]):
+        self._values = values
+        self._raw = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """True once the raw pairs have been converted to points."""
+        return self._values is not None
+
+    def __len__(self):
+        return len(self._raw) if self._values is None else len(self._values)
+
+    def __repr__(self):
+        if self._values is None:
+            return f"LazyTimeSeries(<{len(self._raw)} unconverted points>)"
+        return super().__repr__()
+
+    def latest(self) -> TimeSeriesPoint | None:
+        """Returns the latest (most recent) data point, converting only that point if not loaded yet."""
+        if self._values is not None:
+            return super().latest()
+        if not self._raw:
+            return None
+        return TimeSeriesPoint.from_prometheus_value(*max(self._raw, key=lambda pair: float(pair[0])))
+
+
+_RESAMPLE_AGGREGATIONS: Dict[str, Callable[[Sequence[float]], float]] = {
+    "mean": lambda vals: math.fsum(vals) / len(vals),
+    "sum": math.fsum,
+    "min": min,
+    "max": max,
+    "first": lambda vals: vals[0],
+    "last": lambda vals: vals[-1],
+    "count": lambda vals: float(len(vals)),
+}
+
+
+def _view(column: array):
+    """Zero-copy NumPy view of an ``array('d')`` column."""
+    return _np.frombuffer(column, dtype=_np.float64)
+
+
+def _from_numpy(values) -> array:
+    out = array("d")
+    out.frombytes(_np.ascontiguousarray(values, dtype=_np.float64).tobytes())
+    return out
+
+
+class ColumnarTimeSeries:
+    """
+    A time series stored as two contiguous float64 columns.
+
+    Timestamps are kept as epoch seconds and values as floats in `array('d')`
+    buffers, so no `TimeSeriesPoint` or `datetime` object is created per sample.
+    Aggregations run over the columns directly, vectorized with NumPy when it is
+    installed (``pip install aiopromql[numpy]``) and in plain Python otherwise.
+    Iteration and indexing still yield `TimeSeriesPoint` objects, built on demand,
+    so code written against `TimeSeries` keeps working.
+    """
+
+    __slots__ = ("timestamps", "samples")
+
+    def __init__(self, timestamps: Iterable[float] = (), samples: Iterable[float] = ()):
+        """
+        Args:
+            timestamps: Epoch timestamps in seconds, in ascending order.
+            samples: Float values, one per timestamp.
+        """
+        self.timestamps = array("d", timestamps)
+        self.samples = array("d", samples)
+        if len(self.timestamps) != len(self.samples):
+            raise ValueError("timestamps and samples must have the same length")
+
+    @classmethod
+    def _wrap(cls, timestamps: array, samples: array) -> "ColumnarTimeSeries":
+        """Builds a series around existing columns without copying them."""
+        series = cls.__new__(cls)
+        series.timestamps, series.samples = timestamps, samples
+        return series
+
+    @classmethod
+    def from_prometheus_values(cls, values: Iterable[Sequence]) -> "ColumnarTimeSeries":
+        """
+        Builds a columnar series from raw Prometheus `[ts, "value"]` pairs.
+
+        Args:
+            values: Iterable of (epoch timestamp, string value) pairs.
+
+        Returns:
+            A ColumnarTimeSeries instance.
+        """
+        series = cls()
+        append_ts, append_value = series.timestamps.append, series.samples.append
+        for ts, value in values:
+            append_ts(float(ts))
+            append_value(float(value))
+        return series
+
+    @classmethod
+    def from_points(cls, points: Iterable[TimeSeriesPoint]) -> "ColumnarTimeSeries":
+        """Builds a columnar series from TimeSeriesPoint objects."""
+        points = list(points)
+        return cls((p.timestamp.timestamp() for p in points), (p.value for p in points))
+
+    def to_timeseries(self) -> TimeSeries:
+        """Returns a list-backed TimeSeries holding the same points."""
+        return TimeSeries(list(self))
+
+    def __iter__(self) -> Iterator[TimeSeriesPoint]:
+        for ts, value in zip(self.timestamps, self.samples):
+            yield TimeSeriesPoint(datetime.fromtimestamp(ts), value)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ColumnarTimeSeries(self.timestamps[idx], self.samples[idx])
+        return TimeSeriesPoint(datetime.fromtimestamp(self.timestamps[idx]), self.samples[idx])
+
+    def __repr__(self):
+        return f"ColumnarTimeSeries(len={len(self)})"
+
+    def add_point(self, point: TimeSeriesPoint):
+        """Adds a new data point."""
+        self.timestamps.append(point.timestamp.timestamp())
+        self.samples.append(point.value)
+
+    def extend(self, other: Union["ColumnarTimeSeries", TimeSeries]):
+        """Appends another series' points to this one."""
+        if not isinstance(other, ColumnarTimeSeries):
+            other = ColumnarTimeSeries.from_points(other)
+        self.timestamps.extend(other.timestamps)
+        self.samples.extend(other.samples)
+
+    def latest(self) -> TimeSeriesPoint | None:
+        """Returns the latest (most recent) data point, the last one as timestamps are ascending."""
+        return self[-1] if self.timestamps else None
+
+    def average(self) -> float | None:
+        """Computes the average of all values."""
+        if not self.samples:
+            return None
+        if _np is not None:
+            return float(_view(self.samples).mean())
+        return math.fsum(self.samples) / len(self.samples)
+
+    def min(self) -> float | None:
+        """Returns the smallest value."""
+        if _np is not None and self.samples:
+            return float(_view(self.samples).min())
+        return min(self.samples, default=None)
+
+    def max(self) -> float | None:
+        """Returns the largest value."""
+        if _np is not None and self.samples:
+            return float(_view(self.samples).max())
+        return max(self.samples, default=None)
+
+    def sum(self) -> float:
+        """Returns the sum of all values."""
+        if _np is not None:
+            return float(_view(self.samples).sum())
+        return math.fsum(self.samples)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Returns the q-quantile of all values using linear interpolation.
+
+        Args:
+            q: Quantile between 0 and 1.
+        """
+        if not 0.0 <= q <= 1.0:
+            raise ValueError("q must be between 0 and 1")
+        if not self.samples:
+            return None
+        if _np is not None:
+            return float(_np.quantile(_view(self.samples), q))
+        ordered = sorted(self.samples)
+        rank = q * (len(ordered) - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+    def diff(self) -> "ColumnarTimeSeries":
+        """Returns the difference between consecutive values, stamped at the later sample."""
+        vals = self.samples
+        if _np is not None:
+            return ColumnarTimeSeries._wrap(self.timestamps[1:], _from_numpy(_np.diff(_view(vals))))
+        return ColumnarTimeSeries(self.timestamps[1:], map(operator.sub, vals[1:], vals[:-1]))
+
+    def rate(self) -> "ColumnarTimeSeries":
+        """
+        Returns the per-second increase between consecutive samples of a counter.
+
+        A decrease is treated as a counter reset, as Prometheus does, so the
+        increase across it is the value after the reset.
+        """
+        ts, vals = self.timestamps, self.samples
+        if _np is not None and len(vals) > 1:
+            v = _view(vals)
+            delta = _np.diff(v)
+            delta = _np.where(delta < 0, v[1:], delta)
+            elapsed = _np.diff(_view(ts))
+            with _np.errstate(divide="ignore", invalid="ignore"):
+                rates = _np.where(elapsed > 0, delta / elapsed, math.nan)
+            return ColumnarTimeSeries._wrap(ts[1:], _from_numpy(rates))
+        rates = array("d")
+        for i in range(1, len(vals)):
+            delta = vals[i] - vals[i - 1]
+            if delta < 0:
+                delta = vals[i]
+            elapsed = ts[i] - ts[i - 1]
+            rates.append(delta / elapsed if elapsed > 0 else math.nan)
+        return ColumnarTimeSeries(ts[1:], rates)
+
+    def resample(self, step: Union[str, float], how: str = "mean") -> "ColumnarTimeSeries":
+        """
+        Aggregates samples into step-aligned buckets.
+
+        Args:
+            step: Bucket width in seconds or as a Prometheus duration (e.g. '5m').
+            how: One of 'mean', 'sum', 'min', 'max', 'first', 'last' or 'count'.
+
+        Returns:
+            A ColumnarTimeSeries with one point per non-empty bucket, stamped at the bucket start.
+        """
+        try:
+            agg = _RESAMPLE_AGGREGATIONS[how]
+        except KeyError:
+            raise ValueError(f"Unknown aggregation {how!r}") from None
+        width = parse_duration(step)
+        if width <= 0:
+            raise ValueError("step must be positive")
+        if _np is not None and self.samples:
+            return self._resample_numpy(width, how)
+        out = ColumnarTimeSeries()
+        bucket_vals: List[float] = []
+        bucket = None
+        for ts, value in zip(self.timestamps, self.samples):
+            start = math.floor(ts / width) * width
+            if start != bucket and bucket_vals:
+                out.timestamps.append(bucket)
+                out.samples.append(agg(bucket_vals))
+                bucket_vals = []
+            bucket = start
+            bucket_vals.append(value)
+        if bucket_vals:
+            out.timestamps.append(bucket)
+            out.samples.append(agg(bucket_vals))
+        return out
+
+    def _resample_numpy(self, width: float, how: str) -> "ColumnarTimeSeries":
+        vals = _view(self.samples)
+        buckets = _np.floor(_view(self.timestamps) / width) * width
+        # each run of equal bucket starts is one bucket
+        starts = _np.flatnonzero(_np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        counts = _np.diff(_np.append(starts, len(vals)))
+        if how == "count":
+            out = counts
+        elif how == "first":
+            out = vals[starts]
+        elif how == "last":
+            out = vals[starts + counts - 1]
+        elif how == "min":
+            out = _np.minimum.reduceat(vals, starts)
+        elif how == "max":
+            out = _np.maximum.reduceat(vals, starts)
+        else:
+            out = _np.add.reduceat(vals, starts)
+            if how == "mean":
+                out = out / counts
+        return ColumnarTimeSeries._wrap(_from_numpy(buckets[starts]), _from_numpy(out))
+
+    def downsample(self, max_points: int, method: str = "lttb") -> "ColumnarTimeSeries":
+        """
+        Reduces the series to at most `max_points` points for plotting.
+
+        Args:
+            max_points: Maximum number of points to keep.
+            method: 'lttb' (Largest-Triangle-Three-Buckets, keeps visual shape) or
+                'minmax' (keeps each bucket's extremes, so spikes survive).
+
+        Returns:
+            A new ColumnarTimeSeries with a subset of the original points.
+        """
+        ts, vals = self.timestamps, self.samples
+        indices = _downsample_indices(ts, vals, max_points, method)
+        return ColumnarTimeSeries((ts[i] for i in indices), (vals[i] for i in indices))
+
+
+class RingTimeSeries:
+    """
+    A fixed-capacity, time-ordered series in preallocated float64 ring buffers.
+
+    Appending is O(1): once `capacity` samples are stored, each new sample
+    overwrites the oldest one. With `max_age`, samples older than that many
+    seconds before the newest one are evicted as well. A running sum and count
+    make `latest()` and `average()` O(1), and time slicing uses binary search.
+
+    Reads follow the `TimeSeries` / `ColumnarTimeSeries` interface: iteration and
+    indexing yield `TimeSeriesPoint` objects, and `timestamps` / `samples` return
+    the stored columns, oldest first, as new arrays.
+    """
+
+    __slots__ = ("capacity", "max_age", "_ts", "_vals", "_head", "_count", "_sum", "_nonfinite", "_evicted")
+
+    def __init__(
+        self,
+        capacity: int,
+        max_age: Union[str, float, None] = None,
+        points: Iterable[TimeSeriesPoint] = (),
+    ):
+        """
+        Args:
+            capacity: Maximum number of samples kept.
+            max_age: Optional age, in seconds or as a Prometheus duration, relative to
+                the newest sample past which samples are evicted.
+            points: Initial points, in ascending time order.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.max_age = None if max_age is None else parse_duration(max_age)
+        self._ts = array("d", bytes(8 * capacity))
+        self._vals = array("d", bytes(8 * capacity))
+        self._head = 0
+        self._count = 0
+        self._sum = 0.0
+        self._nonfinite = 0
+        self._evicted = 0
+        for point in points:
+            self.add_point(point)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self) -> Iterator[TimeSeriesPoint]:
+        for ts, value in zip(self.timestamps, self.samples):
+            yield TimeSeriesPoint(datetime.fromtimestamp(ts), value)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ColumnarTimeSeries(self.timestamps[idx], self.samples[idx])
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError("RingTimeSeries index out of range")
+        i = (self._head + idx) % self.capacity
+        return TimeSeriesPoint(datetime.fromtimestamp(self._ts[i]), self._vals[i])
+
+    def __repr__(self):
+        return f"RingTimeSeries(len={self._count}, capacity={self.capacity})"
+
+    def _column(self, buffer: array, lo: int = 0, hi: Optional[int] = None) -> array:
+        """Copies logical positions [lo, hi) of a ring buffer, oldest first."""
+        hi = self._count if hi is None else hi
+        start = (self._head + lo) % self.capacity
+        end = start + max(0, hi - lo)
+        if end <= self.capacity:
+            return buffer[start:end]
+        return buffer[start:] + buffer[: end - self.capacity]
+
+    @property
+    def timestamps(self) -> array:
+        """Epoch timestamps in seconds, oldest first."""
+        return self._column(self._ts)
+
+    @property
+    def samples(self) -> array:
+        """Values, oldest first."""
+        return self._column(self._vals)
+
+    @property
+    def values(self) -> List[TimeSeriesPoint]:
+        """The points as a new list, for code written against TimeSeries."""
+        return list(self)
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """Epoch timestamp of the newest sample, or None if empty."""
+        if not self._count:
+            return None
+        return self._ts[(self._head + self._count - 1) % self.capacity]
+
+    def append(self, timestamp: float, value: float):
+        """
+        Adds a sample, evicting the oldest one when full and any older than `max_age`.
+
+        Args:
+            timestamp: Epoch timestamp in seconds, not older than the newest stored one.
+            value: Sample value.
+        """
+        last = self.last_timestamp
+        if last is not None and timestamp < last:
+            raise ValueError("samples must be appended in ascending time order")
+        if self._count == self.capacity:
+            self._evict_oldest()
+        i = (self._head + self._count) % self.capacity
+        self._ts[i] = timestamp
+        self._vals[i] = value
+        self._count += 1
+        if math.isfinite(value):
+            self._sum += value
+        else:
+            self._nonfinite += 1
+        if self.max_age is not None:
+            self.evict_before(timestamp - self.max_age)
+
+    def add_point(self, point: TimeSeriesPoint):
+        """Adds a new data point."""
+        self.append(point.timestamp.timestamp(), point.value)
+
+    def extend(self, other: Union["RingTimeSeries", ColumnarTimeSeries, TimeSeries]):
+        """Appends another series' points to this one."""
+        if isinstance(other, (RingTimeSeries, ColumnarTimeSeries)):
+            for ts, value in zip(other.timestamps, other.samples):
+                self.append(ts, value)
+        else:
+            for point in other:
+                self.add_point(point)
+
+    def _evict_oldest(self):
+        value = self._vals[self._head]
+        if math.isfinite(value):
+            self._sum -= value
+        else:
+            self._nonfinite -= 1
+        self._head = (self._head + 1) % self.capacity
+        self._count -= 1
+        self._evicted += 1
+        if self._evicted >= self.capacity:
+            # recompute the running sum once per capacity evictions so rounding errors cannot accumulate
+            self._evicted = 0
+            self._sum = math.fsum(v for v in self._column(self._vals) if math.isfinite(v))
+
+    def evict_before(self, cutoff: float) -> int:
+        """
+        Drops the samples older than `cutoff`.
+
+        Args:
+            cutoff: Epoch timestamp in seconds.
+
+        Returns:
+            The number of samples dropped.
+        """
+        dropped = 0
+        while self._count and self._ts[self._head] < cutoff:
+            self._evict_oldest()
+            dropped += 1
+        return dropped
+
+    def clear(self):
+        """Drops all samples."""
+        self._head = self._count = self._evicted = self._nonfinite = 0
+        self._sum = 0.0
+
+    def latest(self) -> TimeSeriesPoint | None:
+        """Returns the latest (most recent) data point."""
+        return self[-1] if self._count else None
+
+    def sum(self) -> float:
+        """Returns the sum of all values."""
+        if self._nonfinite:
+            return math.fsum(self.samples)
+        return self._sum
+
+    def average(self) -> float | None:
+        """Computes the average of all values."""
+        return self.sum() / self._count if self._count else None
+
+    def _bisect(self, timestamp: float, right: bool) -> int:
+        lo, hi = 0, self._count
+        ts, head, capacity = self._ts, self._head, self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = ts[(head + mid) % capacity]
+            if t < timestamp or (right and t == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def between(self, start: Optional[float] = None, end: Optional[float] = None) -> ColumnarTimeSeries:
+        """
+        Returns the samples with ``start <= timestamp <= end``.
+
+        Args:
+            start: Epoch timestamp in seconds; None means from the oldest sample.
+            end: Epoch timestamp in seconds; None means up to the newest sample.
+        """
+        lo = 0 if start is None else self._bisect(start, right=False)
+        hi = self._count if end is None else self._bisect(end, right=True)
+        return ColumnarTimeSeries(self._column(self._ts, lo, hi), self._column(self._vals, lo, hi))
+
+    def to_columnar(self) -> ColumnarTimeSeries:
+        """Returns a ColumnarTimeSeries holding the same points."""
+        return ColumnarTimeSeries(self.timestamps, self.samples)
+
+    def to_timeseries(self) -> TimeSeries:
+        """Returns a list-backed TimeSeries holding the same points."""
+        return TimeSeries(list(self))
+
+    def downsample(self, max_points: int, method: str = "lttb") -> ColumnarTimeSeries:
+        """Reduces the series to at most `max_points` points for plotting, see ColumnarTimeSeries.downsample."""
+        return self.to_columnar().downsample(max_points, method)
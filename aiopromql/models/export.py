@@ -0,0 +1,148 @@
+"""
+Export of Prometheus results to pandas DataFrames and Arrow tables.
+
+The exporters build contiguous timestamp and value columns straight from the
+decoded `[ts, "value"]` pairs, without creating a `TimeSeriesPoint` or `datetime`
+per sample. Labels become categorical (pandas) or dictionary-encoded (Arrow)
+columns. pandas and pyarrow are optional: install ``aiopromql[pandas]`` or
+``aiopromql[arrow]``.
+"""
+
+import importlib
+from array import array
+from typing import Any, Dict, Iterable, List, Literal, Sequence, Tuple
+
+Layout = Literal["long", "wide"]
+
+# (metric labels, [(ts, "value"), ...]) for every series in a result
+Rows = Iterable[Tuple[Dict[str, str], Sequence[Sequence]]]
+
+
+class _Columns:
+    """Column buffers shared by the pandas and Arrow exporters."""
+
+    def __init__(self, rows: Rows):
+        self.timestamps = array("d")
+        self.values = array("d")
+        self.series_ids = array("i")
+        self.series_labels: List[Dict[str, str]] = []
+        self.counts: List[int] = []
+        for metric, samples in rows:
+            series_id = len(self.series_labels)
+            self.series_labels.append(metric)
+            self.counts.append(len(samples))
+            self.timestamps.extend([float(s[0]) for s in samples])
+            self.values.extend([float(s[1]) for s in samples])
+            self.series_ids.extend(array("i", [series_id]) * len(samples))
+        self.label_names = sorted({name for labels in self.series_labels for name in labels})
+
+    def label_codes(self, name: str) -> Tuple[List[str], array]:
+        """Return the distinct values of a label and one code per row, -1 where the label is missing."""
+        categories: Dict[str, int] = {}
+        codes = array("i")
+        for labels, count in zip(self.series_labels, self.counts):
+            value = labels.get(name)
+            code = -1 if value is None else categories.setdefault(value, len(categories))
+            codes.extend(array("i", [code]) * count)
+        return list(categories), codes
+
+    def series_names(self) -> List[str]:
+        """Return a PromQL-style selector string naming each series."""
+        return ["{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}" for labels in self.series_labels]
+
+
+def _import(module: str, extra: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(
+            f"{module} is required for this export; install it with 'pip install aiopromql[{extra}]'"
+        ) from None
+
+
+def to_dataframe(rows: Rows, layout: Layout = "long") -> Any:
+    """
+    Build a pandas DataFrame from Prometheus result rows.
+
+    Args:
+        rows: (metric labels, samples) pairs, one per series.
+        layout: ``"long"`` for one row per sample with a ``timestamp`` and ``value``
+            column plus one categorical column per label; ``"wide"`` for one row per
+            timestamp and one column per series, with a label MultiIndex on the columns.
+
+    Returns:
+        A pandas DataFrame with UTC ``datetime64`` timestamps.
+    """
+    pd = _import("pandas", "pandas")
+    np = _import("numpy", "pandas")
+    cols = _Columns(rows)
+    timestamps = pd.to_datetime(np.frombuffer(cols.timestamps, dtype=np.float64) * 1000, unit="ms", utc=True)
+    values = np.frombuffer(cols.values, dtype=np.float64)
+
+    if layout == "long":
+        data = {"timestamp": timestamps, "value": values}
+        for name in cols.label_names:
+            categories, codes = cols.label_codes(name)
+            data[name] = pd.Categorical.from_codes(np.frombuffer(codes, dtype=np.int32), categories=categories)
+        return pd.DataFrame(data)
+    if layout == "wide":
+        long = pd.DataFrame(
+            {"timestamp": timestamps, "series": np.frombuffer(cols.series_ids, dtype=np.int32), "value": values}
+        )
+        wide = long.pivot(index="timestamp", columns="series", values="value")
+        wide = wide.reindex(columns=range(len(cols.series_labels)))
+        if cols.label_names:
+            wide.columns = pd.MultiIndex.from_tuples(
+                [tuple(labels.get(name) for name in cols.label_names) for labels in cols.series_labels],
+                names=cols.label_names,
+            )
+        return wide
+    raise ValueError(f"Unknown layout {layout!r}")
+
+
+def to_arrow(rows: Rows, layout: Layout = "long") -> Any:
+    """
+    Build a pyarrow Table from Prometheus result rows.
+
+    Args:
+        rows: (metric labels, samples) pairs, one per series.
+        layout: ``"long"`` for one row per sample with a ``timestamp`` and ``value``
+            column plus one dictionary-encoded column per label; ``"wide"`` for one
+            row per timestamp and one column per series, named by its label selector.
+
+    Returns:
+        A pyarrow Table with millisecond UTC timestamps.
+    """
+    pa = _import("pyarrow", "arrow")
+    pc = _import("pyarrow.compute", "arrow")
+    cols = _Columns(rows)
+
+    def float_column(buf: array):
+        return pa.Array.from_buffers(pa.float64(), len(buf), [None, pa.py_buffer(buf)])
+
+    def timestamp_column(column):
+        millis = pc.round(pc.multiply(column, 1000.0))
+        return millis.cast(pa.int64()).cast(pa.timestamp("ms", tz="UTC"))
+
+    if layout == "long":
+        columns = {"timestamp": timestamp_column(float_column(cols.timestamps)), "value": float_column(cols.values)}
+        for name in cols.label_names:
+            categories, codes = cols.label_codes(name)
+            indices = pa.Array.from_buffers(pa.int32(), len(codes), [None, pa.py_buffer(codes)])
+            # series without this label get a null instead of code -1
+            indices = pc.if_else(pc.less(indices, 0), pa.scalar(None, pa.int32()), indices)
+            columns[name] = pa.DictionaryArray.from_arrays(indices, pa.array(categories, pa.string()))
+        return pa.table(columns)
+    if layout == "wide":
+        timestamps, values = float_column(cols.timestamps), float_column(cols.values)
+        grid = pc.unique(timestamps)
+        grid = pc.take(grid, pc.sort_indices(grid))
+        columns = {"timestamp": timestamp_column(grid)}
+        offset = 0
+        for name, count in zip(cols.series_names(), cols.counts):
+            # position of each grid timestamp within the series, null where it has no sample
+            positions = pc.index_in(grid, value_set=timestamps.slice(offset, count))
+            columns[name] = pc.take(values.slice(offset, count), positions)
+            offset += count
+        return pa.table(columns)
+    raise ValueError(f"Unknown layout {layout!r}")
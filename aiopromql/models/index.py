@@ -0,0 +1,181 @@
+"""
+Inverted label index for selecting and grouping the series of a metric map.
+"""
+
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Union
+
+from ..utils import Matcher, Selector, _matchers_from_labels
+from .core import MetricLabelSet
+
+
+class LabelIndex:
+    """
+    Maps label name -> label value -> ids of the series carrying that pair.
+
+    Matching follows Prometheus: ``=`` and ``!=`` compare whole values, ``=~`` and
+    ``!~`` are fully anchored regular expressions, and a matcher that accepts the
+    empty string also matches series without the label. Regular expressions are
+    tested once per distinct label value, not once per series.
+
+    Example::
+
+        index = LabelIndex(response.to_metric_map())
+        web = index.select(job="api", instance__re="web-.*")   # {MetricLabelSet: TimeSeries}
+        per_job = index.group_by(["job"])                      # {MetricLabelSet({"job": ...}): {...}}
+    """
+
+    def __init__(self, metric_map: Optional[Mapping[MetricLabelSet, Any]] = None):
+        """
+        Args:
+            metric_map: Series to index, e.g. the result of `to_metric_map()`.
+        """
+        self.labels: List[MetricLabelSet] = []
+        self.series: List[Any] = []
+        self._postings: Dict[str, Dict[str, array]] = {}
+        self._labelled: Dict[str, Set[int]] = {}  # label name -> ids of the series carrying it, built on demand
+        for labels, series in (metric_map or {}).items():
+            self.add(labels, series)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __repr__(self):
+        return f"LabelIndex(series={len(self.labels)}, labels={len(self._postings)})"
+
+    def add(self, labels: MetricLabelSet, series: Any) -> int:
+        """Indexes one more series and returns its id."""
+        series_id = len(self.labels)
+        self.labels.append(labels)
+        self.series.append(series)
+        for name, value in labels.pairs:
+            self._labelled.pop(name, None)
+            values = self._postings.get(name)
+            if values is None:
+                values = self._postings[name] = {}
+            ids = values.get(value)
+            if ids is None:
+                ids = values[value] = array("i")
+            ids.append(series_id)
+        return series_id
+
+    def names(self) -> List[str]:
+        """Returns the label names present on any series, sorted."""
+        return sorted(self._postings)
+
+    def values(self, name: str) -> List[str]:
+        """Returns the distinct values of label `name`, sorted."""
+        return sorted(self._postings.get(name, ()))
+
+    def _unlabelled_ids(self, name: str) -> Set[int]:
+        """Ids of the series without label `name`; the ids carrying it are cached per name."""
+        labelled = self._labelled.get(name)
+        if labelled is None:
+            labelled = self._labelled[name] = set().union(*self._postings.get(name, {}).values())
+        return set(range(len(self.labels))) - labelled
+
+    def _matching(self, matcher: Matcher) -> Set[int]:
+        """Ids of the series matched by one matcher."""
+        values = self._postings.get(matcher.name, {})
+        if matcher.op in ("=", "!="):
+            ids = set(values.get(matcher.value, ()))
+            if matcher.value == "":
+                # series without the label have it empty
+                ids |= self._unlabelled_ids(matcher.name)
+            if matcher.op == "!=":
+                ids = set(range(len(self.labels))) - ids
+            return ids
+        if matcher.op not in ("=~", "!~"):
+            raise ValueError(f"Unknown matcher operator {matcher.op!r}")
+        accepts = re.compile(matcher.value).fullmatch
+        negate = matcher.op == "!~"
+        ids = set()
+        for value, posting in values.items():
+            if bool(accepts(value)) != negate:
+                ids.update(posting)
+        if bool(accepts("")) != negate:
+            ids |= self._unlabelled_ids(matcher.name)
+        return ids
+
+    def ids(self, *matchers: Union[Matcher, Selector], **labels) -> List[int]:
+        """
+        Returns the ids of the series matched by all matchers, in insertion order.
+
+        Args:
+            matchers: Label matchers, or Selectors whose metric name and matchers are used.
+            labels: Matchers as keywords, with the ``__ne``, ``__re`` and ``__nre`` suffixes of Selector.
+        """
+        flat: List[Matcher] = []
+        for matcher in matchers:
+            if isinstance(matcher, Selector):
+                if matcher.metric:
+                    flat.append(Matcher("__name__", "=", matcher.metric))
+                flat.extend(matcher.matchers)
+            else:
+                flat.append(matcher)
+        flat.extend(_matchers_from_labels(labels))
+        if not flat:
+            return list(range(len(self.labels)))
+
+        def cost(m: Matcher):
+            # equality matchers are cheap and usually the most selective, so they go first
+            return (0, len(self._postings.get(m.name, {}).get(m.value, ()))) if m.op == "=" else (1, 0)
+
+        flat.sort(key=cost)
+        selected: Optional[Set[int]] = None
+        for matcher in flat:
+            ids = self._matching(matcher)
+            selected = ids if selected is None else selected & ids
+            if not selected:
+                return []
+        return sorted(selected)
+
+    def select(self, *matchers: Union[Matcher, Selector], **labels) -> Dict[MetricLabelSet, Any]:
+        """Returns the series matched by all matchers as a metric map; arguments as for `ids`."""
+        return {self.labels[i]: self.series[i] for i in self.ids(*matchers, **labels)}
+
+    def group_by(
+        self,
+        labels: Sequence[str],
+        without: bool = False,
+        matchers: Iterable[Union[Matcher, Selector]] = (),
+    ) -> Dict[MetricLabelSet, Dict[MetricLabelSet, Any]]:
+        """
+        Partitions the series by the values of some labels, like PromQL's ``by`` / ``without``.
+
+        Args:
+            labels: Label names forming the group key.
+            without: If True, the key is every label except `labels` and ``__name__``.
+            matchers: Optional matchers restricting the series that are grouped.
+
+        Returns:
+            Group key label set -> metric map of the series in that group.
+        """
+        matchers = list(matchers)
+        ids = self.ids(*matchers) if matchers else range(len(self.labels))
+        groups: Dict[Any, Dict[MetricLabelSet, Any]] = {}
+        if not without and len(labels) == 1:
+            # one label: read the groups straight off its postings
+            (name,) = labels
+            keep = set(ids) if matchers else None
+            grouped: Set[int] = set()
+            for value, posting in self._postings.get(name, {}).items():
+                members = [i for i in posting if keep is None or i in keep]
+                if members:
+                    groups[MetricLabelSet({name: value})] = {self.labels[i]: self.series[i] for i in members}
+                    grouped.update(members)
+            rest = [i for i in ids if i not in grouped]
+            if rest:
+                groups[MetricLabelSet({})] = {self.labels[i]: self.series[i] for i in rest}
+            return groups
+        dropped = {*labels, "__name__"} if without else None
+        wanted = set(labels)
+        for i in ids:
+            label_set = self.labels[i]
+            if dropped is not None:
+                key = MetricLabelSet({k: v for k, v in label_set.pairs if k not in dropped})
+            else:
+                key = MetricLabelSet({k: v for k, v in label_set.pairs if k in wanted})
+            groups.setdefault(key, {})[label_set] = self.series[i]
+        return groups
@@ -0,0 +1,408 @@
+"""
+Metric maps aligned onto a shared timestamp grid, for client-side post-processing.
+
+A `SeriesMatrix` holds one float64 row per series and one column per timestamp,
+with NaN where a series has no sample. Aggregation by labels, binary operations
+matched on labels and top-k selection then work row- and column-wise, the way
+PromQL evaluates them, without re-querying Prometheus. With NumPy installed
+(``pip install aiopromql[numpy]``) they are vectorized over whole rows and groups.
+"""
+
+import math
+import operator
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from . import core
+from .core import ColumnarTimeSeries, MetricLabelSet, RingTimeSeries, TimeSeries
+
+AnySeries = Union[TimeSeries, ColumnarTimeSeries, RingTimeSeries]
+Operand = Union["SeriesMatrix", float, int]
+
+NAN = math.nan
+
+
+def _nan_row(width: int) -> array:
+    return array("d", [NAN]) * width
+
+
+def _present(values: Iterable[float]) -> List[float]:
+    return [v for v in values if v == v]
+
+
+def _div(a: float, b: float) -> float:
+    if b:
+        return a / b
+    if a != a or a == 0:
+        return NAN
+    return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _mod(a: float, b: float) -> float:
+    return math.fmod(a, b) if b else NAN
+
+
+def _pow(a: float, b: float) -> float:
+    # math.pow raises where IEEE 754 (and PromQL) give a value
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        odd = float(b).is_integer() and b % 2 == 1
+        return -math.inf if a < 0 and odd else math.inf
+    except ValueError:
+        if a == 0:  # zero to a negative power; -0 keeps its sign for odd integer powers
+            odd = float(b).is_integer() and b % 2 == 1
+            return math.copysign(math.inf, a) if odd else math.inf
+        return NAN  # negative base, non-integer exponent
+
+
+_BINARY_OPS: Dict[str, Callable[[float, float], float]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _div,
+    "%": _mod,
+    "^": _pow,
+}
+
+# Aggregations over the present (non-NaN) values of one column or row; callers use NaN when there are none.
+_AGGREGATIONS: Dict[str, Callable[[List[float]], float]] = {
+    "sum": math.fsum,
+    "mean": lambda vals: math.fsum(vals) / len(vals),
+    "avg": lambda vals: math.fsum(vals) / len(vals),
+    "min": min,
+    "max": max,
+    "count": lambda vals: float(len(vals)),
+    "last": lambda vals: vals[-1],
+}
+
+
+def _numpy_op(op: str) -> Callable:
+    """The NumPy ufunc of a binary operator; with IEEE semantics it gives the same ±Inf/NaN as `_BINARY_OPS`."""
+    np = core._np
+    return {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide, "%": np.fmod, "^": np.power}[op]
+
+
+def _numpy_aggregate(rows: List[array], how: str) -> array:
+    """Aggregates the columns of a group of rows over their present values, NaN where there are none."""
+    np = core._np
+    block = np.vstack([core._view(row) for row in rows])
+    present = ~np.isnan(block)
+    counts = present.sum(axis=0)
+    with np.errstate(all="ignore"):
+        if how == "count":
+            out = counts.astype(np.float64)
+        elif how == "min":
+            out = np.fmin.reduce(block, axis=0)
+        elif how == "max":
+            out = np.fmax.reduce(block, axis=0)
+        elif how == "last":
+            last = len(rows) - 1 - np.argmax(present[::-1], axis=0)
+            out = block[last, np.arange(block.shape[1])]
+        else:
+            out = np.nansum(block, axis=0)
+            if how in ("mean", "avg"):
+                out = out / counts
+    return core._from_numpy(np.where(counts > 0, out, NAN))
+
+
+def _aggregation(how: str) -> Callable[[List[float]], float]:
+    try:
+        return _AGGREGATIONS[how]
+    except KeyError:
+        raise ValueError(f"Unknown aggregation {how!r}") from None
+
+
+def _columns(series: AnySeries) -> Tuple[Sequence[float], Sequence[float]]:
+    if isinstance(series, (ColumnarTimeSeries, RingTimeSeries)):
+        return series.timestamps, series.samples
+    return [p.timestamp.timestamp() for p in series], [p.value for p in series]
+
+
+def _keep(labels: MetricLabelSet, names: Sequence[str], without: bool) -> MetricLabelSet:
+    if without:
+        return MetricLabelSet({k: v for k, v in labels.pairs if k not in names})
+    return MetricLabelSet({k: v for k, v in labels.pairs if k in names})
+
+
+class SeriesMatrix:
+    """
+    Series aligned onto a shared, ascending timestamp grid as a 2-D matrix.
+
+    ``rows[i][j]`` is the value of series ``labels[i]`` at ``timestamps[j]``, NaN
+    if it has no sample there. Operations return new matrices.
+
+    NaN stands for a missing sample, so NaN values reported by Prometheus are
+    treated as missing too: aggregations and `reduce` skip them and
+    `to_metric_map` leaves them out.
+    """
+
+    __slots__ = ("labels", "timestamps", "rows", "_index")
+
+    def __init__(self, labels: Sequence[MetricLabelSet], timestamps: Iterable[float], rows: Iterable[Iterable[float]]):
+        """
+        Args:
+            labels: Label set of each series; must be unique.
+            timestamps: Epoch timestamps of the columns in seconds, in ascending order.
+            rows: One row of values per series, as long as `timestamps`.
+        """
+        self.labels: List[MetricLabelSet] = list(labels)
+        self.timestamps = array("d", timestamps)
+        self.rows: List[array] = [array("d", row) for row in rows]
+        if len(self.rows) != len(self.labels):
+            raise ValueError("expected one row per label set")
+        if any(len(row) != len(self.timestamps) for row in self.rows):
+            raise ValueError("every row must have one value per timestamp")
+        self._index = {labels: i for i, labels in enumerate(self.labels)}
+        if len(self._index) != len(self.labels):
+            raise ValueError("label sets must be unique")
+
+    @classmethod
+    def from_metric_map(cls, metric_map: Mapping[MetricLabelSet, AnySeries]) -> "SeriesMatrix":
+        """
+        Aligns the series of a metric map onto the union of their timestamps.
+
+        Series of one range query share the step grid, so the union has no more
+        columns than the longest series.
+
+        Args:
+            metric_map: Result of `to_metric_map()` or `parse_metric_map()`, with any series type.
+        """
+        columns = [_columns(series) for series in metric_map.values()]
+        grid = sorted({ts for timestamps, _ in columns for ts in timestamps})
+        position = {ts: j for j, ts in enumerate(grid)}
+        rows = []
+        for timestamps, samples in columns:
+            row = _nan_row(len(grid))
+            for ts, value in zip(timestamps, samples):
+                row[position[ts]] = value
+            rows.append(row)
+        return cls(list(metric_map), grid, rows)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(number of series, number of timestamps)."""
+        return len(self.rows), len(self.timestamps)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[MetricLabelSet]:
+        return iter(self.labels)
+
+    def __contains__(self, labels) -> bool:
+        return labels in self._index
+
+    def __getitem__(self, labels: MetricLabelSet) -> ColumnarTimeSeries:
+        return self._series(self.rows[self._index[labels]])
+
+    def __repr__(self):
+        return f"SeriesMatrix(series={len(self.rows)}, timestamps={len(self.timestamps)})"
+
+    def _series(self, row: array) -> ColumnarTimeSeries:
+        pairs = [(ts, v) for ts, v in zip(self.timestamps, row) if v == v]
+        return ColumnarTimeSeries((ts for ts, _ in pairs), (v for _, v in pairs))
+
+    def to_metric_map(self) -> Dict[MetricLabelSet, ColumnarTimeSeries]:
+        """Returns the series as a metric map, leaving out the NaN gaps."""
+        return {labels: self._series(row) for labels, row in zip(self.labels, self.rows)}
+
+    def reindex(self, timestamps: Iterable[float]) -> "SeriesMatrix":
+        """Returns the matrix on another timestamp grid, with NaN at timestamps not in this one."""
+        grid = array("d", timestamps)
+        if grid == self.timestamps:
+            return self
+        position = {ts: j for j, ts in enumerate(self.timestamps)}
+        take = [position.get(ts) for ts in grid]
+        rows = [array("d", [NAN if j is None else row[j] for j in take]) for row in self.rows]
+        return SeriesMatrix(self.labels, grid, rows)
+
+    def group_by(self, labels: Sequence[str] = (), how: str = "sum", without: bool = False) -> "SeriesMatrix":
+        """
+        Aggregates the series per timestamp within groups of equal label values, like ``sum by (...)``.
+
+        Args:
+            labels: Label names that identify a group; with an empty list, all series form one group.
+            how: One of 'sum', 'mean' (or 'avg'), 'min', 'max', 'count' or 'last'.
+            without: If True, group by all labels except `labels` and ``__name__``, like ``sum without (...)``.
+
+        Returns:
+            One series per group, labelled with the grouping labels. Columns where no
+            series of a group has a value are NaN.
+        """
+        agg = _aggregation(how)
+        names = [*labels, "__name__"] if without else list(labels)
+        groups: Dict[MetricLabelSet, List[array]] = {}
+        for label_set, row in zip(self.labels, self.rows):
+            groups.setdefault(_keep(label_set, names, without), []).append(row)
+        out_rows = []
+        for rows in groups.values():
+            if len(rows) == 1 and how in ("sum", "mean", "avg", "min", "max", "last"):
+                out_rows.append(array("d", rows[0]))
+                continue
+            if core._np is not None:
+                out_rows.append(_numpy_aggregate(rows, how))
+                continue
+            out = array("d")
+            for column in zip(*rows):
+                present = _present(column)
+                out.append(agg(present) if present else NAN)
+            out_rows.append(out)
+        return SeriesMatrix(list(groups), self.timestamps, out_rows)
+
+    def binary(
+        self,
+        other: Operand,
+        op: str,
+        on: Optional[Sequence[str]] = None,
+        ignoring: Sequence[str] = (),
+        group: Optional[str] = None,
+    ) -> "SeriesMatrix":
+        """
+        Applies an arithmetic operator element-wise, with PromQL vector matching.
+
+        Series of both sides are paired when their labels, restricted to `on` or
+        without `ignoring` (and always without ``__name__``), are equal; unmatched
+        series are dropped. The matrices are aligned on the union of their timestamps.
+
+        Args:
+            other: Another SeriesMatrix, or a number applied to every value.
+            op: One of ``+ - * / % ^``.
+            on: Only match on these labels.
+            ignoring: Labels to leave out when matching.
+            group: ``"left"`` or ``"right"`` for many-to-one matching, like
+                ``group_left`` / ``group_right``: several series of that side may match
+                one series of the other and keep their own labels.
+
+        Returns:
+            One series per match, labelled with the matching labels (or the labels of
+            the `group` side). Division by zero gives ±Inf or NaN, as in PromQL.
+
+        Raises:
+            ValueError: If several series of a side that must be unique share the same
+                matching labels.
+        """
+        try:
+            fn = _BINARY_OPS[op]
+        except KeyError:
+            raise ValueError(f"Unknown operator {op!r}") from None
+        if group not in (None, "left", "right"):
+            raise ValueError("group must be 'left', 'right' or None")
+        if not isinstance(other, SeriesMatrix):
+            return self._scalar(float(other), op)
+
+        grid = sorted(set(self.timestamps) | set(other.timestamps))
+        left, right = self.reindex(grid), other.reindex(grid)
+        many, one = (right, left) if group == "right" else (left, right)
+        one_rows = dict(zip(one._signatures(on, ignoring, unique=True), one.rows))
+        labels, rows = [], []
+        for i, signature in enumerate(many._signatures(on, ignoring, unique=group is None)):
+            match = one_rows.get(signature)
+            if match is None:
+                continue
+            row = many.rows[i]
+            labels.append(signature if group is None else _keep(many.labels[i], ["__name__"], True))
+            lhs, rhs = (match, row) if group == "right" else (row, match)
+            rows.append(self._apply(fn, op, lhs, rhs))
+        return SeriesMatrix(labels, grid, rows)
+
+    @staticmethod
+    def _apply(fn: Callable[[float, float], float], op: str, lhs, rhs) -> array:
+        """Applies an operator element-wise to two rows, or to a row and a scalar."""
+        np = core._np
+        if np is not None:
+            left = core._view(lhs) if isinstance(lhs, array) else lhs
+            right = core._view(rhs) if isinstance(rhs, array) else rhs
+            with np.errstate(all="ignore"):
+                return core._from_numpy(_numpy_op(op)(left, right))
+        if not isinstance(lhs, array):
+            return array("d", [fn(lhs, v) for v in rhs])
+        if not isinstance(rhs, array):
+            return array("d", [fn(v, rhs) for v in lhs])
+        return array("d", map(fn, lhs, rhs))
+
+    def _scalar(self, scalar: float, op: str, reflected: bool = False) -> "SeriesMatrix":
+        """Applies ``row op scalar``, or ``scalar op row`` if `reflected`, to every row."""
+        fn = _BINARY_OPS[op]
+        rows = [
+            self._apply(fn, op, scalar, row) if reflected else self._apply(fn, op, row, scalar) for row in self.rows
+        ]
+        return SeriesMatrix(self._signatures(None, (), unique=True), self.timestamps, rows)
+
+    def _signatures(self, on: Optional[Sequence[str]], ignoring: Sequence[str], unique: bool) -> List[MetricLabelSet]:
+        if on is not None:
+            signatures = [_keep(labels, [n for n in on if n != "__name__"], False) for labels in self.labels]
+        else:
+            signatures = [_keep(labels, ["__name__", *ignoring], True) for labels in self.labels]
+        if unique and len(set(signatures)) != len(signatures):
+            raise ValueError("many-to-many matching not allowed: matching labels must be unique per side")
+        return signatures
+
+    def __add__(self, other: Operand) -> "SeriesMatrix":
+        return self.binary(other, "+")
+
+    def __sub__(self, other: Operand) -> "SeriesMatrix":
+        return self.binary(other, "-")
+
+    def __mul__(self, other: Operand) -> "SeriesMatrix":
+        return self.binary(other, "*")
+
+    def __truediv__(self, other: Operand) -> "SeriesMatrix":
+        return self.binary(other, "/")
+
+    def __radd__(self, other: float) -> "SeriesMatrix":
+        return self._reflected(other, "+")
+
+    def __rsub__(self, other: float) -> "SeriesMatrix":
+        return self._reflected(other, "-")
+
+    def __rmul__(self, other: float) -> "SeriesMatrix":
+        return self._reflected(other, "*")
+
+    def __rtruediv__(self, other: float) -> "SeriesMatrix":
+        return self._reflected(other, "/")
+
+    def _reflected(self, other, op: str):
+        if not isinstance(other, (int, float)):
+            return NotImplemented
+        return self._scalar(float(other), op, reflected=True)
+
+    def reduce(self, how: str = "mean") -> Dict[MetricLabelSet, float]:
+        """
+        Aggregates each series over time.
+
+        Args:
+            how: One of 'sum', 'mean' (or 'avg'), 'min', 'max', 'count' or 'last'.
+
+        Returns:
+            One value per series, NaN for series without any sample.
+        """
+        agg = _aggregation(how)
+        out = {}
+        for labels, row in zip(self.labels, self.rows):
+            present = _present(row)
+            out[labels] = agg(present) if present else NAN
+        return out
+
+    def topk(self, k: int, by: str = "mean") -> "SeriesMatrix":
+        """
+        Returns the `k` series with the largest value of a reduction over time, largest first.
+
+        Args:
+            k: Number of series to keep.
+            by: Reduction ranking the series, see `reduce`. Series without samples rank last.
+        """
+        return self._select(k, by, largest=True)
+
+    def bottomk(self, k: int, by: str = "mean") -> "SeriesMatrix":
+        """Returns the `k` series with the smallest value of a reduction over time, smallest first."""
+        return self._select(k, by, largest=False)
+
+    def _select(self, k: int, by: str, largest: bool) -> "SeriesMatrix":
+        scores = self.reduce(by)
+        sign = -1.0 if largest else 1.0
+        order = sorted(
+            range(len(self.labels)),
+            key=lambda i: (scores[self.labels[i]] != scores[self.labels[i]], sign * scores[self.labels[i]]),
+        )[: max(0, k)]
+        return SeriesMatrix([self.labels[i] for i in order], self.timestamps, [self.rows[i] for i in order])
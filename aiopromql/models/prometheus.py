@@ -2,12 +2,21 @@
 Pydantic models for parsing and transforming Prometheus query json responses.
 """
 
+import bisect
 from collections import defaultdict
-from typing import Dict, List, Literal, Tuple, Union
+from typing import Dict, Iterable, List, Literal, Tuple, Union
 
 from pydantic import BaseModel
 
-from .core import MetricLabelSet, TimeSeries, TimeSeriesPoint
+from . import export
+from .core import (
+    ColumnarTimeSeries,
+    LazyTimeSeries,
+    MetricLabelSet,
+    MetricMetadata,
+    TimeSeries,
+    TimeSeriesPoint,
+)
 
 
 class VectorResultModel(BaseModel):
@@ -24,19 +33,36 @@ class MatrixResultModel(BaseModel):
     values: List[Tuple[float, str]]
 
 
+def _lazy_metric_map(rows: Iterable[Tuple[Dict[str, str], List]]) -> Dict[MetricLabelSet, TimeSeries]:
+    """Index raw (metric, samples) rows by label set without converting the samples."""
+    metric_map: Dict[MetricLabelSet, TimeSeries] = {}
+    for metric, values in rows:
+        key = MetricLabelSet(metric)
+        if key in metric_map:
+            metric_map[key].values.extend(TimeSeriesPoint.from_prometheus_value(*v) for v in values)
+        else:
+            metric_map[key] = LazyTimeSeries(values)
+    return metric_map
+
+
 class VectorDataModel(BaseModel):
     """Parsed vector data block from Prometheus."""
 
     resultType: Literal["vector"]
     result: List[VectorResultModel]
 
-    def to_metric_map(self) -> Dict[MetricLabelSet, TimeSeries]:
+    def to_metric_map(self, lazy: bool = False) -> Dict[MetricLabelSet, TimeSeries]:
         """
         Converts vector results to a dict of TimeSeries object grouped by metric labels.
 
+        Args:
+            lazy: If True, series are LazyTimeSeries that convert their samples on first use.
+
         Returns:
             Dictionary mapping MetricLabelSet to TimeSeries.
         """
+        if lazy:
+            return _lazy_metric_map((r.metric, [r.value]) for r in self.result)
         metric_map: Dict[MetricLabelSet, TimeSeries] = defaultdict(lambda: TimeSeries([]))
 
         for r in self.result:
@@ -46,6 +72,24 @@ class VectorDataModel(BaseModel):
 
         return dict(metric_map)
 
+    def to_dataframe(self, layout: export.Layout = "long"):
+        """
+        Converts vector results to a pandas DataFrame (requires pandas).
+
+        Args:
+            layout: "long" (one row per sample) or "wide" (one column per series).
+        """
+        return export.to_dataframe(((r.metric, (r.value,)) for r in self.result), layout)
+
+    def to_arrow(self, layout: export.Layout = "long"):
+        """
+        Converts vector results to a pyarrow Table (requires pyarrow).
+
+        Args:
+            layout: "long" (one row per sample) or "wide" (one column per series).
+        """
+        return export.to_arrow(((r.metric, (r.value,)) for r in self.result), layout)
+
 
 class MatrixDataModel(BaseModel):
     """Parsed matrix data block from Prometheus."""
@@ -53,13 +97,19 @@ class MatrixDataModel(BaseModel):
     resultType: Literal["matrix"]
     result: List[MatrixResultModel]
 
-    def to_metric_map(self) -> Dict[MetricLabelSet, TimeSeries]:
+    def to_metric_map(self, lazy: bool = False) -> Dict[MetricLabelSet, TimeSeries]:
         """
         Converts matrix results to a dict of TimeSeries grouped by metric labels.
 
+        Args:
+            lazy: If True, series are LazyTimeSeries that keep the raw samples and
+                convert them in one batch on first use.
+
         Returns:
             Dictionary mapping MetricLabelSet to TimeSeries.
         """
+        if lazy:
+            return _lazy_metric_map((r.metric, r.values) for r in self.result)
         metric_map: Dict[MetricLabelSet, TimeSeries] = defaultdict(lambda: TimeSeries([]))
 
         for r in self.result:
@@ -70,6 +120,24 @@ class MatrixDataModel(BaseModel):
 
         return dict(metric_map)
 
+    def to_dataframe(self, layout: export.Layout = "long"):
+        """
+        Converts matrix results to a pandas DataFrame (requires pandas).
+
+        Args:
+            layout: "long" (one row per sample) or "wide" (one column per series).
+        """
+        return export.to_dataframe(((r.metric, r.values) for r in self.result), layout)
+
+    def to_arrow(self, layout: export.Layout = "long"):
+        """
+        Converts matrix results to a pyarrow Table (requires pyarrow).
+
+        Args:
+            layout: "long" (one row per sample) or "wide" (one column per series).
+        """
+        return export.to_arrow(((r.metric, r.values) for r in self.result), layout)
+
 
 class PrometheusResponseModel(BaseModel):
     """Top-level Prometheus query response wrapper."""
@@ -77,7 +145,7 @@ class PrometheusResponseModel(BaseModel):
     status: Literal["success"]
     data: Union[VectorDataModel, MatrixDataModel]
 
-    def to_metric_map(self) -> Dict[MetricLabelSet, TimeSeries]:
+    def to_metric_map(self, lazy: bool = False) -> Dict[MetricLabelSet, TimeSeries]:
         """
         Converts the response into a mapping from metric label sets to time series.
 
@@ -85,7 +153,174 @@ class PrometheusResponseModel(BaseModel):
         - MetricLabelSet: a hashable representation of metric labels.
         - TimeSeries: a sequence of timestamped values.
 
+        Args:
+            lazy: If True, build the label index now but defer converting each series'
+                samples until it is first used (LazyTimeSeries).
+
         Returns:
             A dictionary mapping MetricLabelSet to TimeSeries.
         """
-        return self.data.to_metric_map()
+        return self.data.to_metric_map(lazy=lazy)
+
+    def to_dataframe(self, layout: export.Layout = "long"):
+        """
+        Converts the response into a pandas DataFrame without building per-sample objects.
+
+        The long layout has ``timestamp`` (UTC datetime64) and ``value`` columns plus
+        one categorical column per label; the wide layout has one row per timestamp
+        and one column per series. Requires the ``pandas`` extra.
+
+        Args:
+            layout: "long" or "wide".
+
+        Returns:
+            A pandas DataFrame.
+        """
+        return self.data.to_dataframe(layout)
+
+    def to_arrow(self, layout: export.Layout = "long"):
+        """
+        Converts the response into a pyarrow Table without building per-sample objects.
+
+        The long layout has ``timestamp`` and ``value`` columns plus one
+        dictionary-encoded column per label; the wide layout has one row per
+        timestamp and one column per series. Requires the ``arrow`` extra.
+
+        Args:
+            layout: "long" or "wide".
+
+        Returns:
+            A pyarrow Table.
+        """
+        return self.data.to_arrow(layout)
+
+
+def result_to_series(
+    result: dict, columnar: bool = False
+) -> Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+    """
+    Converts one raw vector or matrix ``result`` entry into a label set and series.
+
+    Args:
+        result: A ``{"metric": ..., "value"/"values": ...}`` entry from a Prometheus response.
+        columnar: If True, build a ColumnarTimeSeries instead of a TimeSeries.
+
+    Returns:
+        A (MetricLabelSet, series) pair.
+    """
+    values = result["values"] if "values" in result else (result["value"],)
+    if columnar:
+        series = ColumnarTimeSeries.from_prometheus_values(values)
+    else:
+        series = TimeSeries([TimeSeriesPoint.from_prometheus_value(ts, value) for ts, value in values])
+    return MetricLabelSet(result["metric"]), series
+
+
+def parse_metric_map(
+    response: dict, columnar: bool = False
+) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+    """
+    Converts a raw Prometheus JSON response straight into a metric map.
+
+    This is the fast path used by the clients' ``"metric_map"`` and ``"columnar"``
+    decoders. Only the envelope (``status`` and ``resultType``) is checked; the
+    samples are converted once without building Pydantic models.
+
+    Args:
+        response: Decoded JSON body of a query or query_range call.
+        columnar: If True, build ColumnarTimeSeries instead of TimeSeries.
+
+    Returns:
+        Dictionary mapping MetricLabelSet to TimeSeries or ColumnarTimeSeries.
+
+    Raises:
+        ValueError: If the envelope is not a successful vector or matrix response.
+    """
+    if response.get("status") != "success":
+        raise ValueError(f"Prometheus response status is {response.get('status')!r}")
+    data = response.get("data") or {}
+    result_type = data.get("resultType")
+    if result_type not in ("vector", "matrix"):
+        raise ValueError(f"Unsupported resultType {result_type!r}")
+
+    metric_map: Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]] = {}
+    for result in data["result"]:
+        key, series = result_to_series(result, columnar)
+        if key in metric_map:
+            metric_map[key].extend(series)
+        else:
+            metric_map[key] = series
+    return metric_map
+
+
+def merge_metric_maps(
+    metric_maps: Iterable[Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]],
+) -> Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]:
+    """
+    Stitches metric maps of consecutive time windows into one.
+
+    Series with the same label set are concatenated in the given order. Samples
+    not newer than the last sample already merged for that series are dropped,
+    so overlapping window boundaries do not produce duplicates.
+
+    Args:
+        metric_maps: Metric maps ordered by time window.
+
+    Returns:
+        A dictionary mapping MetricLabelSet to the stitched series.
+    """
+    merged: Dict[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]] = {}
+    for metric_map in metric_maps:
+        for key, series in metric_map.items():
+            target = merged.get(key)
+            if target is None:
+                merged[key] = series
+            elif isinstance(target, ColumnarTimeSeries):
+                last = target.timestamps[-1] if len(target) else float("-inf")
+                first_new = bisect.bisect_right(series.timestamps, last)
+                target.extend(series[first_new:])
+            else:
+                last = target.values[-1].timestamp if len(target) else None
+                for point in series:
+                    if last is None or point.timestamp > last:
+                        target.add_point(point)
+    return merged
+
+
+def _success_data(response: dict):
+    if response.get("status") != "success":
+        raise ValueError(f"Prometheus response status is {response.get('status')!r}")
+    return response.get("data")
+
+
+def parse_series(response: dict) -> List[MetricLabelSet]:
+    """
+    Converts a raw ``/api/v1/series`` response into label sets.
+
+    Raises:
+        ValueError: If the response status is not ``success``.
+    """
+    return [MetricLabelSet(labels) for labels in _success_data(response) or ()]
+
+
+def parse_names(response: dict) -> List[str]:
+    """
+    Returns the strings of a raw ``/api/v1/labels`` or ``/api/v1/label/<name>/values`` response.
+
+    Raises:
+        ValueError: If the response status is not ``success``.
+    """
+    return list(_success_data(response) or ())
+
+
+def parse_metadata(response: dict) -> Dict[str, List[MetricMetadata]]:
+    """
+    Converts a raw ``/api/v1/metadata`` response into MetricMetadata lists per metric name.
+
+    Raises:
+        ValueError: If the response status is not ``success``.
+    """
+    return {
+        metric: [MetricMetadata(e.get("type", ""), e.get("help", ""), e.get("unit", "")) for e in entries]
+        for metric, entries in (_success_data(response) or {}).items()
+    }
@@ -0,0 +1,157 @@
+"""
+Incremental decoding of Prometheus query responses read in chunks.
+"""
+
+import codecs
+import json
+import re
+from typing import List, Optional, Tuple, Union
+
+from .core import ColumnarTimeSeries, MetricLabelSet, TimeSeries
+from .prometheus import result_to_series
+
+_RESULT_START = re.compile(r'"result"\s*:\s*\[')
+_STATUS = re.compile(r'"status"\s*:\s*"([^"]*)"')
+_RESULT_TYPE = re.compile(r'"resultType"\s*:\s*"([^"]*)"')
+_SEPARATOR = re.compile(r"[\s,]*")
+
+
+class ResultStreamDecoder:
+    """
+    Incrementally extracts ``data.result`` entries from a Prometheus JSON body.
+
+    Feed it the body chunk by chunk; every call returns the (MetricLabelSet, series)
+    pairs whose ``result`` entry finished decoding in that chunk. Only the entry
+    being decoded is buffered, so memory follows the largest series rather than
+    the whole response.
+
+    Example:
+        decoder = ResultStreamDecoder()
+        for chunk in chunks:
+            for labels, series in decoder.feed(chunk):
+                ...
+        for labels, series in decoder.close():
+            ...
+    """
+
+    def __init__(self, columnar: bool = False):
+        """
+        Args:
+            columnar: If True, yield ColumnarTimeSeries instead of TimeSeries.
+        """
+        self.columnar = columnar
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        # decoded text not yet joined into _buf, to avoid re-copying a large partial entry per chunk
+        self._pending: List[str] = []
+        self._pending_len = 0
+        self._in_result = False
+        self._done = False
+        # buffer length at which the next decode attempt of an incomplete entry is made
+        self._retry_at = 0
+
+    def feed(self, chunk: bytes) -> List[Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]]:
+        """
+        Adds a chunk of the response body.
+
+        Args:
+            chunk: Next bytes of the body.
+
+        Returns:
+            The pairs completed by this chunk, in response order.
+
+        Raises:
+            ValueError: If the envelope is not a successful vector or matrix response.
+        """
+        if self._done:
+            return []
+        text = self._utf8.decode(chunk)
+        self._pending.append(text)
+        self._pending_len += len(text)
+        if len(self._buf) + self._pending_len < self._retry_at:
+            return []
+        self._join_pending()
+        if not self._in_result and not self._enter_result():
+            return []
+        return self._drain()
+
+    def close(self) -> List[Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]]:
+        """
+        Signals the end of the body.
+
+        Returns:
+            Any pairs still buffered when the body ended.
+
+        Raises:
+            ValueError: If the body ended before the result array was complete, or
+                carried an error response.
+        """
+        self._pending.append(self._utf8.decode(b"", final=True))
+        self._join_pending()
+        if not self._in_result:
+            self._enter_result()
+        if self._done:
+            return []
+        if not self._in_result:
+            self._raise_envelope_error()
+        remaining = self._drain()
+        if not self._done:
+            raise ValueError("Prometheus response ended before the result array was complete")
+        return remaining
+
+    def _join_pending(self):
+        self._buf += "".join(self._pending)
+        self._pending = []
+        self._pending_len = 0
+
+    def _enter_result(self) -> bool:
+        match = _RESULT_START.search(self._buf)
+        if match is None:
+            return False
+        prefix = self._buf[: match.start()]
+        status = _STATUS.search(prefix)
+        result_type = _RESULT_TYPE.search(prefix)
+        if status is not None and status.group(1) != "success":
+            raise ValueError(f"Prometheus response status is {status.group(1)!r}")
+        if result_type is None or result_type.group(1) not in ("vector", "matrix"):
+            found = result_type.group(1) if result_type else None
+            raise ValueError(f"Unsupported resultType {found!r}")
+        self._buf = self._buf[match.end() :]
+        self._in_result = True
+        return True
+
+    def _drain(self) -> List[Tuple[MetricLabelSet, Union[TimeSeries, ColumnarTimeSeries]]]:
+        out = []
+        pos = 0
+        buf = self._buf
+        self._retry_at = 0
+        while True:
+            pos = _SEPARATOR.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                self._done = True
+                pos = len(buf)
+                break
+            try:
+                entry, end = self._json.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Incomplete entry: retry once the buffered entry has doubled, so a
+                # large series is decoded a bounded number of times.
+                self._retry_at = 2 * (len(buf) - pos)
+                break
+            out.append(result_to_series(entry, self.columnar))
+            pos = end
+        self._buf = buf[pos:]
+        return out
+
+    def _raise_envelope_error(self):
+        body: Optional[dict]
+        try:
+            body = json.loads(self._buf)
+        except json.JSONDecodeError:
+            body = None
+        if isinstance(body, dict) and body.get("status") not in (None, "success"):
+            raise ValueError(f"Prometheus response status is {body.get('status')!r}: {body.get('error')}")
+        raise ValueError("Prometheus response does not contain a result array")
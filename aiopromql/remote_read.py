@@ -0,0 +1,686 @@
+"""
+Prometheus remote-read (``/api/v1/read``) codec: protobuf, snappy and XOR chunks.
+
+Remote read returns raw samples in a compact binary form, much smaller on the
+wire than the JSON of query_range. Everything here is implemented
+in pure Python, so no protobuf or snappy package is needed; the optional
+``crc32c`` and ``python-snappy`` packages (``pip install aiopromql[remote-read]``)
+speed up checksums and sampled responses when installed:
+
+- requests are encoded as ``prometheus.ReadRequest`` protobuf messages, with
+  snappy block framing;
+- streamed responses (``STREAMED_XOR_CHUNKS``) are decoded frame by frame,
+  and the Gorilla XOR chunks go straight into ColumnarTimeSeries columns;
+- sampled responses (``SAMPLES``) are snappy-decompressed and decoded as
+  ``prometheus.ReadResponse``.
+"""
+
+import bisect
+import importlib
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .models.core import ColumnarTimeSeries, MetricLabelSet
+from .utils import Matcher, Selector
+
+READ_HEADERS = {
+    "Content-Type": "application/x-protobuf",
+    "Content-Encoding": "snappy",
+    "X-Prometheus-Remote-Read-Version": "0.1.0",
+}
+STREAMED_CONTENT_TYPE = "application/x-streamed-protobuf; proto=prometheus.ChunkedReadResponse"
+
+# ReadRequest.ResponseType
+SAMPLES = 0
+STREAMED_XOR_CHUNKS = 1
+# Chunk.Encoding
+_XOR = 1
+_MATCHER_TYPES = {"=": 0, "!=": 1, "=~": 2, "!~": 3}
+
+_double = struct.Struct("<d")
+_float_bits = struct.Struct(">Q")
+_float_of_bits = struct.Struct(">d")
+
+
+def _optional(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+
+# C implementations used when installed (``pip install aiopromql[remote-read]``)
+_crc32c_ext = _optional("crc32c")
+_snappy_ext = _optional("snappy")
+
+
+# -- protobuf wire format ---------------------------------------------------
+
+
+def _uvarint(buf, pos: int) -> Tuple[int, int]:
+    """Read an unsigned varint at `pos`; return (value, position after it)."""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("varint is too long")
+
+
+def _put_uvarint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _int64(value: int) -> int:
+    """Reinterpret an unsigned 64-bit varint as a signed int64."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _fields(buf, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, object]]:
+    """Yield (field number, wire type, value) of a protobuf message; length-delimited values are memoryviews."""
+    view = memoryview(buf)
+    pos, end = start, len(buf) if end is None else end
+    while pos < end:
+        key, pos = _uvarint(view, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _uvarint(view, pos)
+        elif wire == 1:
+            value, pos = view[pos : pos + 8], pos + 8
+        elif wire == 2:
+            size, pos = _uvarint(view, pos)
+            value, pos = view[pos : pos + size], pos + size
+        elif wire == 5:
+            value, pos = view[pos : pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield field, wire, value
+
+
+def _len_field(field: int, payload: bytes) -> bytes:
+    return _put_uvarint(field << 3 | 2) + _put_uvarint(len(payload)) + payload
+
+
+def _varint_field(field: int, value: int) -> bytes:
+    return _put_uvarint(field << 3) + _put_uvarint(value & 0xFFFFFFFFFFFFFFFF)
+
+
+def _labels(message) -> Dict[str, str]:
+    name = value = ""
+    for field, _, data in _fields(message):
+        if field == 1:
+            name = bytes(data).decode()
+        elif field == 2:
+            value = bytes(data).decode()
+    return {name: value}
+
+
+# -- snappy block format ----------------------------------------------------
+
+
+def snappy_decompress(data: bytes) -> bytes:
+    """Decompress a snappy block (not the framed stream format)."""
+    if _snappy_ext is not None:
+        try:
+            return _snappy_ext.uncompress(bytes(data))
+        except Exception as exc:  # its error types differ between python-snappy releases
+            raise ValueError(f"corrupt snappy data: {exc}") from exc
+    return _snappy_decompress_python(data)
+
+
+def _snappy_decompress_python(data: bytes) -> bytes:
+    size, pos = _uvarint(data, 0)
+    out = bytearray()
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:  # literal
+            length = tag >> 2
+            if length >= 60:
+                extra = length - 59
+                length = int.from_bytes(data[pos : pos + extra], "little")
+                pos += extra
+            length += 1
+            out += data[pos : pos + length]
+            pos += length
+            continue
+        if kind == 1:
+            length = ((tag >> 2) & 7) + 4
+            offset = (tag >> 5) << 8 | data[pos]
+            pos += 1
+        elif kind == 2:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos : pos + 2], "little")
+            pos += 2
+        else:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos : pos + 4], "little")
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise ValueError("corrupt snappy data: bad copy offset")
+        start = len(out) - offset
+        if offset >= length:
+            out += out[start : start + length]
+        else:  # overlapping copy repeats the last `offset` bytes
+            pattern = out[start:]
+            out += (pattern * (length // offset + 1))[:length]
+    if len(out) != size:
+        raise ValueError("corrupt snappy data: length mismatch")
+    return bytes(out)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    """
+    Encode `data` as a valid snappy block made of literals only.
+
+    Remote-read requests are a few hundred bytes, so they are not worth compressing;
+    this only provides the framing Prometheus expects.
+    """
+    out = bytearray(_put_uvarint(len(data)))
+    for pos in range(0, len(data), 65536):
+        literal = data[pos : pos + 65536]
+        n = len(literal) - 1
+        if n < 60:
+            out.append(n << 2)
+        else:
+            out.append(61 << 2)
+            out += n.to_bytes(2, "little")
+        out += literal
+    return bytes(out)
+
+
+# -- CRC32 (Castagnoli) of streamed frames ------------------------------------
+
+
+def _crc32c_tables() -> List[List[int]]:
+    """Tables for slicing-by-8: ``tables[k][b]`` is the CRC of byte `b` followed by `k` zero bytes."""
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    tables = [table]
+    for _ in range(7):
+        prev = tables[-1]
+        tables.append([(crc >> 8) ^ table[crc & 0xFF] for crc in prev])
+    return tables
+
+
+_CRC32C_TABLES = _crc32c_tables()
+
+
+def _crc32c_python(data) -> int:
+    """Pure-Python CRC32C, eight bytes per step."""
+    data = bytes(data)
+    n = len(data) & ~7
+    words = array("Q", data[:n])
+    if sys.byteorder == "big":
+        words.byteswap()
+    t0, t1, t2, t3, t4, t5, t6, t7 = _CRC32C_TABLES
+    crc = 0xFFFFFFFF
+    for word in words:
+        word ^= crc
+        crc = (
+            t7[word & 0xFF]
+            ^ t6[(word >> 8) & 0xFF]
+            ^ t5[(word >> 16) & 0xFF]
+            ^ t4[(word >> 24) & 0xFF]
+            ^ t3[(word >> 32) & 0xFF]
+            ^ t2[(word >> 40) & 0xFF]
+            ^ t1[(word >> 48) & 0xFF]
+            ^ t0[word >> 56]
+        )
+    for byte in data[n:]:
+        crc = t0[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def crc32c(data) -> int:
+    """CRC32 with the Castagnoli polynomial, as used to check remote-read frames."""
+    if _crc32c_ext is not None:
+        return _crc32c_ext.crc32c(bytes(data))
+    return _crc32c_python(data)
+
+
+# -- Gorilla XOR chunks -------------------------------------------------------
+
+
+def decode_xor_chunk(data, timestamps: array, values: array):
+    """
+    Decode a Prometheus XOR chunk, appending its samples to the given columns.
+
+    Args:
+        data: Chunk bytes, starting with the 2-byte sample count.
+        timestamps: ``array('d')`` receiving epoch timestamps in seconds.
+        values: ``array('d')`` receiving the sample values.
+
+    Raises:
+        ValueError: If the chunk is truncated or corrupt.
+    """
+    data = bytes(data)
+    count = int.from_bytes(data[:2], "big")
+    if not count:
+        return
+    try:
+        ts, vs, end = _decode_xor_bits(data, count)
+    except (IndexError, ValueError):  # read past the end
+        end = -1
+    if not 0 <= end <= (len(data) - 2) * 8:
+        raise ValueError("corrupt XOR chunk: out of data")
+    timestamps.extend([t / 1000.0 for t in ts])
+    values.frombytes(array("Q", vs).tobytes())
+
+
+def _decode_xor_bits(data: bytes, count: int) -> Tuple[List[int], List[int], int]:
+    """
+    Decode the samples of an XOR chunk as integer timestamps and float64 bit patterns.
+
+    The body is unpacked once into a string of '0' and '1' characters: slicing and
+    ``int(bits, 2)`` on it are far cheaper than shifting a big integer per field.
+    Returns the bit position after the last sample; callers check it against the
+    length, since slices past the end silently come out short.
+    """
+    nbits = (len(data) - 2) * 8
+    bits = bin(int.from_bytes(data[2:], "big") | (1 << nbits))[3:]  # keeps the leading zeros
+    raw, pos = _uvarint(data, 2)
+    t = (raw >> 1) ^ -(raw & 1)  # zigzag varint, still byte-aligned
+    p = (pos - 2) * 8
+    vbits = int(bits[p : p + 64], 2)
+    p += 64
+    ts = [t]
+    vs = [vbits]
+    if count == 1:
+        return ts, vs, p
+    delta = shift = 0
+    while True:
+        byte = int(bits[p : p + 8], 2)
+        p += 8
+        delta |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    leading = trailing = 0
+    for i in range(1, count):
+        if i > 1:
+            if bits[p] == "1":
+                if bits[p + 1] == "0":
+                    size, p = 14, p + 2
+                elif bits[p + 2] == "0":
+                    size, p = 17, p + 3
+                elif bits[p + 3] == "0":
+                    size, p = 20, p + 4
+                else:
+                    size, p = 64, p + 4
+                dod = int(bits[p : p + size], 2)
+                p += size
+                if size == 64:
+                    dod = _int64(dod)
+                elif dod > 1 << (size - 1):
+                    dod -= 1 << size
+                delta += dod
+            else:
+                p += 1
+        t += delta
+        if bits[p] == "1":
+            if bits[p + 1] == "1":
+                leading = int(bits[p + 2 : p + 7], 2)
+                significant = int(bits[p + 7 : p + 13], 2) or 64
+                trailing = 64 - leading - significant
+                p += 13
+            else:
+                significant = 64 - leading - trailing
+                p += 2
+            vbits ^= int(bits[p : p + significant], 2) << trailing
+            p += significant
+        else:
+            p += 1
+        ts.append(t)
+        vs.append(vbits)
+    return ts, vs, p
+
+
+class _BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.size = 0
+
+    def write(self, value: int, n: int):
+        self.value = (self.value << n) | (value & ((1 << n) - 1))
+        self.size += n
+
+    def write_uvarint(self, value: int):
+        for byte in _put_uvarint(value):
+            self.write(byte, 8)
+
+    def to_bytes(self) -> bytes:
+        pad = -self.size % 8
+        return (self.value << pad).to_bytes((self.size + pad) // 8, "big")
+
+
+def encode_xor_chunk(samples: Sequence[Tuple[int, float]]) -> bytes:
+    """
+    Encode (timestamp in ms, value) pairs as a Prometheus XOR chunk.
+
+    The inverse of decode_xor_chunk, for writing remote-read stubs and tests.
+    """
+    writer = _BitWriter()
+    writer.write(len(samples), 16)
+    prev_t = prev_delta = prev_bits = 0
+    leading = trailing = -1
+    for i, (t, v) in enumerate(samples):
+        vbits = _float_bits.unpack(_float_of_bits.pack(v))[0]
+        if i == 0:
+            writer.write_uvarint((t << 1) ^ (t >> 63))
+            writer.write(vbits, 64)
+        else:
+            delta = t - prev_t
+            if i == 1:
+                writer.write_uvarint(delta)
+            else:
+                dod = delta - prev_delta
+                if dod == 0:
+                    writer.write(0, 1)
+                else:
+                    for prefix, size in ((0b10, 14), (0b110, 17), (0b1110, 20), (0b1111, 64)):
+                        if size == 64 or -((1 << (size - 1)) - 1) <= dod <= 1 << (size - 1):
+                            writer.write(prefix, prefix.bit_length())
+                            writer.write(dod, size)
+                            break
+            xor = vbits ^ prev_bits
+            if xor == 0:
+                writer.write(0, 1)
+            else:
+                writer.write(1, 1)
+                lead = min(64 - xor.bit_length(), 31)
+                trail = (xor & -xor).bit_length() - 1
+                if leading >= 0 and lead >= leading and trail >= trailing:
+                    writer.write(0, 1)
+                    writer.write(xor >> trailing, 64 - leading - trailing)
+                else:
+                    leading, trailing = lead, trail
+                    significant = 64 - lead - trail
+                    writer.write(1, 1)
+                    writer.write(lead, 5)
+                    writer.write(significant, 6)  # 64 wraps to 0
+                    writer.write(xor >> trail, significant)
+            prev_delta = delta
+        prev_t, prev_bits = t, vbits
+    return writer.to_bytes()
+
+
+# -- requests and responses -----------------------------------------------
+
+
+def selector_matchers(match: Union[Selector, Iterable[Matcher]]) -> List[Matcher]:
+    """Return the label matchers of a Selector (its metric name as ``__name__``) or of a matcher list."""
+    if isinstance(match, Selector):
+        matchers = list(match.matchers)
+        if match.metric:
+            matchers.insert(0, Matcher("__name__", "=", match.metric))
+        return matchers
+    return list(match)
+
+
+def encode_read_request(
+    queries: Sequence[Tuple[Sequence[Matcher], int, int]],
+    response_types: Sequence[int] = (STREAMED_XOR_CHUNKS, SAMPLES),
+) -> bytes:
+    """
+    Encode and snappy-compress a ``prometheus.ReadRequest``.
+
+    Args:
+        queries: (matchers, start ms, end ms) per query.
+        response_types: Accepted response types in order of preference.
+
+    Returns:
+        The request body to POST to ``/api/v1/read``.
+    """
+    body = bytearray()
+    for matchers, start_ms, end_ms in queries:
+        query = _varint_field(1, start_ms) + _varint_field(2, end_ms)
+        for m in matchers:
+            if m.op not in _MATCHER_TYPES:
+                raise ValueError(f"Unknown matcher operator {m.op!r}")
+            matcher = _varint_field(1, _MATCHER_TYPES[m.op]) + _len_field(2, m.name.encode())
+            query += _len_field(3, matcher + _len_field(3, m.value.encode()))
+        body += _len_field(1, query)
+    for response_type in response_types:
+        body += _varint_field(2, response_type)
+    return snappy_compress(bytes(body))
+
+
+def _merge_duplicates(series: ColumnarTimeSeries):
+    """Sort a series by timestamp in place, keeping the first sample of each timestamp."""
+    ts, vals = series.timestamps, series.samples
+    order = sorted(range(len(ts)), key=ts.__getitem__)  # stable, so earlier samples win ties
+    merged_ts, merged_vals = array("d"), array("d")
+    for i in order:
+        if not merged_ts or ts[i] != merged_ts[-1]:
+            merged_ts.append(ts[i])
+            merged_vals.append(vals[i])
+    series.timestamps, series.samples = merged_ts, merged_vals
+
+
+class RemoteReadDecoder:
+    """
+    Incremental decoder of a remote-read response into columnar series.
+
+    Feed the body in chunks as it arrives; streamed responses are decoded frame by
+    frame, so only one frame is buffered at a time. Series split over several
+    frames or queries are merged in timestamp order, keeping the first sample of
+    each timestamp. Chunks hold whole blocks of samples and may reach past the
+    queried range, so series are clipped to it when `start_ms` or `end_ms` is given;
+    series left without samples are dropped.
+    """
+
+    def __init__(
+        self,
+        content_type: str = STREAMED_CONTENT_TYPE,
+        verify_checksums: bool = True,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ):
+        """
+        Args:
+            content_type: Content-Type of the response, which tells streamed from sampled responses.
+            verify_checksums: Check the CRC32C of every streamed frame.
+            start_ms: Drop samples before this timestamp, in milliseconds.
+            end_ms: Drop samples after this timestamp, in milliseconds.
+        """
+        self.streamed = content_type.startswith("application/x-streamed-protobuf")
+        self.verify_checksums = verify_checksums
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.series: Dict[MetricLabelSet, ColumnarTimeSeries] = {}
+        self._buffer = bytearray()
+        self._unordered: Set[MetricLabelSet] = set()
+
+    def feed(self, chunk: bytes):
+        """Consume the next piece of the response body."""
+        self._buffer += chunk
+        if self.streamed:
+            self._decode_frames()
+
+    def close(self) -> Dict[MetricLabelSet, ColumnarTimeSeries]:
+        """
+        Finish decoding and return the series.
+
+        Raises:
+            ValueError: If the body ended in the middle of a frame or is corrupt.
+        """
+        if self.streamed:
+            if self._buffer:
+                raise ValueError("remote-read response ended in the middle of a frame")
+        else:
+            self._decode_read_response(snappy_decompress(bytes(self._buffer)))
+            self._buffer.clear()
+        for key in self._unordered:
+            _merge_duplicates(self.series[key])
+        self._unordered.clear()
+        if self.start_ms is not None or self.end_ms is not None:
+            for series in self.series.values():
+                self._clip(series)
+            # series whose chunks all fell outside the range
+            self.series = {key: series for key, series in self.series.items() if len(series)}
+        return self.series
+
+    def _target(self, key: MetricLabelSet) -> ColumnarTimeSeries:
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = ColumnarTimeSeries()
+        return series
+
+    def _appended(self, key: MetricLabelSet, series: ColumnarTimeSeries, since: int):
+        """Mark `key` for merging if the samples appended from index `since` do not follow the earlier ones."""
+        ts = series.timestamps
+        if 0 < since < len(ts) and ts[since] <= ts[since - 1]:
+            self._unordered.add(key)
+
+    def _clip(self, series: ColumnarTimeSeries):
+        ts = series.timestamps
+        hi = len(ts) if self.end_ms is None else bisect.bisect_right(ts, self.end_ms / 1000.0)
+        lo = 0 if self.start_ms is None else bisect.bisect_left(ts, self.start_ms / 1000.0, 0, hi)
+        del ts[hi:], series.samples[hi:]
+        del ts[:lo], series.samples[:lo]
+
+    def _overlaps(self, min_ms: Optional[int], max_ms: Optional[int]) -> bool:
+        """Whether a chunk spanning [min_ms, max_ms] can hold samples in range; unknown bounds count as yes."""
+        if min_ms is None or max_ms is None:
+            return True
+        return (self.start_ms is None or max_ms >= self.start_ms) and (self.end_ms is None or min_ms <= self.end_ms)
+
+    def _decode_frames(self):
+        buf = self._buffer
+        pos = 0
+        while True:
+            try:
+                size, start = _uvarint(buf, pos)
+            except IndexError:
+                break
+            end = start + 4 + size
+            if end > len(buf):
+                break
+            message = bytes(buf[start + 4 : end])
+            if self.verify_checksums and crc32c(message) != int.from_bytes(buf[start : start + 4], "big"):
+                raise ValueError("remote-read frame checksum mismatch")
+            self._decode_chunked_read_response(message)
+            pos = end
+        del buf[:pos]
+
+    def _decode_chunked_read_response(self, message):
+        for field, _, value in _fields(message):
+            if field != 1:  # chunked_series; query_index is not needed
+                continue
+            labels: Dict[str, str] = {}
+            chunks = []
+            for sub, _, data in _fields(value):
+                if sub == 1:
+                    labels.update(_labels(data))
+                elif sub == 2:
+                    chunks.append(data)
+            key = MetricLabelSet(labels)
+            series = self._target(key)
+            for chunk in chunks:
+                encoding, payload = _XOR, b""
+                min_ms = max_ms = None
+                for part, _, data in _fields(chunk):
+                    if part == 1:
+                        min_ms = _int64(data)
+                    elif part == 2:
+                        max_ms = _int64(data)
+                    elif part == 3:
+                        encoding = data
+                    elif part == 4:
+                        payload = data
+                if not self._overlaps(min_ms, max_ms):
+                    continue
+                if encoding != _XOR:
+                    raise ValueError(f"Unsupported chunk encoding {encoding}")
+                since = len(series.timestamps)
+                decode_xor_chunk(payload, series.timestamps, series.samples)
+                self._appended(key, series, since)
+
+    def _decode_read_response(self, message: bytes):
+        for field, _, result in _fields(message):
+            if field != 1:
+                continue
+            for sub, _, timeseries in _fields(result):
+                if sub != 1:
+                    continue
+                labels: Dict[str, str] = {}
+                samples = []
+                for part, _, data in _fields(timeseries):
+                    if part == 1:
+                        labels.update(_labels(data))
+                    elif part == 2:
+                        samples.append(data)
+                key = MetricLabelSet(labels)
+                series = self._target(key)
+                since = len(series.timestamps)
+                for sample in samples:
+                    value, ts = 0.0, 0
+                    for part, _, data in _fields(sample):
+                        if part == 1:
+                            value = _double.unpack(data)[0]
+                        elif part == 2:
+                            ts = _int64(data)
+                    series.timestamps.append(ts / 1000.0)
+                    series.samples.append(value)
+                self._appended(key, series, since)
+
+
+def encode_chunked_frame(series: Sequence[Tuple[Dict[str, str], Sequence[bytes]]], query_index: int = 0) -> bytes:
+    """
+    Encode one streamed ``ChunkedReadResponse`` frame, for writing remote-read stubs and tests.
+
+    Args:
+        series: (labels, XOR chunk bytes) per series.
+        query_index: Index of the query the series answer.
+    """
+    message = bytearray()
+    for labels, chunks in series:
+        body = b"".join(
+            _len_field(1, _len_field(1, name.encode()) + _len_field(2, value.encode()))
+            for name, value in sorted(labels.items())
+        )
+        for chunk in chunks:
+            timestamps = array("d")
+            decode_xor_chunk(chunk, timestamps, array("d"))
+            bounds = _varint_field(1, round(timestamps[0] * 1000)) + _varint_field(2, round(timestamps[-1] * 1000))
+            body += _len_field(2, bounds + _varint_field(3, _XOR) + _len_field(4, chunk))
+        message += _len_field(1, body)
+    message += _varint_field(2, query_index)
+    return _put_uvarint(len(message)) + crc32c(message).to_bytes(4, "big") + bytes(message)
+
+
+def encode_read_response(series: Sequence[Tuple[Dict[str, str], Sequence[Tuple[int, float]]]]) -> bytes:
+    """
+    Encode and snappy-compress a sampled ``ReadResponse``, for writing remote-read stubs and tests.
+
+    Args:
+        series: (labels, [(timestamp ms, value), ...]) per series, all answering one query.
+    """
+    result = bytearray()
+    for labels, samples in series:
+        body = b"".join(
+            _len_field(1, _len_field(1, name.encode()) + _len_field(2, value.encode()))
+            for name, value in sorted(labels.items())
+        )
+        for ts, value in samples:
+            body += _len_field(2, b"\x09" + _double.pack(value) + _varint_field(2, ts))
+        result += _len_field(1, body)
+    return snappy_compress(_len_field(1, bytes(result)))
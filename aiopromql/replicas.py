@@ -0,0 +1,131 @@
+"""
+Latency tracking and hedging across Prometheus HA replicas.
+"""
+
+import math
+from collections import deque
+from typing import Deque, List, Optional, Sequence
+
+import httpx
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate request to the next replica.
+
+    A hedge is sent once the primary has not answered within the `quantile` of
+    its recent latencies. Until `min_samples` latencies are known,
+    `initial_delay` is used instead.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        initial_delay: float = 0.1,
+        min_delay: float = 0.005,
+        min_samples: int = 20,
+    ):
+        """
+        Args:
+            quantile: Latency quantile of the primary after which to hedge, between 0 and 1.
+            initial_delay: Hedge delay in seconds while too few latencies are known.
+            min_delay: Lower bound of the hedge delay, so fast replicas are not hedged on jitter alone.
+            min_samples: Number of latencies needed before the quantile is used.
+        """
+        if not 0.0 <= quantile <= 1.0:
+            raise ValueError("quantile must be between 0 and 1")
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+    def delay(self, replica: "Replica") -> float:
+        """Returns the seconds to wait for `replica` before hedging."""
+        if len(replica.latencies) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, replica.quantile(self.quantile))
+
+
+class Replica:
+    """One Prometheus endpoint with an EWMA and a window of its recent latencies."""
+
+    __slots__ = ("url", "root", "ewma", "latencies", "_alpha")
+
+    def __init__(self, url: str, root: str, alpha: float = 0.3, window: int = 256):
+        """
+        Args:
+            url: Base URL of the replica.
+            root: Prefix of the API paths sent to the HTTP client for this replica.
+            alpha: Weight of the newest latency in the EWMA.
+            window: Number of recent latencies kept for quantiles.
+        """
+        self.url = url
+        self.root = root
+        self.ewma: Optional[float] = None
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self._alpha = alpha
+
+    def __repr__(self):
+        ewma = "n/a" if self.ewma is None else f"{self.ewma * 1000:.1f}ms"
+        return f"Replica({self.url}, ewma={ewma})"
+
+    def observe(self, latency: float):
+        """Records the latency of one finished request."""
+        self.latencies.append(latency)
+        self.ewma = latency if self.ewma is None else self.ewma + self._alpha * (latency - self.ewma)
+
+    def quantile(self, q: float) -> float:
+        """Returns the q-quantile of the recent latencies (nearest rank), 0 if none."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class ReplicaSet:
+    """
+    The replicas of one client, ranked by latency.
+
+    Replicas without a measurement rank first so each is probed once; failures
+    count as a latency of at least `error_penalty` seconds, so a failing replica
+    stops being the primary until it answers quickly again.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        roots: Sequence[str],
+        alpha: float = 0.3,
+        window: int = 256,
+        error_penalty: float = 1.0,
+    ):
+        """
+        Args:
+            urls: Base URLs of the replicas, in order of preference for ties.
+            roots: API path prefix of each replica, see Replica.
+            alpha: EWMA weight of the newest latency.
+            window: Number of recent latencies kept per replica.
+            error_penalty: Latency recorded for a failed request that failed faster than this.
+        """
+        if not urls:
+            raise ValueError("at least one replica URL is required")
+        self.replicas = [Replica(url, root, alpha, window) for url, root in zip(urls, roots)]
+        self.error_penalty = error_penalty
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def ranked(self) -> List[Replica]:
+        """Returns the replicas, fastest EWMA first."""
+        return sorted(self.replicas, key=lambda r: -1.0 if r.ewma is None else r.ewma)
+
+    def observe_failure(self, replica: Replica, elapsed: float):
+        """Records a failed request to `replica`."""
+        replica.observe(max(elapsed, self.error_penalty))
+
+
+def is_replica_failure(exc: BaseException) -> bool:
+    """True if `exc` points at the replica rather than the query: a transport error, 429 or 5xx."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
@@ -0,0 +1,152 @@
+"""
+Retry policy for transient Prometheus errors: backoff with jitter, Retry-After and a retry budget.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Collection, Optional, Tuple, Type
+
+import httpx
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of all requests.
+
+    Every request deposits `ratio` tokens, up to `capacity`, and every retry
+    withdraws one. Once the bucket is empty retries are refused until enough new
+    requests have been made, so an outage does not multiply the load by the
+    number of attempts.
+    """
+
+    def __init__(self, capacity: float = 10.0, ratio: float = 0.1):
+        """
+        Args:
+            capacity: Maximum number of stored tokens, i.e. the largest burst of retries.
+            ratio: Tokens earned per request, i.e. the long-run share of requests that may be retried.
+        """
+        self.capacity = capacity
+        self.ratio = ratio
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Credits one request."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Takes a token for one retry; returns False if none is left."""
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+def retry_after_seconds(response: httpx.Response, now: Optional[float] = None) -> Optional[float]:
+    """
+    Returns the delay requested by a response's Retry-After header, or None.
+
+    Args:
+        response: Response to inspect.
+        now: Current epoch time, for HTTP-date values; defaults to time.time().
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class RetryPolicy:
+    """
+    Which failures of an API call to retry, and how long to wait in between.
+
+    Retries use capped exponential backoff with full jitter: attempt ``n`` waits a
+    random time between 0 and ``min(max_backoff, backoff * 2**n)``. A Retry-After
+    header on a retryable response overrides the backoff, unless it asks for more
+    than `max_retry_after` seconds, in which case the error is raised instead.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff: float = 0.1,
+        max_backoff: float = 5.0,
+        jitter: bool = True,
+        statuses: Collection[int] = (429, 502, 503, 504),
+        exceptions: Tuple[Type[BaseException], ...] = (httpx.TransportError,),
+        max_retry_after: float = 30.0,
+        max_elapsed: Optional[float] = None,
+        budget_capacity: float = 10.0,
+        budget_ratio: float = 0.1,
+        rand: Callable[[], float] = random.random,
+    ):
+        """
+        Args:
+            max_retries: Retries after the first attempt.
+            backoff: Base delay in seconds.
+            max_backoff: Upper bound of the backoff delay.
+            jitter: Randomize delays (full jitter); False waits the full exponential delay.
+            statuses: HTTP status codes that are retried.
+            exceptions: Exception types that are retried, by default connection errors and timeouts.
+            max_retry_after: Longest Retry-After delay that is honored.
+            max_elapsed: Seconds after the first attempt past which no retry is started.
+            budget_capacity: Burst size of each client's retry budget, see RetryBudget.
+            budget_ratio: Share of requests each client may retry over time, see RetryBudget.
+            rand: Source of uniform [0, 1) numbers for jitter, replaceable for testing.
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.exceptions = exceptions
+        self.max_retry_after = max_retry_after
+        self.max_elapsed = max_elapsed
+        self.budget_capacity = budget_capacity
+        self.budget_ratio = budget_ratio
+        self._rand = rand
+
+    def new_budget(self) -> RetryBudget:
+        """Creates the retry budget of one client."""
+        return RetryBudget(self.budget_capacity, self.budget_ratio)
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        """True if `exc` is a retryable exception or an HTTP error with a retryable status."""
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in self.statuses
+        return isinstance(exc, self.exceptions)
+
+    def delay(self, exc: BaseException, attempt: int, elapsed: float) -> Optional[float]:
+        """
+        Returns the seconds to wait before retrying after `exc`, or None to give up.
+
+        Args:
+            exc: Error of the failed attempt.
+            attempt: Number of retries made so far.
+            elapsed: Seconds since the first attempt started.
+        """
+        if attempt >= self.max_retries or not self.is_retryable(exc):
+            return None
+        wait = None
+        if isinstance(exc, httpx.HTTPStatusError):
+            wait = retry_after_seconds(exc.response)
+            if wait is not None and wait > self.max_retry_after:
+                return None
+        if wait is None:
+            wait = min(self.max_backoff, self.backoff * 2**attempt)
+            if self.jitter:
+                wait *= self._rand()
+        if self.max_elapsed is not None and elapsed + wait > self.max_elapsed:
+            return None
+        return wait
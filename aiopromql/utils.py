@@ -1,17 +1,401 @@
+import math
+import re
+import string
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import quote_plus
+
+_MATCH_OPS = ("=", "!=", "=~", "!~")
+_SUFFIX_OPS = {"ne": "!=", "re": "=~", "nre": "!~"}
+_AGGREGATIONS = frozenset(
+    {
+        "sum",
+        "min",
+        "max",
+        "avg",
+        "group",
+        "stddev",
+        "stdvar",
+        "count",
+        "count_values",
+        "bottomk",
+        "topk",
+        "quantile",
+        "limitk",
+        "limit_ratio",
+    }
+)
+
+
+def escape_label_value(value) -> str:
+    """
+    Return a label value escaped for use inside a double-quoted PromQL string.
+
+    Backslashes, double quotes and newlines are escaped, so regex values such as
+    `web-\\d+` are passed through to Prometheus unchanged.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Matcher(NamedTuple):
+    """A single label matcher such as `job="api"` or `instance=~"web-.*"`."""
+
+    name: str
+    op: str
+    value: str
+
+    def __str__(self) -> str:
+        return f'{self.name}{self.op}"{escape_label_value(self.value)}"'
+
+
+def _matchers_from_labels(labels: Dict[str, object]) -> Tuple[Matcher, ...]:
+    """Build matchers from keyword labels; `name__ne`, `name__re` and `name__nre` select the operator."""
+    matchers = []
+    for key, value in labels.items():
+        if value is None:
+            continue
+        name, _, suffix = key.rpartition("__")
+        if name and suffix in _SUFFIX_OPS:
+            matchers.append(Matcher(name, _SUFFIX_OPS[suffix], str(value)))
+        else:
+            matchers.append(Matcher(key, "=", str(value)))
+    return tuple(matchers)
+
+
+@lru_cache(maxsize=4096)
+def render_selector(metric: str, matchers: Tuple[Matcher, ...]) -> str:
+    """
+    Return the PromQL text of a vector selector, memoized.
+
+    metric: metric name, or "" for a selector made of matchers only.
+    matchers: label matchers in the order they should appear.
+    """
+    for matcher in matchers:
+        if matcher.op not in _MATCH_OPS:
+            raise ValueError(f"Unknown matcher operator {matcher.op!r}")
+    if not matchers:
+        return metric
+    return metric + "{" + ",".join(str(m) for m in matchers) + "}"
+
+
+class Selector:
+    """
+    A PromQL vector selector that renders once and is reused across queries.
+
+    Keyword labels match with `=`; the suffixes `__ne`, `__re` and `__nre` select
+    `!=`, `=~` and `!~`. Labels set to None are skipped. Explicit Matcher objects can
+    be passed for label names that do not fit in a keyword.
+
+    Example:
+        requests = Selector("http_requests_total", job="api", instance__re="web-.*")
+        str(requests)          # 'http_requests_total{job="api",instance=~"web-.*"}'
+        requests["5m"]         # 'http_requests_total{job="api",instance=~"web-.*"}[5m]'
+        rate(requests["5m"])   # 'rate(http_requests_total{...}[5m])'
+    """
+
+    __slots__ = ("metric", "matchers", "_text")
+
+    def __init__(self, metric: str = "", *matchers: Matcher, **labels):
+        """
+        Args:
+            metric: Metric name; may be empty if matchers are given.
+            matchers: Explicit label matchers.
+            labels: Label matchers as keywords.
+        """
+        if isinstance(metric, Matcher):  # Selector(Matcher(...), ...) without a metric name
+            metric, matchers = "", (metric, *matchers)
+        self.metric = metric
+        self.matchers = tuple(matchers) + _matchers_from_labels(labels)
+        self._text = render_selector(metric, self.matchers)
+
+    def where(self, *matchers: Matcher, **labels) -> "Selector":
+        """Return a new selector with additional matchers."""
+        return Selector(self.metric, *self.matchers, *matchers, **labels)
+
+    def range(self, window: str, offset: Optional[str] = None) -> str:
+        """Return a range vector selector, e.g. `metric{...}[5m] offset 1h`."""
+        text = f"{self._text}[{window}]"
+        return f"{text} offset {offset}" if offset else text
+
+    def __getitem__(self, window: str) -> str:
+        return self.range(window)
+
+    def __str__(self) -> str:
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"Selector({self._text!r})"
+
+    def __hash__(self) -> int:
+        return hash(self._text)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Selector) and self._text == other._text
+
+
+@lru_cache(maxsize=4096)
+def _render_call(name: str, args: Tuple[str, ...]) -> str:
+    return f"{name}({', '.join(args)})"
+
+
+def func(name: str, *args) -> str:
+    """
+    Return a PromQL function call, e.g. `func("histogram_quantile", 0.99, expr)`.
+
+    Arguments are rendered with str(); string literals must be quoted by the caller.
+    """
+    return _render_call(name, tuple(str(a) for a in args))
+
+
+def rate(expr, window: Optional[str] = None) -> str:
+    """Return `rate(expr)`, or `rate(expr[window])` when a window is given for a selector."""
+    return func("rate", f"{expr}[{window}]" if window else expr)
+
+
+def increase(expr, window: Optional[str] = None) -> str:
+    """Return `increase(expr)`, or `increase(expr[window])` when a window is given for a selector."""
+    return func("increase", f"{expr}[{window}]" if window else expr)
+
+
+@lru_cache(maxsize=4096)
+def _render_aggregation(
+    op: str, expr: str, by: Optional[Tuple[str, ...]], without: Optional[Tuple[str, ...]], param: Optional[str]
+) -> str:
+    if op not in _AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation operator {op!r}")
+    if by is not None and without is not None:
+        raise ValueError("Use either 'by' or 'without', not both")
+    grouping = ""
+    if by is not None:
+        grouping = f" by ({', '.join(by)})"
+    elif without is not None:
+        grouping = f" without ({', '.join(without)})"
+    args = expr if param is None else f"{param}, {expr}"
+    return f"{op}{grouping} ({args})"
+
+
+def aggregate(
+    op: str,
+    expr,
+    by: Optional[Iterable[str]] = None,
+    without: Optional[Iterable[str]] = None,
+    param=None,
+) -> str:
+    """
+    Return a PromQL aggregation, e.g. `aggregate("sum", rate(sel["5m"]), by=["job"])`.
+
+    op: aggregation operator (sum, avg, topk, quantile, ...).
+    expr: the aggregated expression.
+    by / without: grouping labels.
+    param: parameter of topk, bottomk, quantile, count_values, limitk and limit_ratio.
+    """
+    return _render_aggregation(
+        op,
+        str(expr),
+        None if by is None else tuple(by),
+        None if without is None else tuple(without),
+        None if param is None else str(param),
+    )
+
+
 def make_label_string(negate_keys=None, **labels) -> str:
     """
     Return PromQL label selector string from provided labels.
 
     negate_keys: iterable of keys whose match should be negated (using !=).
     labels: key=value pairs for labels.
+
+    Values are escaped, and rendered strings are memoized per label combination.
     """
-    negate_keys = set(negate_keys or [])
-    # Filter out None values
-    filtered = {k: v for k, v in labels.items() if v is not None}
-    if not filtered:
+    negate = frozenset(negate_keys) if negate_keys else frozenset()
+    # Filter out None values; the cache is keyed on the rendered text, as 1, 1.0 and True compare equal
+    items = tuple((k, str(v)) for k, v in labels.items() if v is not None)
+    return _label_string(negate, items)
+
+
+@lru_cache(maxsize=4096)
+def _label_string(negate: FrozenSet[str], items: Tuple[Tuple[str, str], ...]) -> str:
+    if not items:
         return ""
+    return render_selector("", tuple(Matcher(k, "!=" if k in negate else "=", v) for k, v in items))
+
+
+_DURATION_UNITS = {
+    "ms": 0.001,
+    "s": 1.0,
+    "m": 60.0,
+    "h": 3600.0,
+    "d": 86400.0,
+    "w": 604800.0,
+    "y": 31536000.0,
+}
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)")
+
+
+def parse_duration(duration: Union[str, float, int]) -> float:
+    """
+    Return the number of seconds in a Prometheus duration.
+
+    duration: a number of seconds or a duration string such as '30s', '5m' or '1h30m'.
+    """
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    text = duration.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    pos = 0
+    total = 0.0
+    for match in _DURATION_RE.finditer(text):
+        if match.start() != pos:
+            break
+        total += float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+        pos = match.end()
+    if pos != len(text) or not text:
+        raise ValueError(f"Invalid Prometheus duration: {duration!r}")
+    return total
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Return a Prometheus duration string for a number of seconds, e.g. 90 -> '1m30s'.
+
+    seconds: positive duration; sub-millisecond parts are rounded to milliseconds.
+    """
+    millis = round(seconds * 1000)
+    if millis <= 0:
+        raise ValueError("duration must be positive")
     parts = []
-    for k, v in filtered.items():
-        op = "!=" if k in negate_keys else "="
-        parts.append(f'{k}{op}"{v}"')
-    return "{" + ",".join(parts) + "}"
+    for unit in ("d", "h", "m", "s", "ms"):
+        unit_ms = round(_DURATION_UNITS[unit] * 1000)
+        count, millis = divmod(millis, unit_ms)
+        if count:
+            parts.append(f"{count}{unit}")
+    return "".join(parts)
+
+
+# Steps that step_for_points() rounds up to, so consecutive windows share a step.
+NICE_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+
+# Scrape interval assumed when expanding $__rate_interval.
+DEFAULT_SCRAPE_INTERVAL = 15.0
+
+
+def step_for_points(start: float, end: float, max_points: int, min_step: Union[str, float] = 1.0) -> float:
+    """
+    Return a query_range step, in seconds, giving at most max_points points over [start, end].
+
+    start / end: epoch timestamps of the window.
+    max_points: maximum number of evaluation points, e.g. the pixel width of a chart.
+    min_step: smallest step to return.
+
+    The raw step is rounded up to the next value in NICE_STEPS (or whole days
+    beyond that), so the same window size always resolves to the same step.
+    """
+    if max_points < 1:
+        raise ValueError("max_points must be at least 1")
+    raw = max((end - start) / max(max_points - 1, 1), parse_duration(min_step))
+    for nice in NICE_STEPS:
+        if nice >= raw:
+            return float(nice)
+    return math.ceil(raw / 86400) * 86400.0
+
+
+def expand_interval_placeholders(
+    promql: str, step: float, scrape_interval: Union[str, float] = DEFAULT_SCRAPE_INTERVAL
+) -> str:
+    """
+    Replace Grafana-style interval placeholders in a query.
+
+    `$__interval` becomes the step; `$__rate_interval` becomes
+    max(step + scrape_interval, 4 * scrape_interval), the smallest window that
+    keeps rate() defined at that step.
+    """
+    if "$__" not in promql:
+        return promql
+    scrape = parse_duration(scrape_interval)
+    rate_interval = max(step + scrape, 4 * scrape)
+    return promql.replace("$__rate_interval", format_duration(rate_interval)).replace(
+        "$__interval", format_duration(step)
+    )
+
+
+class EncodedQuery(str):
+    """
+    A PromQL string that carries its pre-computed form encoding.
+
+    Clients send `encoded` as-is instead of re-escaping the query on every request.
+    Instances are produced by QueryTemplate.render().
+    """
+
+    encoded: str
+
+    def __new__(cls, query: str, encoded: str):
+        obj = super().__new__(cls, query)
+        obj.encoded = encoded
+        return obj
+
+
+class QueryTemplate:
+    """
+    PromQL template whose static text is form-encoded once.
+
+    Placeholders use `string.Template` syntax (`$name` or `${name}`). Rendering only
+    escapes the substituted values, which keeps hot-loop queries with large static
+    parts (e.g. long `=~` alternations) cheap to send.
+
+    Example:
+        tmpl = QueryTemplate('sum by (pod) (rate(http_requests_total{pod=~"$pods"}[5m]))')
+        client.query(tmpl.render(pods="web-1|web-2"))
+    """
+
+    def __init__(self, template: str):
+        """
+        Args:
+            template: PromQL text with `$name` / `${name}` placeholders; `$$` is a literal `$`.
+        """
+        self.template = template
+        # alternating (text, encoded text) literals and placeholder names
+        self._parts: List[Union[Tuple[str, str], str]] = []
+        pos = 0
+        for match in string.Template.pattern.finditer(template):
+            literal = template[pos : match.start()]
+            if match.group("escaped") is not None:
+                literal += "$"
+            self._add_literal(literal)
+            name = match.group("named") or match.group("braced")
+            if name is not None:
+                self._parts.append(name)
+            elif match.group("invalid") is not None:
+                raise ValueError(f"Invalid placeholder in query template at position {match.start()}")
+            pos = match.end()
+        self._add_literal(template[pos:])
+
+    def _add_literal(self, text: str):
+        if not text:
+            return
+        if self._parts and isinstance(self._parts[-1], tuple):
+            text = self._parts.pop()[0] + text
+        self._parts.append((text, quote_plus(text)))
+
+    def render(self, **values) -> EncodedQuery:
+        """
+        Substitute placeholder values.
+
+        Returns:
+            The rendered query, carrying its form encoding for the clients.
+
+        Raises:
+            KeyError: If a placeholder has no value.
+        """
+        text, encoded = [], []
+        for part in self._parts:
+            if isinstance(part, tuple):
+                text.append(part[0])
+                encoded.append(part[1])
+            else:
+                value = str(values[part])
+                text.append(value)
+                encoded.append(quote_plus(value))
+        return EncodedQuery("".join(text), "".join(encoded))
@@ -0,0 +1,304 @@
+"""
+Live subscriptions: poll range queries incrementally and deliver only what changed.
+
+A `Watcher` polls each subscribed expression on its own interval. Every poll
+asks Prometheus only for the steps after the previous poll, appends the new
+samples in place to bounded per-series ring buffers and yields a `Delta` with the
+new points and the series that appeared or went stale.
+"""
+
+import asyncio
+import bisect
+import math
+import random
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .models.core import ColumnarTimeSeries, MetricLabelSet, RingTimeSeries
+from .models.prometheus import parse_metric_map
+from .utils import format_duration, parse_duration
+
+if TYPE_CHECKING:
+    from .client import PrometheusAsync
+
+# Put on the queue by Watcher.close() to wake iterators waiting for a delta
+_CLOSED = object()
+
+
+class Delta(NamedTuple):
+    """
+    What one poll of a subscription changed.
+
+    `points` holds only the samples newer than those already known, per series.
+    `added` lists series seen for the first time, `removed` series without a
+    sample for the subscription's `stale_after`. A failed poll carries its `error`
+    and nothing else; the subscription keeps polling.
+    """
+
+    name: str
+    points: Dict[MetricLabelSet, ColumnarTimeSeries]
+    added: List[MetricLabelSet]
+    removed: List[MetricLabelSet]
+    error: Optional[BaseException] = None
+
+    @property
+    def samples(self) -> int:
+        """Number of new samples over all series."""
+        return sum(len(series) for series in self.points.values())
+
+
+class Subscription:
+    """
+    One polled expression and the recent samples of each of its series.
+
+    Evaluation timestamps are aligned to the step grid, so consecutive polls fetch
+    disjoint, gap-free windows. Each series keeps at most `capacity` samples.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        promql: str,
+        interval: float,
+        step: float,
+        lookback: float,
+        capacity: int,
+        stale_after: float,
+    ):
+        """
+        Args:
+            name: Key of the subscription in its Watcher and in its deltas.
+            promql: The range query to poll.
+            interval: Seconds between polls.
+            step: Query resolution in seconds.
+            lookback: Window fetched by the first poll, in seconds.
+            capacity: Samples kept per series; older ones are dropped.
+            stale_after: Seconds without a sample after which a series is removed.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.name = name
+        self.promql = promql
+        self.interval = interval
+        self.step = step
+        self.lookback = lookback
+        self.capacity = capacity
+        self.stale_after = stale_after
+        self.series: Dict[MetricLabelSet, RingTimeSeries] = {}
+        self.last_end: Optional[float] = None
+
+    def __repr__(self):
+        return f"Subscription({self.name!r}, series={len(self.series)}, every {format_duration(self.interval)})"
+
+    def window(self, now: float) -> Optional[Tuple[float, float]]:
+        """Returns the (start, end) epoch window of the next poll, or None if no new step is due yet."""
+        end = math.floor(now / self.step) * self.step
+        start = end - self.lookback if self.last_end is None else self.last_end + self.step
+        return (start, end) if start <= end else None
+
+    def apply(self, metric_map: Dict[MetricLabelSet, ColumnarTimeSeries], end: float) -> Delta:
+        """
+        Merges the result of a poll ending at `end` into the series.
+
+        Args:
+            metric_map: Columnar metric map of the polled window.
+            end: Last evaluation timestamp of the window.
+
+        Returns:
+            The new samples and the series that appeared or were removed.
+        """
+        points: Dict[MetricLabelSet, ColumnarTimeSeries] = {}
+        added = []
+        for labels, fresh in metric_map.items():
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = RingTimeSeries(self.capacity)
+                added.append(labels)
+            if len(series):
+                # drop samples a previous poll already delivered
+                fresh = fresh[bisect.bisect_right(fresh.timestamps, series.last_timestamp) :]
+            if not len(fresh):
+                continue
+            series.extend(fresh)
+            points[labels] = fresh
+        removed = [labels for labels, series in self.series.items() if series.last_timestamp < end - self.stale_after]
+        for labels in removed:
+            del self.series[labels]
+        self.last_end = end
+        return Delta(self.name, points, added, removed)
+
+
+class Watcher:
+    """
+    Polls subscribed queries through a PrometheusAsync client and yields their deltas.
+
+    Each subscription first polls at a random offset within its interval, then
+    every interval with a random `jitter`, so many subscriptions spread their
+    requests instead of firing together. Deltas are yielded by iterating the
+    watcher; polls that changed nothing yield nothing.
+
+    Example::
+
+        async with PrometheusAsync(url) as client, Watcher(client) as watcher:
+            watcher.subscribe("rate(http_requests_total[1m])", interval="15s")
+            async for delta in watcher:
+                ...
+    """
+
+    def __init__(
+        self,
+        client: "PrometheusAsync",
+        jitter: float = 0.1,
+        max_pending: int = 1024,
+        clock: Callable[[], float] = time.time,
+        rand: Callable[[], float] = random.random,
+    ):
+        """
+        Args:
+            client: Client to send the range queries through.
+            jitter: Relative random spread of the poll intervals, between 0 and 1.
+            max_pending: Deltas buffered for the iterator; polls wait while the buffer is full.
+            clock: Wall clock in epoch seconds, replaceable for testing.
+            rand: Source of uniform [0, 1) numbers for offsets and jitter, replaceable for testing.
+        """
+        if not 0.0 <= jitter < 1.0:
+            raise ValueError("jitter must be between 0 and 1")
+        self.client = client
+        self.jitter = jitter
+        self.subscriptions: Dict[str, Subscription] = {}
+        self._clock = clock
+        self._rand = rand
+        self._max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running = False
+
+    def __repr__(self):
+        return f"Watcher(subscriptions={len(self.subscriptions)})"
+
+    def __getitem__(self, name: str) -> Subscription:
+        return self.subscriptions[name]
+
+    def subscribe(
+        self,
+        promql: str,
+        interval: Union[str, float] = "30s",
+        step: Union[str, float, None] = None,
+        lookback: Union[str, float] = "5m",
+        capacity: int = 1024,
+        stale_after: Union[str, float] = "5m",
+        name: Optional[str] = None,
+    ) -> Subscription:
+        """
+        Starts polling an expression.
+
+        Args:
+            promql: The PromQL expression, evaluated as a range query.
+            interval: Time between polls, in seconds or as a duration.
+            step: Query resolution; defaults to the interval.
+            lookback: Window of samples fetched by the first poll.
+            capacity: Samples kept per series.
+            stale_after: Time without a sample after which a series is reported removed.
+            name: Key of the subscription; defaults to the expression.
+
+        Returns:
+            The Subscription, whose `series` are updated in place by every poll.
+        """
+        name = promql if name is None else name
+        if name in self.subscriptions:
+            raise ValueError(f"Subscription {name!r} already exists")
+        interval_s = parse_duration(interval)
+        if interval_s <= 0:
+            raise ValueError("interval must be positive")
+        step_s = interval_s if step is None else parse_duration(step)
+        subscription = Subscription(
+            name, promql, interval_s, step_s, parse_duration(lookback), capacity, parse_duration(stale_after)
+        )
+        self.subscriptions[name] = subscription
+        if self._running:
+            self._start(subscription)
+        return subscription
+
+    def unsubscribe(self, name: str):
+        """Stops polling subscription `name`."""
+        del self.subscriptions[name]
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    async def poll(self, subscription: Subscription) -> Optional[Delta]:
+        """
+        Polls a subscription once and returns its delta, or None if no new step is due.
+
+        Errors of the query and of parsing its result are returned in the delta rather than raised.
+        """
+        window = subscription.window(self._clock())
+        if window is None:
+            return None
+        start, end = window
+        try:
+            data = await self.client.query_range(
+                subscription.promql,
+                datetime.fromtimestamp(start, timezone.utc),
+                datetime.fromtimestamp(end, timezone.utc),
+                format_duration(subscription.step),
+                raw=True,
+            )
+            return subscription.apply(parse_metric_map(data, columnar=True), end)
+        except Exception as exc:
+            return Delta(subscription.name, {}, [], [], exc)
+
+    def _start(self, subscription: Subscription):
+        self._tasks[subscription.name] = asyncio.get_running_loop().create_task(self._run(subscription))
+
+    async def _run(self, subscription: Subscription):
+        loop = asyncio.get_running_loop()
+        due = loop.time() + self._rand() * subscription.interval
+        while True:
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            delta = await self.poll(subscription)
+            if delta is not None and (delta.points or delta.added or delta.removed or delta.error):
+                await self._queue.put(delta)
+            spread = 1.0 + self.jitter * (2.0 * self._rand() - 1.0)
+            due = max(due + subscription.interval * spread, loop.time())
+
+    def start(self):
+        """Starts polling all subscriptions; called by iteration or ``async with`` if needed."""
+        if self._running:
+            return
+        self._running = True
+        if self._queue is None:
+            self._queue = asyncio.Queue(self._max_pending)
+        for subscription in self.subscriptions.values():
+            self._start(subscription)
+
+    async def close(self):
+        """Stops all polls and ends the iterations of the watcher, including those waiting for a delta."""
+        self._running = False
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._queue is not None and not self._queue.full():
+            # a full queue has no iterator waiting on it
+            self._queue.put_nowait(_CLOSED)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def __aiter__(self) -> AsyncIterator[Delta]:
+        self.start()
+        while self._running:
+            delta = await self._queue.get()
+            if delta is _CLOSED:
+                if not self._running:
+                    self._queue.put_nowait(_CLOSED)  # wake the next waiting iterator too
+                    return
+                continue  # left over from an earlier close()
+            yield delta
@@ -0,0 +1,43 @@
+"""
+Compare the Pydantic model decoder with the fast metric map decoders.
+
+Usage: python benchmarks/bench_decoders.py [series] [points_per_series]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# run from a checkout without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from suite import make_matrix_payload
+
+from aiopromql.models.prometheus import PrometheusResponseModel, parse_metric_map
+
+
+def timed(fn, payload, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    series = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    payload = make_matrix_payload(series, points)
+
+    print(f"Decoding {series} series x {points} points")
+    cases = {
+        "model + to_metric_map": lambda d: PrometheusResponseModel(**d).to_metric_map(),
+        "metric_map": lambda d: parse_metric_map(d),
+        "columnar": lambda d: parse_metric_map(d, columnar=True),
+    }
+    baseline = None
+    for name, fn in cases.items():
+        elapsed = timed(fn, payload)
+        baseline = baseline or elapsed
+        print(f"{name:<24} {elapsed * 1000:9.1f} ms  ({baseline / elapsed:.1f}x)")
@@ -0,0 +1,73 @@
+"""
+Measure PrometheusAsync throughput against a local stub server at different pool sizes.
+
+The stub answers every request with a small vector response after a fixed delay,
+standing in for Prometheus' query evaluation time.
+
+Usage: python benchmarks/bench_pool.py [requests] [server_delay_ms]
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+# run from a checkout without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiopromql import PrometheusAsync
+
+BODY = json.dumps(
+    {
+        "status": "success",
+        "data": {"resultType": "vector", "result": [{"metric": {"__name__": "up"}, "value": [1748269310.899, "1"]}]},
+    }
+).encode()
+
+
+def start_stub_server(delay: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep connections alive
+        wbufsize = 65536  # send headers and body in one segment
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(url: str, requests: int, pool_size: int) -> float:
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    async with PrometheusAsync(url, timeout=30.0, limits=limits) as client:
+        await client.query("up", raw=True)  # warm up one connection
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client.query("up") for _ in range(requests)))
+        return requests / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+
+    server = start_stub_server(delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{requests} queries, stub server delay {delay * 1000:.0f} ms")
+    for pool_size in (1, 4, 16, 64):
+        print(f"pool size {pool_size:>3}: {asyncio.run(run(url, requests, pool_size)):8.0f} req/s")
+    server.shutdown()
@@ -0,0 +1,256 @@
+"""
+Repeatable benchmark suite: parsing, conversion, aggregation and client throughput.
+
+Payloads are synthetic vector and matrix responses at each combination of the
+given series counts and points per series. End-to-end cases run both clients
+against an in-process httpx.MockTransport, so no server or network is involved.
+
+Results are written as JSON; pass a previous result file to ``--compare`` to print
+the ratio of each case against it and exit non-zero on regressions.
+
+Usage:
+    python benchmarks/suite.py --series 10 100 --points 100 1000 --output results.json
+    python benchmarks/suite.py --compare results.json --only parse convert
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import platform
+import sys
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+# run from a checkout without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiopromql import PrometheusAsync, PrometheusSync
+from aiopromql.models.prometheus import PrometheusResponseModel, parse_metric_map
+
+GROUPS = ("parse", "convert", "aggregate", "client")
+START = 1748269440
+
+
+def make_matrix_payload(series: int, points: int) -> dict:
+    """Returns a query_range response with `series` series of `points` samples, 15s apart."""
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "matrix",
+            "result": [
+                {
+                    "metric": {"__name__": "up", "job": "bench", "instance": f"host-{i}:9100"},
+                    "values": [[START + 15 * j, str(float((i + j) % 97))] for j in range(points)],
+                }
+                for i in range(series)
+            ],
+        },
+    }
+
+
+def make_vector_payload(series: int) -> dict:
+    """Returns an instant query response with `series` samples."""
+    return {
+        "status": "success",
+        "data": {
+            "resultType": "vector",
+            "result": [
+                {
+                    "metric": {"__name__": "up", "job": "bench", "instance": f"host-{i}:9100"},
+                    "value": [START, str(float(i % 97))],
+                }
+                for i in range(series)
+            ],
+        },
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """
+    Times `fn`, calling it often enough per run that one run takes at least `min_time`.
+
+    Returns:
+        Best and mean seconds per call over `repeat` runs, and the calls per run.
+    """
+    t0 = time.perf_counter()
+    fn()
+    first = time.perf_counter() - t0
+    number = max(1, math.ceil(min_time / first)) if first > 0 else 1000
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - t0) / number)
+    return {"best": min(runs), "mean": sum(runs) / len(runs), "number": number}
+
+
+def _mock_transport(body: bytes) -> httpx.MockTransport:
+    headers = {"Content-Type": "application/json"}
+    return httpx.MockTransport(lambda request: httpx.Response(200, headers=headers, content=body))
+
+
+def _sync_client_case(body: bytes, decoder: str, requests: int) -> Callable[[], Any]:
+    start = datetime.datetime.fromtimestamp(START, datetime.timezone.utc)
+    end = start + datetime.timedelta(hours=1)
+
+    def batch():
+        with PrometheusSync("http://bench", decoder=decoder, transport=_mock_transport(body)) as client:
+            for _ in range(requests):
+                client.query_range("up", start, end, "15s")
+
+    return batch
+
+
+def _async_client_case(body: bytes, decoder: str, requests: int) -> Callable[[], Any]:
+    start = datetime.datetime.fromtimestamp(START, datetime.timezone.utc)
+    end = start + datetime.timedelta(hours=1)
+
+    async def batch():
+        async with PrometheusAsync("http://bench", decoder=decoder, transport=_mock_transport(body)) as client:
+            await asyncio.gather(*(client.query_range("up", start, end, "15s") for _ in range(requests)))
+
+    return lambda: asyncio.run(batch())
+
+
+def cases(series: int, points: int, requests: int, groups=GROUPS) -> Iterator[Tuple[str, str, int, Callable[[], Any]]]:
+    """
+    Yields (group, name, items per call, callable) for one payload size.
+
+    Items are samples, or requests for the ``client`` group, whose callables send
+    `requests` range queries through a fresh client.
+    """
+    matrix = make_matrix_payload(series, points)
+    vector = make_vector_payload(series)
+    matrix_body = json.dumps(matrix, separators=(",", ":")).encode()
+    vector_body = json.dumps(vector, separators=(",", ":")).encode()
+    samples = series * points
+
+    if "parse" in groups:
+        yield "parse", "json.loads matrix", samples, lambda: json.loads(matrix_body)
+        yield "parse", "model matrix", samples, lambda: PrometheusResponseModel(**matrix)
+        yield "parse", "json.loads vector", series, lambda: json.loads(vector_body)
+        yield "parse", "model vector", series, lambda: PrometheusResponseModel(**vector)
+
+    if "convert" in groups:
+        model = PrometheusResponseModel(**matrix)
+        yield "convert", "to_metric_map", samples, lambda: model.to_metric_map()
+        yield "convert", "to_metric_map lazy", samples, lambda: model.to_metric_map(lazy=True)
+        yield "convert", "parse_metric_map", samples, lambda: parse_metric_map(matrix)
+        yield "convert", "parse_metric_map columnar", samples, lambda: parse_metric_map(matrix, columnar=True)
+        yield "convert", "vector to_metric_map", series, lambda: PrometheusResponseModel(**vector).to_metric_map()
+
+    if "aggregate" in groups:
+        rows = list(parse_metric_map(matrix).values())
+        columns = list(parse_metric_map(matrix, columnar=True).values())
+        yield "aggregate", "TimeSeries.average", samples, lambda: [ts.average() for ts in rows]
+        yield "aggregate", "TimeSeries.latest", samples, lambda: [ts.latest() for ts in rows]
+        yield "aggregate", "ColumnarTimeSeries.average", samples, lambda: [ts.average() for ts in columns]
+        yield "aggregate", "ColumnarTimeSeries.quantile", samples, lambda: [ts.quantile(0.99) for ts in columns]
+        yield "aggregate", "ColumnarTimeSeries.rate", samples, lambda: [ts.rate() for ts in columns]
+        yield "aggregate", "ColumnarTimeSeries.resample", samples, lambda: [ts.resample("5m") for ts in columns]
+
+    if "client" in groups:
+        for decoder in ("model", "columnar"):
+            yield "client", f"PrometheusSync {decoder}", requests, _sync_client_case(matrix_body, decoder, requests)
+            yield "client", f"PrometheusAsync {decoder}", requests, _async_client_case(matrix_body, decoder, requests)
+
+
+def run_suite(
+    series_counts: List[int],
+    point_counts: List[int],
+    groups=GROUPS,
+    requests: int = 20,
+    repeat: int = 5,
+    min_time: float = 0.05,
+    log: Optional[Callable[[str], None]] = print,
+) -> dict:
+    """
+    Runs every case of the selected groups at each payload size.
+
+    Returns:
+        ``{"meta": {...}, "results": [{"group", "name", "series", "points", "best", "mean", ...}]}``
+        with times in seconds per call and throughput in items per second.
+    """
+    results = []
+    for series in series_counts:
+        for points in point_counts:
+            if log:
+                log(f"\n{series} series x {points} points")
+            for group, name, items, fn in cases(series, points, requests, groups):
+                timing = measure(fn, repeat, min_time)
+                row = {"group": group, "name": name, "series": series, "points": points, **timing}
+                row["throughput"] = items / timing["best"]
+                results.append(row)
+                if log:
+                    unit = "req/s" if group == "client" else "samples/s"
+                    log(f"  {group:<10} {name:<30} {timing['best'] * 1000:10.3f} ms  {row['throughput']:14,.0f} {unit}")
+    try:
+        version = metadata.version("aiopromql")
+    except metadata.PackageNotFoundError:
+        version = None
+    meta = {
+        "aiopromql": version,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "requests": requests,
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.1) -> List[Tuple[dict, float]]:
+    """
+    Pairs each current result with the same case in `baseline`.
+
+    Returns:
+        (result, current / baseline best time) for every case present in both; ratios
+        above ``1 + threshold`` are regressions.
+    """
+    key = lambda r: (r["group"], r["name"], r["series"], r["points"])  # noqa: E731
+    previous = {key(r): r for r in baseline["results"]}
+    return [(r, r["best"] / previous[key(r)]["best"]) for r in current["results"] if key(r) in previous]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--series", type=int, nargs="+", default=[10, 100], help="series per payload")
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 1000], help="points per series")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS), help="groups to run")
+    parser.add_argument("--requests", type=int, default=20, help="queries per end-to-end client run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case; the best is reported")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per timed run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    result = run_suite(args.series, args.points, args.only, args.requests, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    regressions = 0
+    print(f"\nCompared with {args.compare} ({baseline['meta'].get('timestamp')})")
+    for row, ratio in compare(result, baseline, args.threshold):
+        regressed = ratio > 1 + args.threshold
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {row['name']:<30} {row['series']:>6}x{row['points']:<6} {ratio:6.2f}x{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ import asyncio
 from datetime import datetime, timedelta, timezone
 
 from aiopromql import PrometheusAsync, PrometheusSync
+from aiopromql.limits import AdaptiveConcurrencyLimiter
 from aiopromql.models.prometheus import PrometheusResponseModel
 
 # Constants
@@ -11,7 +12,8 @@ st = e - timedelta(minutes=5)
 
 
 async def test_async():
-    async with PrometheusAsync(URL) as prom:
+    # keep the number of requests in flight within what the server handles well
+    async with PrometheusAsync(URL, concurrency_limiter=AdaptiveConcurrencyLimiter(initial=8)) as prom:
         tasks = [prom.query("up") for i in range(20)]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         latest_res = list(results[-1].to_metric_map().items())[-1]
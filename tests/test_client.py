@@ -1,11 +1,50 @@
-from datetime import datetime, timezone
+import asyncio
+import json
+from array import array
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import parse_qs, quote_plus
 
+import httpx
 import pytest
 
-from aiopromql import PrometheusAsync, PrometheusSync, make_label_string
-from aiopromql.models.core import MetricLabelSet, TimeSeries, TimeSeriesPoint
-from aiopromql.models.prometheus import VectorDataModel, VectorResultModel
+from aiopromql import PrometheusAsync, PrometheusSync, make_label_string, parse_duration, remote_read
+from aiopromql.cache import LRUResultCache, ResultCache, TTLCache
+from aiopromql.instrument import InMemoryMetrics, OpenTelemetryHooks, QueryHooks
+from aiopromql.limits import AdaptiveConcurrencyLimiter, RateLimiter, is_overload
+from aiopromql.models.core import ColumnarTimeSeries, MetricLabelSet, MetricMetadata, TimeSeries, TimeSeriesPoint
+from aiopromql.models.prometheus import (
+    PrometheusResponseModel,
+    VectorDataModel,
+    VectorResultModel,
+    merge_metric_maps,
+    parse_metric_map,
+)
+from aiopromql.remote_read import (
+    SAMPLES,
+    STREAMED_CONTENT_TYPE,
+    STREAMED_XOR_CHUNKS,
+    RemoteReadDecoder,
+    encode_chunked_frame,
+    encode_read_response,
+    encode_xor_chunk,
+    snappy_decompress,
+)
+from aiopromql.replicas import HedgePolicy
+from aiopromql.retry import RetryPolicy, retry_after_seconds
+from aiopromql.utils import (
+    Matcher,
+    QueryTemplate,
+    Selector,
+    aggregate,
+    expand_interval_placeholders,
+    format_duration,
+    func,
+    increase,
+    rate,
+    step_for_points,
+)
+from aiopromql.watch import Subscription, Watcher
 from tests.constants import (
     MOCK_PROMETHEUS_MATRIX_RESPONSE,
     MOCK_PROMETHEUS_VECTOR_RESPONSE,
@@ -186,3 +225,947 @@ def test_vector_data_model_to_metric_map():
     # values should be TimeSeries with at least one point
     for ts in metric_map.values():
         assert len(ts) > 0
+
+
+@pytest.mark.unit
+def test_parse_duration():
+    assert parse_duration("30s") == 30.0
+    assert parse_duration("1h30m") == 5400.0
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration(15) == 15.0
+    with pytest.raises(ValueError):
+        parse_duration("5 minutes")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("decoder, series_type", [("metric_map", TimeSeries), ("columnar", ColumnarTimeSeries)])
+@patch("aiopromql.client.httpx.Client.get")
+def test_sync_fast_decoders(mock_get, decoder, series_type):
+    mock_resp = MagicMock()
+    mock_resp.json.return_value = MOCK_PROMETHEUS_MATRIX_RESPONSE
+    mock_get.return_value = mock_resp
+
+    with PrometheusSync("http://test", decoder=decoder) as client:
+        start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+        end = datetime.fromtimestamp(1748269560, tz=timezone.utc)
+        res = client.query_range("up", start=start, end=end, step="60s")
+
+    expected = PrometheusResponseModel(**MOCK_PROMETHEUS_MATRIX_RESPONSE).to_metric_map()
+    assert res.keys() == expected.keys()
+    for key, series in res.items():
+        assert isinstance(series, series_type)
+        assert list(series) == list(expected[key])
+
+
+@pytest.mark.unit
+def test_parse_metric_map_checks_envelope():
+    assert len(parse_metric_map(MOCK_PROMETHEUS_VECTOR_RESPONSE)) == 1
+    with pytest.raises(ValueError):
+        parse_metric_map({"status": "error", "errorType": "bad_data"})
+    with pytest.raises(ValueError):
+        parse_metric_map({"status": "success", "data": {"resultType": "scalar", "result": [0, "1"]}})
+    with pytest.raises(ValueError):
+        PrometheusSync("http://test", decoder="orjson")
+
+
+def _json_transport(payload: dict) -> httpx.MockTransport:
+    return httpx.MockTransport(lambda request: httpx.Response(200, json=payload))
+
+
+@pytest.mark.unit
+def test_sync_query_range_stream():
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748269560, tz=timezone.utc)
+    with PrometheusSync("http://test", decoder="columnar") as client:
+        client.session = httpx.Client(transport=_json_transport(MOCK_PROMETHEUS_MATRIX_RESPONSE))
+        pairs = list(client.query_range_stream("up", start=start, end=end, step="60s", chunk_size=16))
+    assert len(pairs) == 1
+    labels, series = pairs[0]
+    assert labels.get("__name__") == "up"
+    assert isinstance(series, ColumnarTimeSeries)
+    assert list(series.samples) == [1.0, 1.0]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_query_range_stream():
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748269560, tz=timezone.utc)
+    async with PrometheusAsync("http://test") as client:
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(
+            base_url="http://test", transport=_json_transport(MOCK_PROMETHEUS_MATRIX_RESPONSE)
+        )
+        pairs = [pair async for pair in client.query_range_stream("up", start=start, end=end, chunk_size=16)]
+    assert len(pairs) == 1
+    assert isinstance(pairs[0][1], TimeSeries)
+    assert len(pairs[0][1]) == 2
+
+
+def _range_handler(requests: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        params = request.url.params
+        start, end, step = float(params["start"]), float(params["end"]), parse_duration(params["step"])
+        values = [[start + i * step, str(start + i * step)] for i in range(int((end - start) // step) + 1)]
+        return httpx.Response(
+            200,
+            json={
+                "status": "success",
+                "data": {"resultType": "matrix", "result": [{"metric": {"job": "a"}, "values": values}]},
+            },
+        )
+
+    return handler
+
+
+@pytest.mark.unit
+def test_sync_query_range_sharded():
+    requests = []
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748269440 + 99 * 60, tz=timezone.utc)
+    with PrometheusSync("http://test") as client:
+        client.session = httpx.Client(transport=httpx.MockTransport(_range_handler(requests)))
+        metric_map = client.query_range_sharded("up", start, end, step="60s", points_per_shard=30, concurrency=3)
+    assert len(requests) == 4
+    (series,) = metric_map.values()
+    assert [p.value for p in series] == [1748269440.0 + i * 60 for i in range(100)]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_query_range_sharded():
+    requests = []
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748269440 + 99 * 60, tz=timezone.utc)
+    async with PrometheusAsync("http://test", decoder="columnar") as client:
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(
+            base_url="http://test", transport=httpx.MockTransport(_range_handler(requests))
+        )
+        metric_map = await client.query_range_sharded("up", start, end, step="1m", points_per_shard=25)
+    assert len(requests) == 4
+    (series,) = metric_map.values()
+    assert list(series.timestamps) == [1748269440.0 + i * 60 for i in range(100)]
+
+
+@pytest.mark.unit
+def test_query_range_sharded_rejects_inverted_range():
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    with PrometheusSync("http://test") as client:
+        client.session = httpx.Client(transport=httpx.MockTransport(_range_handler([])))
+        with pytest.raises(ValueError):
+            client.query_range_sharded("up", start, start - timedelta(minutes=5), step="60s")
+        metric_map = client.query_range_sharded("up", start, start, step="60s")
+    (series,) = metric_map.values()
+    assert len(series) == 1
+
+
+@pytest.mark.unit
+def test_merge_metric_maps_drops_boundary_duplicates():
+    key = MetricLabelSet({"job": "a"})
+    first = {key: ColumnarTimeSeries([1.0, 2.0], [1.0, 2.0])}
+    second = {key: ColumnarTimeSeries([2.0, 3.0], [2.0, 3.0])}
+    assert list(merge_metric_maps([first, second])[key].timestamps) == [1.0, 2.0, 3.0]
+
+    first = {key: first[key].to_timeseries()}
+    second = {key: second[key].to_timeseries()}
+    assert [p.value for p in merge_metric_maps([first, second])[key]] == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_query_many():
+    in_flight = peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        query = request.url.params["query"]
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(1.0 if query == "slow" else 0.01)
+        in_flight -= 1
+        if query == "bad":
+            return httpx.Response(400, json={"status": "error", "errorType": "bad_data", "error": "parse error"})
+        return httpx.Response(200, json=MOCK_PROMETHEUS_VECTOR_RESPONSE)
+
+    async with PrometheusAsync("http://test") as client:
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(base_url="http://test", transport=httpx.MockTransport(handler))
+
+        batch = await client.query_many(["up"] * 6 + ["bad"], concurrency=2)
+        assert peak == 2
+        assert len(batch) == 7
+        assert all(outcome.ok for outcome in list(batch)[:6])
+        assert isinstance(batch[6].error, httpx.HTTPStatusError)
+        assert list(batch.errors()) == [6]
+        stats = batch.stats()
+        assert stats.count == 7 and stats.failed == 1
+        assert stats.min <= stats.p50 <= stats.max
+
+        batch = await client.query_many({"fast": "up", "slow": "slow"}, deadline=0.3, raw=True)
+        assert batch["fast"].result["status"] == "success"
+        assert isinstance(batch["slow"].error, asyncio.TimeoutError)
+        assert batch.results()[1] is None
+
+
+@pytest.mark.unit
+def test_sync_query_range_cache_reuses_overlapping_windows():
+    requests = []
+    now = [0.0]
+    cache = LRUResultCache(maxsize=1, ttl=60.0, clock=lambda: now[0])
+    t0 = 1748269440
+
+    def window(first: int, last: int):
+        return (
+            datetime.fromtimestamp(t0 + first * 60, tz=timezone.utc),
+            datetime.fromtimestamp(t0 + last * 60, tz=timezone.utc),
+        )
+
+    with PrometheusSync("http://test", decoder="columnar", cache=cache) as client:
+        client.session = httpx.Client(transport=httpx.MockTransport(_range_handler(requests)))
+
+        client.query_range("up", *window(0, 99), step="60s")
+        stored = cache.get(("up", 60.0))
+        metric_map = client.query_range("up", *window(10, 109), step="60s")
+        assert cache.stats() == (0, 1, 1, 0)
+        # the update went into a copy, so readers of the stored entry never see it change
+        assert (stored.start, stored.end) == (t0, t0 + 99 * 60)
+        assert len(next(iter(stored.series.values()))[1]) == 100
+        assert cache.get(("up", 60.0)) is not stored
+        # only the tail is fetched, starting from the last cached step
+        assert float(requests[-1].url.params["start"]) == t0 + 99 * 60
+        (series,) = metric_map.values()
+        assert list(series.timestamps) == [t0 + i * 60.0 for i in range(10, 110)]
+
+        raw = client.query_range("up", *window(20, 100), step="1m", raw=True)
+        assert len(requests) == 2
+        assert cache.hits == 1
+        assert len(raw["data"]["result"][0]["values"]) == 81
+
+        now[0] = 120.0  # entry expired
+        client.query_range("up", *window(20, 100), step="60s")
+        assert len(requests) == 3
+        client.query_range("down", *window(20, 100), step="60s")  # evicts "up"
+        assert cache.stats().evictions == 2
+        assert len(cache) == 1
+    with pytest.raises(TypeError):
+        ResultCache()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_coalesces_identical_inflight_queries():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.params["query"])
+        await asyncio.sleep(0.05)
+        if request.url.params["query"] == "bad":
+            return httpx.Response(503)
+        return httpx.Response(200, json=MOCK_PROMETHEUS_VECTOR_RESPONSE)
+
+    async with PrometheusAsync("http://test", coalesce=True) as client:
+        await client.client.aclose()
+        client.client = httpx.AsyncClient(base_url="http://test", transport=httpx.MockTransport(handler))
+
+        results = await asyncio.gather(*(client.query("up") for _ in range(10)), client.query("other"))
+        assert sorted(calls) == ["other", "up"]
+        assert all(result is results[0] for result in results[:10])
+
+        errors = await asyncio.gather(*(client.query("bad") for _ in range(3)), return_exceptions=True)
+        assert calls.count("bad") == 1
+        assert all(isinstance(error, httpx.HTTPStatusError) and error is errors[0] for error in errors)
+
+        # once settled, the next call issues a new request
+        await client.query("up")
+        assert calls.count("up") == 2
+        assert not client._inflight
+
+        # raw and parsed callers share the request too
+        raw, parsed, parsed_again = await asyncio.gather(
+            client.query("mixed", raw=True), client.query("mixed"), client.query("mixed")
+        )
+        assert calls.count("mixed") == 1
+        assert raw == MOCK_PROMETHEUS_VECTOR_RESPONSE
+        assert isinstance(parsed, PrometheusResponseModel) and parsed is parsed_again
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_clients_share_injected_http_client_and_transport():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=MOCK_PROMETHEUS_VECTOR_RESPONSE))
+
+    shared = httpx.AsyncClient(transport=transport)
+    async with (
+        PrometheusAsync("http://a", http_client=shared) as a,
+        PrometheusAsync("http://b", http_client=shared) as b,
+    ):
+        assert (await a.query("up", raw=True))["status"] == "success"
+        assert (await b.query("up", raw=True))["status"] == "success"
+    assert not shared.is_closed  # not owned by the Prometheus clients
+    await shared.aclose()
+
+    with PrometheusSync("http://test", transport=transport, limits=httpx.Limits(max_connections=4)) as client:
+        assert client.query("up", raw=True)["status"] == "success"
+    assert client.session.is_closed
+
+
+LONG_QUERY = 'up{pod=~"' + "|".join(f"pod-{i}" for i in range(1000)) + '"}'
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "method, query, expected_method",
+    [
+        ("auto", "up", "GET"),
+        ("auto", LONG_QUERY, "POST"),
+        ("POST", "up", "POST"),
+        ("GET", LONG_QUERY, "GET"),
+    ],
+    ids=["auto-short", "auto-long", "forced-post", "forced-get"],
+)
+def test_sync_query_method_selection(method, query, expected_method):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            assert request.headers["Content-Type"] == "application/x-www-form-urlencoded"
+            form = parse_qs(request.content.decode())
+            seen.append(("POST", form["query"][0], form.get("step", [None])[0]))
+        else:
+            seen.append(("GET", request.url.params["query"], request.url.params.get("step")))
+        return httpx.Response(200, json=MOCK_PROMETHEUS_MATRIX_RESPONSE)
+
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    with PrometheusSync("http://test", transport=httpx.MockTransport(handler), method=method) as client:
+        client.query(query, raw=True)
+        client.query_range(query, start, start, step="60s", raw=True)
+    assert seen == [(expected_method, query, None), (expected_method, query, "60s")]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_query_template():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.params["query"]))
+        return httpx.Response(200, json=MOCK_PROMETHEUS_VECTOR_RESPONSE)
+
+    template = QueryTemplate('sum by (pod) (rate(http_requests_total{pod=~"$pods"}[${window}])) > $$5')
+    query = template.render(pods="web-1|web-2", window="5m")
+    assert query == 'sum by (pod) (rate(http_requests_total{pod=~"web-1|web-2"}[5m])) > $5'
+    assert query.encoded == quote_plus(query)
+
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(handler)) as client:
+        await client.query(query, raw=True)
+    assert seen == [("GET", query)]
+
+    with pytest.raises(KeyError):
+        template.render(pods="web-1")
+
+
+@pytest.mark.unit
+def test_make_label_string_escapes_and_negates():
+    assert make_label_string(negate_keys=["env"], env="dev", path='a"b\\c') == '{env!="dev",path="a\\"b\\\\c"}'
+    assert make_label_string(negate_keys=("env",), env="dev") is make_label_string(negate_keys=["env"], env="dev")
+    # equal but differently rendered values do not share a cache entry
+    assert make_label_string(a=1) == '{a="1"}'
+    assert make_label_string(a=1.0) == '{a="1.0"}'
+    assert make_label_string(a=True) == '{a="True"}'
+
+
+@pytest.mark.unit
+def test_promql_builder():
+    sel = Selector(
+        "http_requests_total", job="api", instance__re=r"web-\d+", code__ne="200", pod__nre="canary.*", x=None
+    )
+    assert str(sel) == 'http_requests_total{job="api",instance=~"web-\\\\d+",code!="200",pod!~"canary.*"}'
+    assert sel == Selector("http_requests_total", *sel.matchers)
+    assert Selector("up")["1m"] == "up[1m]"
+    assert (
+        Selector(Matcher("__name__", "=~", "node_.*")).range("5m", offset="1h") == '{__name__=~"node_.*"}[5m] offset 1h'
+    )
+
+    up = Selector("up", job="api")
+    assert aggregate("sum", rate(up, "5m"), by=["job"]) == 'sum by (job) (rate(up{job="api"}[5m]))'
+    assert aggregate("topk", up, without=("pod",), param=3) == 'topk without (pod) (3, up{job="api"})'
+    assert func("histogram_quantile", 0.9, "x") == "histogram_quantile(0.9, x)"
+    assert increase(up.where(env="prod"), "1h") == 'increase(up{job="api",env="prod"}[1h])'
+    with pytest.raises(ValueError):
+        aggregate("median", up)
+    with pytest.raises(ValueError):
+        Selector("up", Matcher("job", "==", "api"))
+
+
+@pytest.mark.unit
+def test_step_helpers():
+    assert format_duration(90) == "1m30s"
+    assert format_duration(0.5) == "500ms"
+    assert step_for_points(0, 7 * 86400, 1000) == 900.0
+    assert step_for_points(0, 600, 1000, min_step=15) == 15.0
+    assert expand_interval_placeholders("rate(x[$__rate_interval]) + y[$__interval]", 600) == "rate(x[10m15s]) + y[10m]"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_query_range_max_points():
+    requests = []
+    start = datetime.fromtimestamp(1748217600, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748217600 + 86400, tz=timezone.utc)
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(_range_handler(requests))) as client:
+        await client.query_range("rate(x[$__rate_interval])", start, end, step="30s", max_points=500)
+        await client.query_range("up", start, end, step="1h", max_points=500)
+    assert requests[0].url.params["step"] == "5m"
+    assert requests[0].url.params["query"] == "rate(x[5m15s])"
+    assert requests[1].url.params["step"] == "1h"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_and_sharded_queries_apply_max_points():
+    requests = []
+    start = datetime.fromtimestamp(1748217600, tz=timezone.utc)
+    end = datetime.fromtimestamp(1748217600 + 86400, tz=timezone.utc)
+    promql = "rate(x[$__rate_interval])"
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(_range_handler(requests))) as client:
+        [pair async for pair in client.query_range_stream(promql, start, end, step="30s", max_points=500)]
+        await client.query_range_sharded(promql, start, end, step="30s", points_per_shard=200, max_points=500)
+    with PrometheusSync("http://test", transport=httpx.MockTransport(_range_handler(requests))) as client:
+        list(client.query_range_stream(promql, start, end, step="30s", max_points=500))
+        client.query_range_sharded(promql, start, end, step="30s", points_per_shard=200, max_points=500)
+    assert len(requests) == 6  # each sharded query: 289 five-minute steps in two shards
+    assert {(r.url.params["step"], r.url.params["query"]) for r in requests} == {("5m", "rate(x[5m15s])")}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_instrumentation_hooks_report_phases_and_sizes():
+    metrics = InMemoryMetrics()
+    seen = []
+
+    class Recorder(QueryHooks):
+        def on_query_end(self, stats):
+            seen.append(stats)
+
+    transport = _json_transport(MOCK_PROMETHEUS_MATRIX_RESPONSE)
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    with PrometheusSync("http://test", transport=transport, hooks=[metrics, Recorder()]) as client:
+        client.query_range("up", start, start, step="60s")
+        client.query("up", raw=True)
+    async with PrometheusAsync("http://test", transport=transport, decoder="columnar", hooks=[metrics]) as client:
+        await client.query_range("up", start, start, step="60s")
+    failing = httpx.MockTransport(lambda request: httpx.Response(503))
+    with PrometheusSync("http://test", transport=failing, hooks=[metrics]) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.query("up")
+
+    ranged, instant = seen
+    assert ranged.endpoint == "/api/v1/query_range"
+    assert set(ranged.phases) == {"wait", "download", "decode", "parse"}
+    assert ranged.response_bytes == len(json.dumps(MOCK_PROMETHEUS_MATRIX_RESPONSE, separators=(",", ":")))
+    assert (ranged.series, ranged.samples, ranged.retries) == (1, 2, 0)
+    assert ranged.duration >= sum(ranged.phases.values())
+    assert "parse" not in instant.phases
+
+    assert (metrics.queries, metrics.errors) == (4, 1)
+    assert metrics.latency(endpoint="/api/v1/query_range").count == 2
+    assert metrics.latency("parse").count == 2
+    assert metrics.size("samples", "/api/v1/query_range").max == 2
+    summary = metrics.summary()
+    assert summary["/api/v1/query"]["total"]["count"] == 2
+    assert summary["/api/v1/query_range"]["decode"]["p99"] <= metrics.latency("decode").max
+
+
+@pytest.mark.unit
+def test_opentelemetry_hooks():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    hooks = OpenTelemetryHooks(tracer=provider.get_tracer("test"))
+    with PrometheusSync("http://test", transport=_json_transport(MOCK_PROMETHEUS_VECTOR_RESPONSE), hooks=[hooks]) as c:
+        c.query("up")
+    (span,) = exporter.get_finished_spans()
+    assert span.name == "prometheus /api/v1/query"
+    assert span.attributes["db.statement"] == "up"
+    assert span.attributes["aiopromql.series"] == 1
+    assert span.attributes["http.response.status_code"] == 200
+
+
+def _flaky_transport(failures: list, payload: dict) -> httpx.MockTransport:
+    """Answer with the queued failures (status codes or exceptions) first, then with payload."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if failures:
+            failure = failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return httpx.Response(failure, headers={"Retry-After": "0"} if failure == 429 else {})
+        return httpx.Response(200, json=payload)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.unit
+def test_sync_retry_policy():
+    metrics = InMemoryMetrics()
+    policy = RetryPolicy(max_retries=3, backoff=0.001, jitter=False)
+    failures = [503, 429, httpx.ConnectError("refused")]
+    transport = _flaky_transport(failures, MOCK_PROMETHEUS_VECTOR_RESPONSE)
+    with PrometheusSync("http://test", transport=transport, retry=policy, hooks=[metrics]) as client:
+        assert client.query("up", raw=True) == MOCK_PROMETHEUS_VECTOR_RESPONSE
+        assert metrics.retries == 3
+
+        failures.append(400)
+        with pytest.raises(httpx.HTTPStatusError):
+            client.query("up")  # 400 is not retried
+        failures.extend([503] * 4)
+        with pytest.raises(httpx.HTTPStatusError):
+            client.query("up")  # gives up after max_retries
+        assert failures == []
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_retry_budget_limits_retries():
+    policy = RetryPolicy(max_retries=5, backoff=0.001, budget_capacity=2, budget_ratio=0.5)
+    failures = [httpx.ReadTimeout("slow")] * 4
+    transport = _flaky_transport(failures, MOCK_PROMETHEUS_VECTOR_RESPONSE)
+    async with PrometheusAsync("http://test", transport=transport, retry=policy) as client:
+        with pytest.raises(httpx.ReadTimeout):
+            await client.query("up")
+        assert len(failures) == 1  # two retries spent the budget
+        with pytest.raises(httpx.ReadTimeout):
+            await client.query("up")  # half a token earned, not enough for a retry
+        assert failures == []
+        await client.query("up")
+
+
+@pytest.mark.unit
+def test_retry_policy_delays():
+    policy = RetryPolicy(backoff=1.0, max_backoff=3.0, rand=lambda: 0.5, max_elapsed=10.0)
+    unavailable = httpx.HTTPStatusError("", request=None, response=httpx.Response(503))
+    assert [policy.delay(unavailable, n, 0.0) for n in range(4)] == [0.5, 1.0, 1.5, None]
+    assert policy.delay(unavailable, 1, 9.5) is None
+
+    throttled = httpx.Response(429, headers={"Retry-After": "Fri, 01 Jan 2100 00:00:05 GMT"})
+    assert retry_after_seconds(throttled, now=4102444800.0) == 5.0
+    assert policy.delay(httpx.HTTPStatusError("", request=None, response=throttled), 0, 0.0) is None  # too far out
+    throttled = httpx.Response(429, headers={"Retry-After": "2"})
+    assert policy.delay(httpx.HTTPStatusError("", request=None, response=throttled), 0, 0.0) == 2.0
+    assert policy.delay(ValueError(), 0, 0.0) is None
+
+
+def _replica_transport(delays: dict, statuses: dict = None, seen: list = None) -> httpx.MockTransport:
+    """Answer per host after delays[host] seconds, with statuses.get(host, 200)."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if seen is not None:
+            seen.append(request.url.host)
+        await asyncio.sleep(delays.get(request.url.host, 0.0))
+        status = (statuses or {}).get(request.url.host, 200)
+        return httpx.Response(status, json=MOCK_PROMETHEUS_VECTOR_RESPONSE)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_hedges_slow_replica():
+    seen = []
+    transport = _replica_transport({"prom-a": 1.0}, seen=seen)
+    hedge = HedgePolicy(initial_delay=0.02)
+    metrics = InMemoryMetrics()
+    urls = ["http://prom-a:9090", "http://prom-b:9090"]
+    async with PrometheusAsync(urls, transport=transport, hedge=hedge, hooks=[metrics]) as client:
+        t0 = asyncio.get_running_loop().time()
+        assert await client.query("up", raw=True) == MOCK_PROMETHEUS_VECTOR_RESPONSE
+        assert asyncio.get_running_loop().time() - t0 < 0.5
+        assert seen == ["prom-a", "prom-b"]
+        # prom-a lost the race, so it counts as slower than prom-b
+        assert [r.url for r in client.replicas.ranked()] == urls[::-1]
+        seen.clear()
+        await client.query("up")
+        assert seen == ["prom-b"]
+    assert metrics.latency("wait").count == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_fails_over_between_replicas():
+    seen = []
+    transport = _replica_transport({}, statuses={"prom-a": 503, "prom-c": 400}, seen=seen)
+    async with PrometheusAsync(["http://prom-a", "http://prom-b"], transport=transport) as client:
+        await client.query("up")
+        assert seen == ["prom-a", "prom-b"]
+        assert client.replicas.ranked()[0].url == "http://prom-b"
+    async with PrometheusAsync(["http://prom-c", "http://prom-b"], transport=transport) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.query("bad query")  # a 400 is the query's fault, not the replica's
+    assert seen[-1] == "prom-c"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_concurrency_and_rate_limits():
+    inflight = peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal inflight, peak
+        inflight += 1
+        peak = max(peak, inflight)
+        await asyncio.sleep(0.005)
+        inflight -= 1
+        return httpx.Response(200, json=MOCK_PROMETHEUS_VECTOR_RESPONSE)
+
+    limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=4)
+    async with PrometheusAsync(
+        "http://test", transport=httpx.MockTransport(handler), concurrency_limiter=limiter
+    ) as client:
+        await asyncio.gather(*(client.query("up") for _ in range(20)))
+    assert peak == 4
+    assert limiter.inflight == 0
+
+    loop = asyncio.get_running_loop()
+    async with PrometheusAsync(
+        "http://test", transport=_json_transport(MOCK_PROMETHEUS_VECTOR_RESPONSE), rate_limiter=RateLimiter(100)
+    ) as client:
+        t0 = loop.time()
+        await asyncio.gather(*(client.query("up") for _ in range(6)))
+        assert loop.time() - t0 >= 0.045  # one burst token, then 10ms per request
+
+
+@pytest.mark.unit
+def test_adaptive_concurrency_aimd():
+    limiter = AdaptiveConcurrencyLimiter(initial=4, max_limit=10, backoff=0.5)
+    for _ in range(8):
+        limiter.inflight += 1
+        limiter.release(latency=0.01)
+    assert limiter.limit == pytest.approx(5.6, abs=0.1)  # about +1 per round of 4-5 requests
+
+    for _ in range(2):
+        limiter.inflight += 1
+        limiter.release(overloaded=True)
+    assert limiter.limit == pytest.approx(2.8, abs=0.1)  # one decrease per round
+
+    assert is_overload(httpx.ReadTimeout("slow"))
+    assert not is_overload(httpx.HTTPStatusError("", request=None, response=httpx.Response(400)))
+
+
+@pytest.mark.unit
+def test_adaptive_concurrency_latency_gradient():
+    limiter = AdaptiveConcurrencyLimiter(initial=32, max_limit=32)
+    for i in range(1000):  # healthy mix of cheap and heavy queries
+        limiter.inflight += 1
+        limiter.release(latency=0.005 if i % 2 else 0.02)
+    assert limiter.limit == 32
+
+    for _ in range(5):  # latency jumps well above the long-term average: queueing
+        limiter.inflight += 1
+        limiter.release(latency=0.1)
+    assert limiter.limit == pytest.approx(32 * 0.9)
+
+
+def _metadata_handler(requests: list):
+    bodies = {
+        "/api/v1/series": [{"__name__": "up", "job": "api"}, {"__name__": "up", "job": "db"}],
+        "/api/v1/labels": ["__name__", "job"],
+        "/api/v1/label/job/values": ["api", "db"],
+        "/api/v1/metadata": {"up": [{"type": "gauge", "help": "Target is up.", "unit": ""}]},
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"status": "success", "data": bodies[request.url.path]})
+
+    return handler
+
+
+@pytest.mark.unit
+def test_sync_metadata_endpoints():
+    requests = []
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    transport = httpx.MockTransport(_metadata_handler(requests))
+    with PrometheusSync("http://test", transport=transport) as client:
+        series = client.series([Selector("up", job="api"), "up{job='db'}"], start=start, limit=10)
+        assert series == [
+            MetricLabelSet({"__name__": "up", "job": "api"}),
+            MetricLabelSet({"job": "db", "__name__": "up"}),
+        ]
+        assert requests[-1].url.params.get_list("match[]") == ['up{job="api"}', "up{job='db'}"]
+        assert requests[-1].url.params["start"] == "1748269440.0"
+        assert requests[-1].url.params["limit"] == "10"
+        with pytest.raises(ValueError):
+            client.series([])
+
+        assert client.labels() == ["__name__", "job"]
+        assert "match[]" not in requests[-1].url.params
+        assert client.metadata("up")["up"] == [MetricMetadata("gauge", "Target is up.", "")]
+        assert requests[-1].url.params["metric"] == "up"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_label_values_are_cached_and_coalesced():
+    requests = []
+    clock = [0.0]
+    transport = httpx.MockTransport(_metadata_handler(requests))
+    async with PrometheusAsync("http://test", transport=transport, coalesce=True) as client:
+        client.label_cache = TTLCache(ttl=60.0, clock=lambda: clock[0])
+        results = await asyncio.gather(*(client.label_values("job", match="up") for _ in range(5)))
+        assert results == [["api", "db"]] * 5
+        assert len(requests) == 1
+        assert requests[0].url.path == "/api/v1/label/job/values"
+
+        await client.label_values("job", match="up")
+        assert len(requests) == 1
+        await client.label_values("job", match="up", use_cache=False)
+        assert len(requests) == 2
+        clock[0] = 61.0
+        await client.label_values("job", match="up")
+        assert len(requests) == 3
+        await client.label_values("job")  # a different selector is a different entry
+        assert len(requests) == 4
+
+
+def _remote_read_handler(requests: list, streamed_supported: bool = True):
+    samples = [(1748269440000 + i * 15000, float(i) * 1.5) for i in range(300)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = snappy_decompress(request.content)
+        requests.append(body)
+        if streamed_supported and body.endswith(bytes([0x10, STREAMED_XOR_CHUNKS, 0x10, SAMPLES])):
+            frames = encode_chunked_frame(
+                [({"__name__": "up", "job": "api"}, [encode_xor_chunk(samples[:120]), encode_xor_chunk(samples[120:])])]
+            ) + encode_chunked_frame([({"__name__": "up", "job": "db"}, [encode_xor_chunk(samples[:2])])])
+            return httpx.Response(200, headers={"Content-Type": STREAMED_CONTENT_TYPE}, content=frames)
+        content = encode_read_response([({"__name__": "up"}, [(1748269440000, 2.5)])])
+        headers = {"Content-Type": "application/x-protobuf", "Content-Encoding": "snappy"}
+        return httpx.Response(200, headers=headers, content=content)
+
+    return handler, samples
+
+
+@pytest.mark.unit
+def test_sync_remote_read_streamed():
+    requests = []
+    handler, samples = _remote_read_handler(requests)
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    with PrometheusSync("http://test", transport=httpx.MockTransport(handler), decoder="columnar") as client:
+        result = client.remote_read(Selector("up", job__re="api|db"), start, start + timedelta(hours=2))
+    assert b"__name__" in requests[0] and b"api|db" in requests[0]
+    series = result[MetricLabelSet({"__name__": "up", "job": "api"})]
+    assert isinstance(series, ColumnarTimeSeries)
+    assert list(series.timestamps) == [t / 1000 for t, _ in samples]
+    assert list(series.samples) == [v for _, v in samples]
+    assert len(result[MetricLabelSet({"__name__": "up", "job": "db"})]) == 2
+
+    with PrometheusSync("http://test", transport=httpx.MockTransport(handler), decoder="columnar") as client:
+        result = client.remote_read(Selector("up"), start + timedelta(minutes=10), start + timedelta(minutes=40))
+    series = result[MetricLabelSet({"__name__": "up", "job": "api"})]
+    assert list(series.timestamps) == [t / 1000 for t, _ in samples[40:161]]  # chunks span both ends
+    assert MetricLabelSet({"__name__": "up", "job": "db"}) not in result
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_remote_read_sampled_fallback():
+    requests = []
+    handler, _ = _remote_read_handler(requests, streamed_supported=False)
+    start = datetime.fromtimestamp(1748269440, tz=timezone.utc)
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(handler)) as client:
+        result = await client.remote_read([Matcher("__name__", "=", "up")], start, start, streamed=False)
+    (series,) = result.values()
+    assert isinstance(series, TimeSeries)
+    assert list(series) == [TimeSeriesPoint(datetime.fromtimestamp(1748269440.0), 2.5)]
+
+
+@pytest.mark.unit
+def test_remote_read_decoder_handles_split_frames():
+    frame = encode_chunked_frame([({"job": "a"}, [encode_xor_chunk([(0, 1.0), (15000, 2.0), (45000, -1.0)])])])
+    decoder = RemoteReadDecoder()
+    for i in range(len(frame)):
+        decoder.feed(frame[i : i + 1])
+    (series,) = decoder.close().values()
+    assert list(series.timestamps) == [0.0, 15.0, 45.0]
+    assert list(series.samples) == [1.0, 2.0, -1.0]
+
+    corrupt = bytearray(frame)
+    corrupt[-1] ^= 0xFF
+    with pytest.raises(ValueError):
+        RemoteReadDecoder().feed(bytes(corrupt))
+    truncated = RemoteReadDecoder()
+    truncated.feed(frame[:-1])
+    with pytest.raises(ValueError):
+        truncated.close()
+
+
+@pytest.mark.unit
+def test_remote_read_decoder_clips_and_merges_chunks():
+    first = [(i * 15000, float(i)) for i in range(7)]  # 0s .. 90s, starts before the range
+    overlapping = [(i * 15000, 100.0 + i) for i in range(4, 11)]  # 60s .. 150s, ends after it
+    outside = [(1000000 + i * 15000, 0.0) for i in range(3)]
+    frame = encode_chunked_frame([({"job": "a"}, [encode_xor_chunk(overlapping), encode_xor_chunk(outside)])])
+    frame += encode_chunked_frame([({"job": "a"}, [encode_xor_chunk(first)])])
+    decoder = RemoteReadDecoder(start_ms=30000, end_ms=120000)
+    decoder.feed(frame)
+    (series,) = decoder.close().values()
+    assert list(series.timestamps) == [30.0, 45.0, 60.0, 75.0, 90.0, 105.0, 120.0]
+    assert list(series.samples) == [2.0, 3.0, 104.0, 105.0, 106.0, 107.0, 108.0]  # the first sample per timestamp wins
+
+    unclipped = RemoteReadDecoder()
+    unclipped.feed(frame)
+    (series,) = unclipped.close().values()
+    assert len(series) == 14 and list(series.timestamps) == sorted(series.timestamps)
+
+
+@pytest.mark.unit
+def test_remote_read_decoder_merges_sampled_series_out_of_order():
+    later = [(60000, 3.0), (75000, 4.0)]
+    earlier = [(30000, 1.0), (45000, 2.0), (60000, 9.0)]
+    decoder = RemoteReadDecoder("application/x-protobuf")
+    decoder.feed(encode_read_response([({"__name__": "up"}, later), ({"__name__": "up"}, earlier)]))
+    (series,) = decoder.close().values()
+    assert list(series.timestamps) == [30.0, 45.0, 60.0, 75.0]
+    assert list(series.samples) == [1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.unit
+def test_remote_read_pure_python_codecs():
+    assert remote_read._crc32c_python(b"123456789") == 0xE3069283
+    data = bytes(range(256)) * 3
+    for n in (0, 1, 7, 8, 9, 100, len(data)):
+        crc = 0xFFFFFFFF
+        for byte in data[:n]:
+            crc = remote_read._CRC32C_TABLES[0][(crc ^ byte) & 0xFF] ^ (crc >> 8)
+        assert remote_read._crc32c_python(data[:n]) == crc ^ 0xFFFFFFFF
+
+    # every timestamp delta-of-delta width, repeated and changing XOR windows, special floats
+    offsets = [0, 15000, 30000, 45000, 46000, 50000, 200000, 200001, 2**40, 2**40 + 15000, 2**40 - 7]
+    values = [1.0, 1.0, 2.5, -0.0, 1e300, float("inf"), 3.0, 3.0000001, -7.25, 42.0, 42.0]
+    samples = [(1748269440000 + t, v) for t, v in zip(offsets, values)]
+    chunk = encode_xor_chunk(samples)
+    timestamps, decoded = array("d"), array("d")
+    remote_read.decode_xor_chunk(chunk, timestamps, decoded)
+    assert list(timestamps) == [t / 1000 for t, _ in samples]
+    assert list(decoded) == values
+    with pytest.raises(ValueError, match="out of data"):
+        remote_read.decode_xor_chunk(chunk[:-3], array("d"), array("d"))
+
+
+def _watch_handler(requests: list, jobs: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        params = request.url.params
+        start, end, step = float(params["start"]), float(params["end"]), parse_duration(params["step"])
+        values = [[start + i * step, str(start + i * step)] for i in range(int((end - start) // step) + 1)]
+        result = [{"metric": {"job": job}, "values": values} for job in jobs]
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+    return handler
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_watcher_polls_incrementally():
+    requests, jobs, now = [], ["a", "b"], [1748269470.0]
+    transport = httpx.MockTransport(_watch_handler(requests, jobs))
+    async with PrometheusAsync("http://test", transport=transport) as client:
+        watcher = Watcher(client, clock=lambda: now[0])
+        sub = watcher.subscribe("up", interval="1m", lookback="5m", capacity=4, stale_after="2m")
+
+        delta = await watcher.poll(sub)
+        a, b = MetricLabelSet({"job": "a"}), MetricLabelSet({"job": "b"})
+        assert delta.added == [a, b] and delta.removed == [] and delta.error is None
+        assert list(delta.points[a].timestamps) == [1748269140.0 + 60 * i for i in range(6)]
+        assert list(sub.series[a].timestamps) == [1748269260.0 + 60 * i for i in range(4)]  # capacity
+
+        assert await watcher.poll(sub) is None  # no new step yet
+        now[0] += 125
+        jobs.remove("b")
+        delta = await watcher.poll(sub)
+        assert float(requests[-1].url.params["start"]) == 1748269500.0
+        assert list(delta.points[a].timestamps) == [1748269500.0, 1748269560.0]
+        assert delta.added == [] and delta.removed == []
+
+        now[0] += 60
+        delta = await watcher.poll(sub)
+        assert delta.removed == [b] and set(sub.series) == {a}
+        assert list(sub.series[a].timestamps) == [1748269440.0 + 60 * i for i in range(4)]
+
+
+@pytest.mark.unit
+def test_subscription_drops_already_delivered_samples():
+    sub = Subscription("up", "up", 60.0, 60.0, 300.0, 100, 300.0)
+    labels = MetricLabelSet({"job": "a"})
+    sub.apply({labels: ColumnarTimeSeries([0.0, 60.0], [1.0, 2.0])}, 60.0)
+    delta = sub.apply({labels: ColumnarTimeSeries([60.0, 120.0], [2.0, 3.0])}, 120.0)
+    assert list(delta.points[labels].samples) == [3.0] and delta.samples == 1
+    assert list(sub.series[labels].samples) == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_watcher_iterates_deltas_and_errors():
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            return httpx.Response(503)
+        return _watch_handler([], ["a"])(request)
+
+    clock = iter(range(1748269440, 1748279440, 60))
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(handler)) as client:
+        async with Watcher(client, clock=lambda: float(next(clock)), rand=lambda: 0.0) as watcher:
+            watcher.subscribe("up", interval=0.001, step="1m", name="up")
+            deltas = []
+            async for delta in watcher:
+                deltas.append(delta)
+                if len(deltas) == 3:
+                    break
+    assert deltas[0].added and deltas[0].samples == 6
+    assert isinstance(deltas[1].error, httpx.HTTPStatusError)
+    assert deltas[2].samples == 2  # the failed window is fetched again
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_watcher_close_ends_waiting_iterators():
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(_watch_handler([], []))) as client:
+        watcher = Watcher(client)
+
+        async def consume():
+            return [delta async for delta in watcher]
+
+        consumers = [asyncio.create_task(consume()) for _ in range(2)]
+        await asyncio.sleep(0)  # both wait for a delta that never comes
+        await watcher.close()
+        assert await asyncio.wait_for(asyncio.gather(*consumers), 1.0) == [[], []]
+
+        watcher.start()  # the stop marker left by close() does not end a new iteration
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        assert not consumer.done()
+        await watcher.close()
+        assert await asyncio.wait_for(consumer, 1.0) == []
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_watcher_poll_returns_parse_errors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"status": "success", "data": {"resultType": "string", "result": [0, "x"]}})
+
+    async with PrometheusAsync("http://test", transport=httpx.MockTransport(handler)) as client:
+        watcher = Watcher(client, clock=lambda: 1748269440.0)
+        sub = watcher.subscribe("up", interval="1m")
+        delta = await watcher.poll(sub)
+    assert delta.error is not None and delta.points == {} and sub.last_end is None
@@ -1,12 +1,25 @@
+import json
+import math
+import pickle
 from datetime import datetime, timedelta
 
 import pytest
 
+from aiopromql.models import core
 from aiopromql.models.core import (
+    ColumnarTimeSeries,
+    LazyTimeSeries,
     MetricLabelSet,
+    RingTimeSeries,
     TimeSeries,
     TimeSeriesPoint,
 )
+from aiopromql.models.index import LabelIndex
+from aiopromql.models.matrix import SeriesMatrix
+from aiopromql.models.prometheus import PrometheusResponseModel, parse_metric_map
+from aiopromql.models.stream import ResultStreamDecoder
+from aiopromql.utils import Matcher, Selector
+from tests.constants import MOCK_PROMETHEUS_MATRIX_RESPONSE, MOCK_PROMETHEUS_VECTOR_RESPONSE
 
 
 @pytest.mark.unit
@@ -35,3 +48,411 @@ def test_timeseries_iter_len_getitem():
     # __getitem__ returns the right point
     assert ts[0] == points[0]
     assert ts[2] == points[2]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def columnar_backend(request, monkeypatch):
+    """Runs a test with the NumPy aggregations of ColumnarTimeSeries and with the pure-Python fallback."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(core, "_np", None)
+    return request.param
+
+
+@pytest.mark.unit
+def test_columnar_timeseries_aggregations(columnar_backend):
+    series = ColumnarTimeSeries.from_prometheus_values([[100, "1"], [130, "4"], [160, "2"], [190, "5"]])
+    assert len(series) == 4
+    assert series.sum() == 12.0
+    assert series.average() == 3.0
+    assert series.min() == 1.0
+    assert series.max() == 5.0
+    assert series.quantile(0.5) == 3.0
+    assert series.latest() == TimeSeriesPoint(datetime.fromtimestamp(190), 5.0)
+    assert list(series.diff().samples) == [3.0, -2.0, 3.0]
+    # the drop from 4 to 2 is treated as a counter reset
+    assert list(series.rate().samples) == [0.1, 2 / 30, 0.1]
+    resampled = series.resample("1m", how="max")
+    assert list(resampled.timestamps) == [60.0, 120.0, 180.0]
+    assert list(resampled.samples) == [1.0, 4.0, 5.0]
+    expected = {"mean": [1.0, 3.0, 5.0], "sum": [1.0, 6.0, 5.0], "min": [1.0, 2.0, 5.0], "first": [1.0, 4.0, 5.0]}
+    expected.update(last=[1.0, 2.0, 5.0], count=[1.0, 2.0, 1.0])
+    for how, samples in expected.items():
+        assert list(series.resample(60, how=how).samples) == samples
+    assert math.isnan(ColumnarTimeSeries([0.0, 0.0], [1.0, 2.0]).rate().samples[0])
+    empty = ColumnarTimeSeries()
+    assert empty.latest() is None and empty.min() is None and empty.sum() == 0.0
+    assert len(empty.rate()) == 0 and len(empty.diff()) == 0 and len(empty.resample(60)) == 0
+
+
+@pytest.mark.unit
+def test_columnar_timeseries_compat():
+    now = datetime.fromtimestamp(1680000000)
+    points = [TimeSeriesPoint(now, 1.0), TimeSeriesPoint(now + timedelta(seconds=1), 2.0)]
+    series = TimeSeries(list(points)).to_columnar()
+    assert list(series) == points
+    assert series[1] == points[1]
+    assert len(series[:1]) == 1
+    assert series.to_timeseries().values == points
+    assert ColumnarTimeSeries().average() is None
+    with pytest.raises(ValueError):
+        series.resample("1m", how="median")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_result_stream_decoder_matches_full_parse(chunk_size):
+    body = json.dumps(MOCK_PROMETHEUS_MATRIX_RESPONSE).encode()
+    body = body.replace(b'"up"', '"upé"'.encode())  # multi-byte characters split across chunks
+    decoder = ResultStreamDecoder()
+    pairs = []
+    for i in range(0, len(body), chunk_size):
+        pairs.extend(decoder.feed(body[i : i + chunk_size]))
+    pairs.extend(decoder.close())
+
+    expected = parse_metric_map(json.loads(body))
+    assert dict(pairs).keys() == expected.keys()
+    assert [list(series) for _, series in pairs] == [list(series) for series in expected.values()]
+
+
+@pytest.mark.unit
+def test_result_stream_decoder_errors():
+    decoder = ResultStreamDecoder()
+    decoder.feed(b'{"status":"success","data":{"resultType":"matrix","result":[{"metric":{}')
+    with pytest.raises(ValueError, match="ended before"):
+        decoder.close()
+
+    decoder = ResultStreamDecoder()
+    decoder.feed(b'{"status":"error","errorType":"bad_data","error":"parse error"}')
+    with pytest.raises(ValueError, match="error"):
+        decoder.close()
+
+    with pytest.raises(ValueError, match="resultType"):
+        ResultStreamDecoder().feed(b'{"status":"success","data":{"resultType":"scalar","result":[1,"1"]}}')
+
+
+@pytest.mark.unit
+def test_metriclabelset_is_canonical_and_compact():
+    m1 = MetricLabelSet({"job": "api", "instance": "web-1"})
+    m2 = MetricLabelSet({"instance": "web-1", "job": "api"})
+    assert m1 is m2
+    assert m1.pairs == (("instance", "web-1"), ("job", "api"))
+    assert m1.dict == {"job": "api", "instance": "web-1"}
+    assert m1.get("job") == "api"
+    assert m1.get("pod") is None
+    assert not hasattr(m1, "__dict__")
+    assert pickle.loads(pickle.dumps(m1)) is m1
+    assert {m1: 1}[MetricLabelSet({"job": "api", "instance": "web-1"})] == 1
+
+
+@pytest.mark.unit
+def test_metriclabelset_dict_get_and_value_types():
+    labels = MetricLabelSet({"job": "api", "instance": "web-1"})
+    assert labels.dict == {"job": "api", "instance": "web-1"}
+    assert labels.dict is labels.dict  # cached, not rebuilt per access
+    assert labels.get("job") == "api" and labels.get("zone", "-") == "-"
+    assert MetricLabelSet({"code": 500, "ok": True}) is MetricLabelSet({"code": "500", "ok": "True"})
+    with pytest.raises(TypeError, match="Label value of 'job' must be a string"):
+        MetricLabelSet({"job": None})
+
+
+EXPORT_RESPONSE = {
+    "status": "success",
+    "data": {
+        "resultType": "matrix",
+        "result": [
+            {"metric": {"job": "a", "instance": "x"}, "values": [[1748269440, "1"], [1748269500, "2"]]},
+            {"metric": {"job": "b"}, "values": [[1748269500, "3"], [1748269560.5, "4"]]},
+        ],
+    },
+}
+
+
+@pytest.mark.unit
+def test_to_dataframe_long_and_wide():
+    pd = pytest.importorskip("pandas")
+    resp = PrometheusResponseModel(**EXPORT_RESPONSE)
+
+    long = resp.to_dataframe()
+    assert list(long.columns) == ["timestamp", "value", "instance", "job"]
+    assert list(long["value"]) == [1.0, 2.0, 3.0, 4.0]
+    assert isinstance(long["job"].dtype, pd.CategoricalDtype)
+    assert long["instance"].isna().tolist() == [False, False, True, True]
+    assert long["timestamp"].iloc[3] == pd.Timestamp(1748269560.5, unit="s", tz="UTC")
+
+    wide = resp.to_dataframe(layout="wide")
+    assert wide.shape == (3, 2)
+    assert wide.columns.names == ["instance", "job"]
+    assert wide[("x", "a")].tolist()[:2] == [1.0, 2.0]
+
+
+@pytest.mark.unit
+def test_to_arrow_long_and_wide():
+    pa = pytest.importorskip("pyarrow")
+    resp = PrometheusResponseModel(**EXPORT_RESPONSE)
+
+    table = resp.to_arrow()
+    assert table.num_rows == 4
+    assert table.schema.field("timestamp").type == pa.timestamp("ms", tz="UTC")
+    assert pa.types.is_dictionary(table.schema.field("job").type)
+    assert table.column("instance").to_pylist() == ["x", "x", None, None]
+
+    wide = resp.to_arrow(layout="wide")
+    assert wide.column_names == ["timestamp", '{instance="x",job="a"}', '{job="b"}']
+    assert wide.column('{job="b"}').to_pylist() == [None, 3.0, 4.0]
+    assert wide.column('{instance="x",job="a"}').to_pylist() == [1.0, 2.0, None]
+    assert wide.schema.field('{job="b"}').type == pa.float64()
+    assert wide.column("timestamp").to_pylist() == sorted(wide.column("timestamp").to_pylist())
+
+    vector = PrometheusResponseModel(**MOCK_PROMETHEUS_VECTOR_RESPONSE).to_arrow()
+    assert vector.num_rows == 1
+
+
+@pytest.mark.unit
+def test_lazy_metric_map_defers_conversion():
+    resp = PrometheusResponseModel(**EXPORT_RESPONSE)
+    eager = resp.to_metric_map()
+    lazy = resp.to_metric_map(lazy=True)
+    assert lazy.keys() == eager.keys()
+
+    series = lazy[MetricLabelSet({"job": "b"})]
+    assert isinstance(series, LazyTimeSeries)
+    assert len(series) == 2
+    assert series.latest() == TimeSeriesPoint(datetime.fromtimestamp(1748269560.5), 4.0)
+    assert not series.is_loaded
+
+    assert list(series) == list(eager[MetricLabelSet({"job": "b"})])
+    assert series.is_loaded
+    assert series.average() == 3.5
+
+    vector = PrometheusResponseModel(**MOCK_PROMETHEUS_VECTOR_RESPONSE).to_metric_map(lazy=True)
+    assert [len(s) for s in vector.values()] == [1]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_keeps_shape_and_spikes(method):
+    samples = [float(i % 10) for i in range(1000)]
+    samples[537] = 100.0
+    series = ColumnarTimeSeries(range(1000), samples)
+    small = series.downsample(100, method=method)
+    assert len(small) == 100
+    assert small.timestamps[0] == 0.0
+    assert list(small.timestamps) == sorted(small.timestamps)
+    assert 100.0 in small.samples
+
+    points = series.to_timeseries().downsample(100, method=method)
+    assert [p.value for p in points] == list(small.samples)
+    assert len(series.downsample(5000)) == 1000
+    with pytest.raises(ValueError):
+        series.downsample(10, method="avg")
+
+
+@pytest.mark.unit
+def test_ring_timeseries_evicts_by_count_and_age():
+    ring = RingTimeSeries(capacity=4)
+    for i in range(6):
+        ring.append(100.0 + 10 * i, float(i))
+    assert len(ring) == 4
+    assert list(ring.timestamps) == [120.0, 130.0, 140.0, 150.0]
+    assert ring.latest() == TimeSeriesPoint(datetime.fromtimestamp(150), 5.0)
+    assert ring[0].value == 2.0 and ring[-1].value == 5.0
+    assert ring.average() == 3.5 and ring.sum() == 14.0
+    with pytest.raises(ValueError):
+        ring.append(140.0, 0.0)
+
+    aged = RingTimeSeries(capacity=100, max_age="25s")
+    aged.extend(ColumnarTimeSeries([0.0, 10.0, 20.0, 30.0, 40.0], [1.0, 2.0, 3.0, 4.0, 5.0]))
+    assert list(aged.samples) == [3.0, 4.0, 5.0]
+    assert aged.evict_before(35.0) == 2 and aged.average() == 5.0
+
+
+@pytest.mark.unit
+def test_ring_timeseries_slicing_and_compat():
+    ring = RingTimeSeries(capacity=5)
+    for i in range(8):  # wraps around the buffer
+        ring.append(float(i), float(i * i))
+    window = ring.between(4.0, 6.5)
+    assert list(window.timestamps) == [4.0, 5.0, 6.0]
+    assert list(ring.between(end=3.0).samples) == [9.0]
+    assert len(ring.between(8.0)) == 0
+    assert list(ring[1:3].samples) == [16.0, 25.0]
+
+    series = RingTimeSeries(3, points=[TimeSeriesPoint(datetime.fromtimestamp(t), 1.0) for t in (10, 20)])
+    assert [p.value for p in series] == [1.0, 1.0] and len(series.values) == 2
+    assert list(series.to_columnar().timestamps) == [10.0, 20.0]
+    assert series.to_timeseries().average() == 1.0
+
+    series.append(30.0, float("nan"))
+    assert series.average() != series.average()  # NaN while stored
+    series.append(40.0, 2.0)
+    series.append(50.0, 3.0)
+    series.append(60.0, 4.0)  # NaN evicted
+    assert series.average() == 3.0
+
+
+def _matrix_map(rows: dict) -> dict:
+    return {
+        MetricLabelSet(labels): ColumnarTimeSeries([t for t, _ in points], [v for _, v in points])
+        for labels, points in rows
+    }
+
+
+@pytest.mark.unit
+def test_series_matrix_alignment_and_group_by(columnar_backend):
+    metric_map = _matrix_map(
+        [
+            ({"__name__": "req", "job": "api", "instance": "a"}, [(0.0, 1.0), (60.0, 2.0)]),
+            ({"__name__": "req", "job": "api", "instance": "b"}, [(60.0, 10.0), (120.0, 20.0)]),
+            ({"__name__": "req", "job": "db", "instance": "c"}, [(0.0, 5.0)]),
+        ]
+    )
+    matrix = SeriesMatrix.from_metric_map(metric_map)
+    assert matrix.shape == (3, 3)
+    assert list(matrix.timestamps) == [0.0, 60.0, 120.0]
+    a = MetricLabelSet({"__name__": "req", "job": "api", "instance": "a"})
+    assert list(matrix[a].samples) == [1.0, 2.0]  # NaN gaps are dropped again
+
+    by_job = matrix.group_by(["job"])
+    api, db = MetricLabelSet({"job": "api"}), MetricLabelSet({"job": "db"})
+    assert list(by_job[api].samples) == [1.0, 12.0, 20.0]
+    assert list(by_job[db].timestamps) == [0.0]
+    counts = matrix.group_by(["instance"], how="count", without=True)
+    assert list(counts[api].samples) == [1.0, 2.0, 1.0]
+    total = matrix.group_by(how="mean")
+    assert list(total[MetricLabelSet({})].samples) == [3.0, 6.0, 20.0]
+    for how, samples in {"sum": [6.0, 12.0, 20.0], "min": [1.0, 2.0, 20.0], "max": [5.0, 10.0, 20.0]}.items():
+        assert list(matrix.group_by(how=how)[MetricLabelSet({})].samples) == samples
+    assert list(matrix.group_by(how="last")[MetricLabelSet({})].samples) == [5.0, 10.0, 20.0]
+    assert list(matrix.group_by(how="count")[MetricLabelSet({})].samples) == [2.0, 2.0, 1.0]
+
+    # NaN marks a missing sample, so a NaN value from Prometheus is lost as well
+    lossy = SeriesMatrix.from_metric_map(_matrix_map([({"job": "x"}, [(0.0, 1.0), (60.0, math.nan), (120.0, 3.0)])]))
+    (x,) = lossy
+    assert list(lossy[x].timestamps) == [0.0, 120.0]
+    assert lossy.reduce("count") == {x: 2.0}
+    with pytest.raises(ValueError):
+        matrix.group_by(["job"], how="median")
+
+
+@pytest.mark.unit
+def test_series_matrix_binary_ops_and_topk(columnar_backend):
+    errors = SeriesMatrix.from_metric_map(
+        _matrix_map(
+            [
+                ({"__name__": "errors", "job": "api"}, [(0.0, 1.0), (60.0, 3.0)]),
+                ({"__name__": "errors", "job": "db"}, [(0.0, 0.0), (60.0, 2.0)]),
+                ({"__name__": "errors", "job": "web"}, [(0.0, 1.0)]),
+            ]
+        )
+    )
+    requests = SeriesMatrix.from_metric_map(
+        _matrix_map(
+            [
+                ({"__name__": "requests", "job": "api"}, [(0.0, 10.0), (60.0, 30.0)]),
+                ({"__name__": "requests", "job": "db"}, [(0.0, 0.0), (60.0, 0.0)]),
+            ]
+        )
+    )
+    ratio = errors / requests
+    api, db = MetricLabelSet({"job": "api"}), MetricLabelSet({"job": "db"})
+    assert list(ratio) == [api, db]  # unmatched "web" is dropped
+    assert list(ratio[api].samples) == [0.1, 0.1]
+    assert list(ratio[db].samples) == [float("inf")]  # 0/0 is NaN, 2/0 is +Inf
+    assert list((requests * 2)[api].samples) == [20.0, 60.0]
+    assert list((2 * requests)[api].samples) == [20.0, 60.0]
+    assert list((1 + requests)[api].samples) == [11.0, 31.0]
+    assert list((100 - requests)[api].samples) == [90.0, 70.0]
+    assert list((requests - 100)[api].samples) == [-90.0, -70.0]
+    assert list((30 / requests)[api].samples) == [3.0, 1.0]
+    assert list((30 / requests)[db].samples) == [float("inf")] * 2
+    with pytest.raises(TypeError):
+        "x" - requests
+
+    # ^ follows IEEE 754 where math.pow would raise
+    powers = errors.binary(-1, "^")
+    assert list(powers[db].samples) == [float("inf"), 0.5]  # 0 ^ -1
+    assert list(requests.binary(400, "^")[api].samples) == [float("inf")] * 2  # 10 ^ 400 overflows
+    assert list((requests * -1).binary(401, "^")[api].samples) == [float("-inf")] * 2
+    assert len((requests * -1).binary(0.5, "^")[api]) == 0  # (-10) ^ 0.5 is NaN
+
+    per_instance = SeriesMatrix.from_metric_map(
+        _matrix_map(
+            [
+                ({"job": "api", "instance": "a"}, [(0.0, 4.0)]),
+                ({"job": "api", "instance": "b"}, [(0.0, 6.0)]),
+            ]
+        )
+    )
+    with pytest.raises(ValueError, match="many-to-many"):
+        per_instance.binary(requests, "/", on=["job"])
+    share = per_instance.binary(per_instance.group_by(["job"]), "/", on=["job"], group="left")
+    assert share.reduce("last") == {
+        MetricLabelSet({"job": "api", "instance": "a"}): 0.4,
+        MetricLabelSet({"job": "api", "instance": "b"}): 0.6,
+    }
+
+    assert list(errors.topk(2, by="max")) == [
+        MetricLabelSet({"__name__": "errors", "job": "api"}),
+        MetricLabelSet({"__name__": "errors", "job": "db"}),
+    ]
+    assert list(errors.bottomk(1, by="mean")) == [MetricLabelSet({"__name__": "errors", "job": "db"})]
+    assert errors.reduce("last")[MetricLabelSet({"__name__": "errors", "job": "web"})] == 1.0
+    assert set(errors.to_metric_map()) == set(errors)
+
+
+def _indexed_map() -> dict:
+    rows = [
+        {"__name__": "up", "job": "api", "instance": "web-1"},
+        {"__name__": "up", "job": "api", "instance": "web-2"},
+        {"__name__": "up", "job": "db", "instance": "db-1"},
+        {"__name__": "up", "instance": "batch-1"},
+    ]
+    return {MetricLabelSet(labels): TimeSeries([]) for labels in rows}
+
+
+@pytest.mark.unit
+def test_label_index_matchers():
+    metric_map = _indexed_map()
+    index = LabelIndex(metric_map)
+    web1, web2, db1, batch = list(metric_map)
+    assert index.values("job") == ["api", "db"] and index.names() == ["__name__", "instance", "job"]
+    assert list(index.select(job="api")) == [web1, web2]
+    assert list(index.select(Matcher("instance", "=~", "web-.*"), job__ne="db")) == [web1, web2]
+    assert list(index.select(instance__re="web-1|db-1")) == [web1, db1]
+    assert list(index.select(job__ne="api")) == [db1, batch]  # a missing label is empty
+    assert list(index.select(job="")) == [batch]
+    assert list(index.select(job__re=".+")) == [web1, web2, db1]
+    assert list(index.select(job__nre="a.*")) == [db1, batch]
+    assert list(index.select(Selector("up", job="db"))) == [db1]
+    assert index.select(Selector("down")) == {} and index.ids(job="nope") == []
+    assert list(index.select(job__ne="")) == [web1, web2, db1]
+    assert index.select() == metric_map
+    with pytest.raises(ValueError):
+        index.select(Matcher("job", "~", "x"))
+
+    # the cached set of series carrying a label follows later additions
+    cron = MetricLabelSet({"__name__": "up", "job": "cron"})
+    index.add(cron, TimeSeries([]))
+    assert list(index.select(job="")) == [batch]
+    assert list(index.select(job__ne="api")) == [db1, batch, cron]
+
+
+@pytest.mark.unit
+def test_label_index_group_by():
+    metric_map = _indexed_map()
+    index = LabelIndex(metric_map)
+    web1, web2, db1, batch = list(metric_map)
+    by_job = index.group_by(["job"])
+    assert {k: list(v) for k, v in by_job.items()} == {
+        MetricLabelSet({"job": "api"}): [web1, web2],
+        MetricLabelSet({"job": "db"}): [db1],
+        MetricLabelSet({}): [batch],
+    }
+    filtered = index.group_by(["job"], matchers=[Matcher("instance", "!~", "web-2")])
+    assert list(filtered[MetricLabelSet({"job": "api"})]) == [web1]
+    without = index.group_by(["instance"], without=True)
+    assert list(without) == [MetricLabelSet({"job": "api"}), MetricLabelSet({"job": "db"}), MetricLabelSet({})]
+    pairs = index.group_by(["job", "instance"])
+    assert len(pairs) == 4 and MetricLabelSet({"instance": "batch-1"}) in pairs